@@ -27,7 +27,7 @@ from src.video_editor import VideoEditor
 # Import custom modules - Enhanced Features (v2.0)
 from src.effects import VisualEffects
 from src.text_overlay import TextOverlay
-from src.audio_processor import AudioProcessor
+from src.audio_processor import AudioProcessor, measure_loudness
 from src.composition_optimizer import CompositionOptimizer
 from src.thumbnail_generator import ThumbnailGenerator
 from src.advanced_analyzer import AdvancedAnalyzer
@@ -285,87 +285,97 @@ async def process_video_task(job_id: str):
         engagement_predictor = EngagementPredictor(config) if ENGAGEMENT_PREDICTOR_AVAILABLE else None
         chapter_generator = ChapterGenerator(config) if CHAPTER_GENERATOR_AVAILABLE else None
 
-        # ========== STEP 1: Extract frames ==========
-        await manager.send_progress(job_id, {
-            "stage": "frame_extraction",
-            "progress": 5,
-            "message": "🎬 フレームを抽出しています..."
-        })
+        try:
+            # ========== STEP 1: Extract frames ==========
+            await manager.send_progress(job_id, {
+                "stage": "frame_extraction",
+                "progress": 5,
+                "message": "🎬 フレームを抽出しています..."
+            })
 
-        frames_dir = Path("frames") / job_id
-        frames_dir.mkdir(exist_ok=True)
+            frames_dir = Path("frames") / job_id
+            frames_dir.mkdir(exist_ok=True)
 
-        frames = await frame_extractor.extract_frames(video_path, frames_dir)
-        job["frames_count"] = len(frames)
-        logger.info(f"Extracted {len(frames)} frames")
+            frames = await frame_extractor.extract_frames(video_path, frames_dir)
+            job["frames_count"] = len(frames)
+            logger.info(f"Extracted {len(frames)} frames")
 
-        # ========== STEP 2: AI Analysis with Ollama Vision ==========
-        await manager.send_progress(job_id, {
-            "stage": "ai_analysis",
-            "progress": 10,
-            "message": "🤖 AI解析を実行しています..."
-        })
+            # ========== STEP 2: AI Analysis with Ollama Vision ==========
+            await manager.send_progress(job_id, {
+                "stage": "ai_analysis",
+                "progress": 10,
+                "message": "🤖 AI解析を実行しています..."
+            })
 
-        analysis_results = []
-        for i, frame_path in enumerate(frames):
-            result = await ai_analyzer.analyze_frame(frame_path)
-            analysis_results.append(result)
+            progress_every = 10  # 10フレーム完了ごとに進捗更新
 
-            progress = 10 + int((i / len(frames)) * 30)
-            if i % 10 == 0:  # 10フレームごとに進捗更新
+            async def report_analysis_progress(done: int):
+                if done % progress_every and done != len(frames):
+                    return
                 await manager.send_progress(job_id, {
                     "stage": "ai_analysis",
-                    "progress": progress,
-                    "message": f"🔍 フレーム解析中: {i+1}/{len(frames)}"
+                    "progress": 10 + int((done / len(frames)) * 30),
+                    "message": f"🔍 フレーム解析中: {done}/{len(frames)}"
                 })
 
-        job["analysis_results"] = analysis_results
-        logger.info(f"Analyzed {len(analysis_results)} frames")
+            # 全フレームをまとめて投入（同時実行数はクライアント側で制限し、区切りごとに待たない）
+            try:
+                analysis_results = await ai_analyzer.analyze_frames_batch(
+                    frames, on_progress=report_analysis_progress
+                )
+            finally:
+                await ai_analyzer.aclose()
 
-        # ========== STEP 3: Advanced AI Analysis ==========
-        if config.get("advanced_analysis", {}).get("enable", True):
-            await manager.send_progress(job_id, {
-                "stage": "advanced_analysis",
-                "progress": 40,
-                "message": "🧠 高度なAI分析を実行しています..."
-            })
+            job["analysis_results"] = analysis_results
+            logger.info(f"Analyzed {len(analysis_results)} frames")
 
-            # 興奮度分析
-            analysis_results = advanced_analyzer.analyze_excitement_level(analysis_results)
+            # ========== STEP 3: Advanced AI Analysis ==========
+            if config.get("advanced_analysis", {}).get("enable", True):
+                await manager.send_progress(job_id, {
+                    "stage": "advanced_analysis",
+                    "progress": 40,
+                    "message": "🧠 高度なAI分析を実行しています..."
+                })
 
-            # マルチキル検出
-            multi_kills = advanced_analyzer.detect_multi_kills(analysis_results)
-            job["multi_kills"] = multi_kills
-            logger.info(f"Detected {len(multi_kills)} multi-kill events")
+                # 興奮度分析
+                analysis_results = advanced_analyzer.analyze_excitement_level(analysis_results)
 
-            # クラッチモーメント検出
-            clutch_moments = advanced_analyzer.detect_clutch_moments(analysis_results)
-            job["clutch_moments"] = clutch_moments
+                # マルチキル検出
+                multi_kills = advanced_analyzer.detect_multi_kills(analysis_results)
+                job["multi_kills"] = multi_kills
+                logger.info(f"Detected {len(multi_kills)} multi-kill events")
 
-            # パターンベースのハイライト提案
-            suggested_highlights = advanced_analyzer.suggest_highlights_from_patterns(
-                analysis_results, multi_kills, clutch_moments
-            )
+                # クラッチモーメント検出
+                clutch_moments = advanced_analyzer.detect_clutch_moments(analysis_results)
+                job["clutch_moments"] = clutch_moments
 
-        # ========== STEP 4: Determine Clips ==========
-        await manager.send_progress(job_id, {
-            "stage": "clip_detection",
-            "progress": 50,
-            "message": "✂️ ハイライトシーンを検出しています..."
-        })
+                # パターンベースのハイライト提案
+                suggested_highlights = advanced_analyzer.suggest_highlights_from_patterns(
+                    analysis_results, multi_kills, clutch_moments
+                )
 
-        if config.get("advanced_analysis", {}).get("suggest_highlights", True) and suggested_highlights:
-            # 高度な分析による推奨ハイライトを使用
-            clips = suggested_highlights
-            logger.info(f"Using AI-suggested highlights: {len(clips)} clips")
-        else:
-            # 従来のThinking modelによる判定
-            # MultiModelAnalyzerの場合は、プライマリモデルのクライアントを使用
-            if isinstance(ai_analyzer, MultiModelAnalyzer):
-                thinking_client = list(ai_analyzer.clients.values())[0]
+            # ========== STEP 4: Determine Clips ==========
+            await manager.send_progress(job_id, {
+                "stage": "clip_detection",
+                "progress": 50,
+                "message": "✂️ ハイライトシーンを検出しています..."
+            })
+
+            if config.get("advanced_analysis", {}).get("suggest_highlights", True) and suggested_highlights:
+                # 高度な分析による推奨ハイライトを使用
+                clips = suggested_highlights
+                logger.info(f"Using AI-suggested highlights: {len(clips)} clips")
             else:
-                thinking_client = ai_analyzer
-            clips = await thinking_client.determine_clips(analysis_results)
+                # 従来のThinking modelによる判定
+                # MultiModelAnalyzerの場合は、プライマリモデルのクライアントを使用
+                if isinstance(ai_analyzer, MultiModelAnalyzer):
+                    thinking_client = list(ai_analyzer.clients.values())[0]
+                else:
+                    thinking_client = ai_analyzer
+                clips = await thinking_client.determine_clips(analysis_results)
+        finally:
+            # 以降はOllamaを使用しないためワーカープールとキャッシュを解放（失敗時も）
+            ai_analyzer.close()
 
         job["clips_raw"] = clips
 
@@ -408,19 +418,20 @@ async def process_video_task(job_id: str):
 
             effects_config = config.get("effects", {})
 
-            # カラーグレーディング
+            # カラーグレーディング・ビネットを1回のエンコードでまとめて適用
+            effect_chain = []
             if effects_config.get("color_grading", {}).get("enable", True):
-                temp_output = Path("output") / f"{job_id}_graded.mp4"
                 preset = effects_config.get("color_grading", {}).get("preset", "cinematic")
-                current_video = visual_effects.apply_color_grading(current_video, temp_output, preset)
-                logger.info(f"Applied color grading: {preset}")
+                effect_chain.append(("color_grading", {"preset": preset}))
 
-            # ビネット効果
             if effects_config.get("vignette", {}).get("enable", True):
-                temp_output = Path("output") / f"{job_id}_vignette.mp4"
                 intensity = effects_config.get("vignette", {}).get("intensity", 0.3)
-                current_video = visual_effects.apply_vignette(current_video, temp_output, intensity)
-                logger.info("Applied vignette effect")
+                effect_chain.append(("vignette", {"intensity": intensity}))
+
+            if effect_chain:
+                temp_output = Path("output") / f"{job_id}_effects.mp4"
+                current_video = visual_effects.apply_chain(current_video, temp_output, effect_chain)
+                logger.info(f"Applied visual effects: {', '.join(name for name, _ in effect_chain)}")
 
         # ========== STEP 8: Apply Text Overlays ==========
         if config.get("text_overlay", {}).get("enable", True):
@@ -432,23 +443,27 @@ async def process_video_task(job_id: str):
 
             text_config = config.get("text_overlay", {})
 
+            # カウンター・ポップアップを1つのフィルターチェーンにまとめて1回のエンコードで焼き込む
+            overlay_chain = []
+
             # キル数カウンター
             if text_config.get("kill_counter", {}).get("enable", True):
-                temp_output = Path("output") / f"{job_id}_kill_counter.mp4"
                 kill_timestamps = [r["timestamp"] for r in analysis_results if r.get("kill_log", False)]
                 if kill_timestamps:
-                    current_video = text_overlay.add_kill_counter(current_video, temp_output, kill_timestamps)
-                    logger.info(f"Added kill counter: {len(kill_timestamps)} kills")
+                    overlay_chain.append(("kill_counter", {"kill_timestamps": kill_timestamps}))
 
             # マルチキルポップアップ
             if text_config.get("kill_popups", {}).get("enable", True) and multi_kills:
                 for mk in multi_kills:
-                    temp_output = Path("output") / f"{job_id}_popup_{mk['type']}.mp4"
-                    current_video = text_overlay.add_text_popup(
-                        current_video, temp_output,
-                        mk['type'], mk['timestamp'], 2.0, "center"
-                    )
-                    logger.info(f"Added {mk['type']} popup at {mk['timestamp']}s")
+                    overlay_chain.append(("text_popup", {
+                        "text": mk['type'], "timestamp": mk['timestamp'],
+                        "duration": 2.0, "position": "center",
+                    }))
+
+            if overlay_chain:
+                temp_output = Path("output") / f"{job_id}_overlays.mp4"
+                current_video = text_overlay.apply_overlays(current_video, temp_output, overlay_chain)
+                logger.info(f"Applied text overlays: {', '.join(name for name, _ in overlay_chain)}")
 
         # ========== STEP 9: Audio Processing ==========
         if config.get("audio_processing", {}).get("enable", True):
@@ -460,37 +475,41 @@ async def process_video_task(job_id: str):
 
             audio_config = config.get("audio_processing", {})
 
+            # 正規化・強調・フェード・BGMを1つのフィルターグラフにまとめて1パスで処理
+            audio_chain = audio_processor.build_chain()
+            applied = []
+
             # 音量正規化
             if audio_config.get("normalization", {}).get("enable", True):
-                temp_output = Path("output") / f"{job_id}_normalized.mp4"
-                current_video = audio_processor.normalize_audio(current_video, temp_output)
-                logger.info("Applied audio normalization")
+                audio_chain.normalize(await asyncio.to_thread(measure_loudness, current_video))
+                applied.append("normalization")
 
             # ゲーム音声強調
             if audio_config.get("enhancement", {}).get("enable", True):
-                temp_output = Path("output") / f"{job_id}_enhanced.mp4"
-                current_video = audio_processor.enhance_game_audio(current_video, temp_output)
-                logger.info("Enhanced game audio")
+                audio_chain.enhance_game()
+                applied.append("enhancement")
 
             # フェードイン/アウト
             if audio_config.get("fade", {}).get("enable", True):
-                temp_output = Path("output") / f"{job_id}_faded.mp4"
                 fade_in = audio_config.get("fade", {}).get("fade_in", 1.0)
                 fade_out = audio_config.get("fade", {}).get("fade_out", 1.0)
-                current_video = audio_processor.fade_in_out(current_video, temp_output, fade_in, fade_out)
-                logger.info("Applied fade in/out")
+                audio_chain.fade(fade_in, fade_out)
+                applied.append("fade")
 
             # BGM追加
             if audio_config.get("background_music", {}).get("enable", False):
                 music_path = audio_config.get("background_music", {}).get("music_path", "")
                 if music_path and Path(music_path).exists():
-                    temp_output = Path("output") / f"{job_id}_with_music.mp4"
                     video_vol = audio_config.get("background_music", {}).get("video_volume", 0.7)
                     music_vol = audio_config.get("background_music", {}).get("music_volume", 0.3)
-                    current_video = audio_processor.add_background_music(
-                        current_video, music_path, temp_output, video_vol, music_vol
-                    )
-                    logger.info("Added background music")
+                    audio_chain.background_music(music_path, video_vol, music_vol)
+                    applied.append("background music")
+
+            if applied:
+                temp_output = Path("output") / f"{job_id}_audio.mp4"
+                # このファイルがメイン動画の成果物になるため faststart を付ける
+                current_video = await audio_chain.render_async(current_video, temp_output, final=True)
+                logger.info(f"Applied audio processing: {', '.join(applied)}")
 
         # ========== STEP 10: Finalize Main Video ==========
         final_output = Path("output") / f"{job_id}_highlight.mp4"
@@ -503,27 +522,49 @@ async def process_video_task(job_id: str):
         # ========== PRO FEATURES (v3.0) ==========
 
         # ========== STEP 10.1: Video Enhancement ==========
-        if config.get("video_enhancer", {}).get("enable", True) and video_enhancer:
+        # ========== STEP 10.2: Audio Enhancement ==========
+        # 映像フィルタ（エンコード）と音声フィルタは別ストリームなので並列に実行し、最後にコピーで結合
+        run_video_enhance = config.get("video_enhancer", {}).get("enable", True) and video_enhancer
+        run_audio_enhance = config.get("audio_enhancer", {}).get("enable", True) and audio_enhancer
+
+        if run_video_enhance:
             await manager.send_progress(job_id, {
                 "stage": "video_enhancement",
                 "progress": 72,
                 "message": "✨ 動画品質を向上させています..."
             })
-
-            enhanced_output = Path("output") / f"{job_id}_enhanced.mp4"
-            final_output = Path(video_enhancer.apply_all_enhancements(str(final_output), str(enhanced_output)))
-            logger.info("Video enhancement completed")
-
-        # ========== STEP 10.2: Audio Enhancement ==========
-        if config.get("audio_enhancer", {}).get("enable", True) and audio_enhancer:
+        if run_audio_enhance:
             await manager.send_progress(job_id, {
                 "stage": "audio_enhancement",
                 "progress": 74,
                 "message": "🎵 音声品質を向上させています..."
             })
 
+        if run_video_enhance and run_audio_enhance:
+            enhanced_output = Path("output") / f"{job_id}_enhanced.mp4"
+            audio_track = Path("output") / f"{job_id}_audio_enhanced.m4a"
+            video_result, audio_result = await asyncio.gather(
+                video_enhancer.apply_all_enhancements_async(str(final_output), str(enhanced_output)),
+                asyncio.to_thread(audio_enhancer.enhance_audio_track, str(final_output), str(audio_track)),
+            )
+            if audio_result != str(final_output):
+                audio_enhanced = Path("output") / f"{job_id}_audio_enhanced.mp4"
+                final_output = Path(audio_enhancer.mux_audio(video_result, audio_result, str(audio_enhanced)))
+                audio_track.unlink(missing_ok=True)
+            else:
+                final_output = Path(video_result)
+            logger.info("Video and audio enhancement completed")
+        elif run_video_enhance:
+            enhanced_output = Path("output") / f"{job_id}_enhanced.mp4"
+            final_output = Path(await video_enhancer.apply_all_enhancements_async(
+                str(final_output), str(enhanced_output)
+            ))
+            logger.info("Video enhancement completed")
+        elif run_audio_enhance:
             audio_enhanced = Path("output") / f"{job_id}_audio_enhanced.mp4"
-            final_output = Path(audio_enhancer.enhance_voice_clarity(str(final_output), str(audio_enhanced)))
+            final_output = Path(await asyncio.to_thread(
+                audio_enhancer.enhance_voice_clarity, str(final_output), str(audio_enhanced)
+            ))
             logger.info("Audio enhancement completed")
 
         # ========== STEP 10.3: Super Resolution Upscaling ==========
@@ -6,7 +6,6 @@ from __future__ import annotations
 
 import logging
 from dataclasses import dataclass, field
-from typing import Optional
 
 import numpy as np
 
@@ -38,7 +37,7 @@ class BayesianOptimizer:
 
     def __init__(
         self,
-        parameter_space: Optional[ParameterSpace] = None,
+        parameter_space: ParameterSpace | None = None,
         n_initial: int = 10,
         n_candidates: int = 2000,
         random_state: int = 42,
@@ -52,6 +51,7 @@ class BayesianOptimizer:
         self._y: list[float] = []
         self._gp = None
         self._uncertainties: list[float] = []
+        self._initial_samples: list[dict[str, float]] | None = None
 
     @property
     def n_observations(self) -> int:
@@ -60,8 +60,11 @@ class BayesianOptimizer:
     def suggest(self) -> dict[str, float]:
         """Suggest next parameters to try."""
         if self.n_observations < self.n_initial:
-            # Initial exploration with Sobol
-            samples = self.space.sobol_samples(self.n_initial)
+            # Initial exploration with Sobol (drawn once per optimizer)
+            if self._initial_samples is None:
+                self.space.reset_sobol()
+                self._initial_samples = self.space.sobol_samples(self.n_initial)
+            samples = self._initial_samples
             if self.n_observations < len(samples):
                 return samples[self.n_observations]
             return self.space.random_sample(self.rng)
@@ -72,7 +75,7 @@ class BayesianOptimizer:
 
     def observe(self, params: dict[str, float], reward: float) -> None:
         """Record an observation."""
-        x = np.array(self.space.dict_to_array(params))
+        x = self.space.dict_to_array(params)
         self._X.append(x)
         self._y.append(reward)
         logger.info(
@@ -103,7 +106,7 @@ class BayesianOptimizer:
         """Predict mean and std for given parameters."""
         if self._gp is None:
             self._fit_gp()
-        x = np.array(self.space.dict_to_array(params)).reshape(1, -1)
+        x = self.space.dict_to_array(params).reshape(1, -1)
         mean, std = self._gp.predict(x, return_std=True)
         return float(mean[0]), float(std[0])
 
@@ -169,10 +172,7 @@ class BayesianOptimizer:
 
     def _thompson_sampling(self) -> dict[str, float]:
         """Thompson Sampling acquisition: sample from GP posterior."""
-        lows, highs = self.space.to_array_bounds()
-        candidates = self.rng.uniform(
-            lows, highs, size=(self.n_candidates, self.space.dimension)
-        )
+        candidates = self.space.random_samples(self.n_candidates, self.rng)
 
         # Normalize candidates
         X_norm = (candidates - self._X_mean) / self._X_std
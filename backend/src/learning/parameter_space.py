@@ -4,7 +4,13 @@ Parameter space definition for Bayesian optimization.
 """
 from __future__ import annotations
 
+import logging
 from dataclasses import dataclass, field
+from functools import cached_property
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -37,59 +43,108 @@ DEFAULT_PARAMETER_SPACE: list[ParameterBound] = [
 class ParameterSpace:
     """Manages the parameter space for optimization."""
 
-    def __init__(self, parameters: list[ParameterBound] | None = None):
+    def __init__(
+        self,
+        parameters: list[ParameterBound] | None = None,
+        seed: int | None = None,
+    ):
         self.parameters = parameters or DEFAULT_PARAMETER_SPACE
         self._param_map = {p.name: p for p in self.parameters}
+        self._name_to_idx = {p.name: i for i, p in enumerate(self.parameters)}
+        self._seed = seed
+        self._rng = np.random.default_rng(seed)
+        self._sobol = None
+        self._sobol_drawn = 0
 
     @property
     def dimension(self) -> int:
         return len(self.parameters)
 
-    @property
-    def names(self) -> list[str]:
-        return [p.name for p in self.parameters]
+    @cached_property
+    def names(self) -> tuple[str, ...]:
+        return tuple(p.name for p in self.parameters)
 
-    @property
-    def bounds(self) -> list[tuple[float, float]]:
-        return [(p.low, p.high) for p in self.parameters]
+    @cached_property
+    def bounds(self) -> tuple[tuple[float, float], ...]:
+        return tuple((p.low, p.high) for p in self.parameters)
+
+    @cached_property
+    def lows_arr(self) -> np.ndarray:
+        return _readonly(np.array([p.low for p in self.parameters], dtype=np.float64))
+
+    @cached_property
+    def highs_arr(self) -> np.ndarray:
+        return _readonly(np.array([p.high for p in self.parameters], dtype=np.float64))
+
+    @cached_property
+    def span_arr(self) -> np.ndarray:
+        return _readonly(self.highs_arr - self.lows_arr)
 
     def get_bound(self, name: str) -> ParameterBound:
         return self._param_map[name]
 
-    def to_array_bounds(self):
-        """Return bounds as numpy-compatible arrays."""
-        import numpy as np
-        lows = np.array([p.low for p in self.parameters])
-        highs = np.array([p.high for p in self.parameters])
-        return lows, highs
+    def index(self, name: str) -> int:
+        """Column index of a parameter in array representations."""
+        return self._name_to_idx[name]
 
-    def dict_to_array(self, params: dict) -> list[float]:
+    def to_array_bounds(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return bounds as (read-only, cached) numpy arrays."""
+        return self.lows_arr, self.highs_arr
+
+    def dict_to_array(self, params: dict) -> np.ndarray:
         """Convert parameter dict to ordered array."""
-        return [params[p.name] for p in self.parameters]
+        return np.array([params[n] for n in self.names], dtype=np.float64)
 
     def array_to_dict(self, values: list[float]) -> dict[str, float]:
         """Convert ordered array to parameter dict."""
-        return {p.name: v for p, v in zip(self.parameters, values)}
+        return dict(zip(self.names, values, strict=True))
 
     def random_sample(self, rng=None) -> dict[str, float]:
         """Generate a random sample within bounds."""
-        import numpy as np
-        rng = rng or np.random.default_rng()
-        return {
-            p.name: float(rng.uniform(p.low, p.high))
-            for p in self.parameters
-        }
+        row = self.random_samples(1, rng)[0]
+        return dict(zip(self.names, row.tolist(), strict=True))
+
+    def random_samples(self, n: int, rng=None) -> np.ndarray:
+        """Generate ``n`` uniform samples within bounds as an ``(n, d)`` array."""
+        return (rng or self._rng).uniform(
+            self.lows_arr, self.highs_arr, size=(n, self.dimension)
+        )
 
     def sobol_samples(self, n: int) -> list[dict[str, float]]:
-        """Generate Sobol quasi-random samples for initial exploration."""
-        import numpy as np
+        """Generate Sobol quasi-random samples for initial exploration.
+
+        The engine is kept on the instance so consecutive calls continue
+        the same sequence instead of restarting it.
+        """
         try:
             from scipy.stats.qmc import Sobol
-            sampler = Sobol(d=self.dimension, scramble=True)
-            raw = sampler.random(n)
         except ImportError:
-            raw = np.random.rand(n, self.dimension)
-
-        lows, highs = self.to_array_bounds()
-        scaled = raw * (highs - lows) + lows
+            raw = np.random.default_rng(self._seed).random((n, self.dimension))
+        else:
+            if self._sobol is None:
+                self._sobol = Sobol(d=self.dimension, scramble=True, seed=self._seed)
+            if self._sobol_drawn == 0 and n > 0:
+                # Draw the next power-of-two prefix so the points stay balanced
+                m = (n - 1).bit_length()
+                raw = self._sobol.random_base2(m=m)[:n]
+                self._sobol_drawn = 1 << m
+            else:
+                logger.debug(
+                    "Sobol draw of %d points at offset %d is not a power-of-two prefix",
+                    n, self._sobol_drawn,
+                )
+                raw = self._sobol.random(n)
+                self._sobol_drawn += n
+
+        scaled = raw * self.span_arr + self.lows_arr
         return [self.array_to_dict(row.tolist()) for row in scaled]
+
+    def reset_sobol(self) -> None:
+        """Discard the Sobol engine so the next draw starts a fresh sequence."""
+        self._sobol = None
+        self._sobol_drawn = 0
+
+
+def _readonly(arr: np.ndarray) -> np.ndarray:
+    arr.flags.writeable = False
+    return arr
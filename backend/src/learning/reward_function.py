@@ -7,6 +7,7 @@ from __future__ import annotations
 import logging
 from typing import Optional
 
+import numpy as np
 from backend.src.core.services.reward_calculator import RewardCalculator
 from backend.src.core.value_objects.reward_signal import RewardSignal
 
@@ -21,11 +22,20 @@ class RewardFunction:
     Default components:
         retention=0.30, ctr=0.20, engagement=0.15,
         watch_time=0.15, llm_quality=0.10, diversity=0.10
+
+    History is stored column-wise (one growable float array for totals and
+    one per component) so aggregate queries are single vectorized passes.
     """
 
+    _INITIAL_CAPACITY = 64
+
     def __init__(self, weights: Optional[dict[str, float]] = None):
         self._calculator = RewardCalculator(weights=weights)
-        self._history: list[RewardSignal] = []
+        self._cap = self._INITIAL_CAPACITY
+        self._len = 0
+        self._totals = np.empty(self._cap, dtype=np.float64)
+        self._best = np.empty(self._cap, dtype=np.float64)
+        self._component_arrs: dict[str, np.ndarray] = {}
 
     @property
     def weights(self) -> dict[str, float]:
@@ -34,7 +44,7 @@ class RewardFunction:
     def compute(self, metrics: dict[str, float]) -> RewardSignal:
         """Compute reward from 0-1 normalized metrics."""
         signal = self._calculator.calculate(metrics)
-        self._history.append(signal)
+        self._record(signal)
         return signal
 
     def compute_from_results(self, clips, analyses, quality_score, target_duration=180.0) -> RewardSignal:
@@ -42,30 +52,78 @@ class RewardFunction:
         signal = self._calculator.calculate_from_clips(
             clips, analyses, quality_score, target_duration
         )
-        self._history.append(signal)
+        self._record(signal)
         return signal
 
+    @property
+    def totals(self) -> np.ndarray:
+        """Total reward per trial (read-only view, no copy)."""
+        view = self._totals[: self._len]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def running_best(self) -> np.ndarray:
+        """Best total seen up to each trial, maintained incrementally."""
+        view = self._best[: self._len]
+        view.flags.writeable = False
+        return view
+
+    def component_values(self, name: str) -> np.ndarray:
+        """Per-trial values of one component (NaN where it was absent)."""
+        arr = self._component_arrs.get(name)
+        if arr is None:
+            return np.full(self._len, np.nan)
+        return arr[: self._len].copy()
+
     def get_history(self) -> list[dict]:
-        """Return reward history as dicts."""
+        """Return reward history as dicts (built on demand)."""
+        columns = {
+            name: arr[: self._len].tolist()
+            for name, arr in self._component_arrs.items()
+        }
         return [
-            {"total": s.total, "components": s.components}
-            for s in self._history
+            {
+                "total": total,
+                "components": {
+                    name: col[i] for name, col in columns.items()
+                    if col[i] == col[i]  # skip NaN backfill
+                },
+            }
+            for i, total in enumerate(self._totals[: self._len].tolist())
         ]
 
     def get_running_best(self) -> float:
         """Get best reward seen so far."""
-        if not self._history:
+        if self._len == 0:
             return 0.0
-        return max(s.total for s in self._history)
+        return float(self._best[self._len - 1])
 
     def get_cumulative_regret(self, oracle_reward: float = 1.0) -> list[float]:
         """Compute cumulative regret vs oracle."""
-        regret = []
-        cumulative = 0.0
-        for s in self._history:
-            cumulative += oracle_reward - s.total
-            regret.append(cumulative)
-        return regret
+        return np.cumsum(oracle_reward - self._totals[: self._len]).tolist()
+
+    def _record(self, signal: RewardSignal) -> None:
+        """Append a signal to the columnar history, doubling on overflow."""
+        if self._len == self._cap:
+            self._cap *= 2
+            self._totals = np.resize(self._totals, self._cap)
+            self._best = np.resize(self._best, self._cap)
+            for name, arr in self._component_arrs.items():
+                grown = np.full(self._cap, np.nan)
+                grown[: self._len] = arr[: self._len]
+                self._component_arrs[name] = grown
+
+        i = self._len
+        self._totals[i] = signal.total
+        self._best[i] = signal.total if i == 0 else max(self._best[i - 1], signal.total)
+        for name, value in signal.components.items():
+            arr = self._component_arrs.get(name)
+            if arr is None:
+                arr = np.full(self._cap, np.nan)
+                self._component_arrs[name] = arr
+            arr[i] = value
+        self._len += 1
 
     def ablate(self, component_name: str) -> RewardFunction:
         """Create ablated version (one component removed, weights renormalized)."""
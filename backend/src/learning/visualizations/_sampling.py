@@ -0,0 +1,26 @@
+"""
+Point reduction helpers shared by the learning plots.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+MAX_PLOT_POINTS = 2000
+
+
+def decimate(xs: np.ndarray, ys: np.ndarray, max_pts: int = MAX_PLOT_POINTS) -> tuple[np.ndarray, np.ndarray]:
+    """Evenly subsample a series down to at most ``max_pts`` points."""
+    if len(xs) <= max_pts:
+        return xs, ys
+    idx = np.linspace(0, len(xs) - 1, max_pts).astype(np.int64)
+    return xs[idx], ys[idx]
+
+
+def step_points(xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Keep only the points where a monotone series changes (plus the last one)."""
+    if len(ys) == 0:
+        return xs, ys
+    change_idx = np.nonzero(np.diff(ys, prepend=-np.inf))[0]
+    if change_idx[-1] != len(ys) - 1:
+        change_idx = np.append(change_idx, len(ys) - 1)
+    return xs[change_idx], ys[change_idx]
@@ -4,10 +4,9 @@ Convergence plots for RL optimization experiments.
 from __future__ import annotations
 
 import logging
-from pathlib import Path
-from typing import Optional
 
 import numpy as np
+from backend.src.learning.visualizations._sampling import decimate, step_points
 
 logger = logging.getLogger(__name__)
 
@@ -16,18 +15,26 @@ def plot_reward_convergence(
     rewards: list[float],
     output_path: str,
     title: str = "Reward Convergence",
+    running_best: np.ndarray | None = None,
 ) -> str:
-    """Plot reward convergence curve with running best."""
+    """Plot reward convergence curve with running best.
+
+    Callers that already track the running best (e.g.
+    ``RewardFunction.running_best``) can pass it to skip the accumulate pass.
+    """
     import matplotlib.pyplot as plt
 
     fig, ax = plt.subplots(1, 1, figsize=(10, 6))
 
-    trials = list(range(1, len(rewards) + 1))
-    running_best = np.maximum.accumulate(rewards)
+    arr = np.asarray(rewards, dtype=np.float64)
+    trials = np.arange(1, len(arr) + 1)
+    if running_best is None:
+        running_best = np.maximum.accumulate(arr)
+    best_x, best_y = step_points(trials, np.asarray(running_best, dtype=np.float64))
 
-    ax.plot(trials, rewards, "o-", alpha=0.5, label="Trial Reward", markersize=4)
-    ax.plot(trials, running_best, "r-", linewidth=2, label="Running Best")
-    ax.fill_between(trials, 0, running_best, alpha=0.1, color="red")
+    ax.plot(*decimate(trials, arr), "o-", alpha=0.5, label="Trial Reward", markersize=4)
+    ax.plot(best_x, best_y, "r-", linewidth=2, label="Running Best", drawstyle="steps-post")
+    ax.fill_between(best_x, 0, best_y, alpha=0.1, color="red", step="post")
 
     ax.set_xlabel("Trial Number")
     ax.set_ylabel("Reward")
@@ -77,15 +84,15 @@ def plot_exploration_exploitation(
 
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8), sharex=True)
 
-    trials = list(range(1, len(rewards) + 1))
-    ax1.plot(trials, rewards, "o-", alpha=0.6, label="Reward")
+    trials = np.arange(1, len(rewards) + 1)
+    ax1.plot(*decimate(trials, np.asarray(rewards)), "o-", alpha=0.6, label="Reward")
     ax1.set_ylabel("Reward")
     ax1.set_title("Exploration vs Exploitation")
     ax1.legend()
     ax1.grid(True, alpha=0.3)
 
-    unc_trials = list(range(1, len(uncertainties) + 1))
-    ax2.plot(unc_trials, uncertainties, "g-", linewidth=2, label="Mean GP Uncertainty (σ)")
+    unc_trials = np.arange(1, len(uncertainties) + 1)
+    ax2.plot(*decimate(unc_trials, np.asarray(uncertainties)), "g-", linewidth=2, label="Mean GP Uncertainty (σ)")
     ax2.set_xlabel("Trial Number")
     ax2.set_ylabel("Uncertainty")
     ax2.legend()
@@ -22,31 +22,36 @@ def plot_llm_human_correlation(
     import matplotlib.pyplot as plt
     from scipy import stats
 
-    rho, p_value = stats.spearmanr(llm_scores, human_scores)
+    x = np.asarray(llm_scores, dtype=np.float64)
+    y = np.asarray(human_scores, dtype=np.float64)
+    rho, p_value = stats.spearmanr(x, y)
+
+    combined = np.concatenate((x, y))
+    lo, hi = float(combined.min()), float(combined.max())
 
     fig, ax = plt.subplots(1, 1, figsize=(8, 8))
 
-    ax.scatter(llm_scores, human_scores, alpha=0.6, s=40, edgecolors="black", linewidth=0.5)
+    ax.scatter(x, y, alpha=0.6, s=40, edgecolors="black", linewidth=0.5)
 
     # Regression line
-    z = np.polyfit(llm_scores, human_scores, 1)
+    z = np.polyfit(x, y, 1)
     p = np.poly1d(z)
-    x_line = np.linspace(min(llm_scores), max(llm_scores), 100)
+    x_line = np.linspace(x.min(), x.max(), 100)
     ax.plot(x_line, p(x_line), "r--", alpha=0.8, label=f"Spearman ρ = {rho:.3f} (p = {p_value:.4f})")
 
     # Identity line
-    lims = [
-        min(min(llm_scores), min(human_scores)),
-        max(max(llm_scores), max(human_scores)),
-    ]
-    ax.plot(lims, lims, "k--", alpha=0.3, label="Identity")
+    ax.plot([lo, hi], [lo, hi], "k--", alpha=0.3, label="Identity")
 
     ax.set_xlabel("LLM Quality Score")
     ax.set_ylabel("Human Quality Score")
     ax.set_title(title)
     ax.legend()
     ax.grid(True, alpha=0.3)
-    ax.set_aspect("equal")
+    # Shared limits + square box keep the identity line at 45° without set_aspect
+    pad = 0.05 * (hi - lo) or 1.0
+    ax.set_xlim(lo - pad, hi + pad)
+    ax.set_ylim(lo - pad, hi + pad)
+    ax.set_box_aspect(1)
 
     fig.tight_layout()
     fig.savefig(output_path, dpi=150, bbox_inches="tight")
@@ -4,58 +4,102 @@ GP posterior distribution heatmaps for parameter sensitivity analysis.
 from __future__ import annotations
 
 import logging
-from typing import Optional
+import os
 
+import matplotlib
 import numpy as np
 
-logger = logging.getLogger(__name__)
+# Heatmaps are only ever written to files; never pull in an interactive backend.
+matplotlib.use("Agg", force=False)
 
+logger = logging.getLogger(__name__)
 
-def plot_parameter_heatmap(
-    optimizer,
+MAX_RENDER_WORKERS = 6
+
+
+class _HeatmapContext:
+    """Per-optimizer state shared by every heatmap of a batch.
+
+    Holds the midpoint vector, normalization constants and a reusable grid
+    buffer with ``resolution²`` rows per parameter pair so plotting several
+    pairs does not rebuild them each time.
+    """
+
+    __slots__ = ("X_mean", "X_std", "grid", "mid", "resolution", "y_mean", "y_std")
+
+    def __init__(self, optimizer, resolution: int, n_pairs: int = 1):
+        space = optimizer.space
+        lows, highs = space.to_array_bounds()
+        self.mid = (lows + highs) / 2
+        self.X_mean = optimizer._X_mean
+        self.X_std = optimizer._X_std
+        self.y_mean = optimizer._y_mean
+        self.y_std = optimizer._y_std
+        self.grid = np.empty((n_pairs * resolution * resolution, space.dimension), dtype=np.float64)
+        self.resolution = resolution
+
+    def fill(self, slot: int, space, param_x: str, param_y: str) -> tuple[np.ndarray, np.ndarray]:
+        """Write the grid rows for one pair in place; return its meshgrid."""
+        px = space.get_bound(param_x)
+        py = space.get_bound(param_y)
+        n = self.resolution * self.resolution
+
+        x_vals = np.linspace(px.low, px.high, self.resolution)
+        y_vals = np.linspace(py.low, py.high, self.resolution)
+        xx, yy = np.meshgrid(x_vals, y_vals)
+
+        # Other params fixed at midpoint
+        rows = self.grid[slot * n:(slot + 1) * n]
+        rows[:] = self.mid
+        rows[:, space.index(param_x)] = xx.ravel()
+        rows[:, space.index(param_y)] = yy.ravel()
+        return xx, yy
+
+
+def _predict_grid(optimizer, ctx: _HeatmapContext) -> tuple[np.ndarray, np.ndarray]:
+    """Run one GP prediction over the whole context grid (denormalized mean, std).
+
+    The grid is normalized in place, so it must be refilled before reuse.
+    """
+    grid = ctx.grid
+    grid -= ctx.X_mean
+    grid /= ctx.X_std
+    mean, std = optimizer._gp.predict(grid, return_std=True)
+    # Denormalize in place on the predict outputs: no extra (resolution², ) temporaries
+    np.multiply(mean, ctx.y_std, out=mean)
+    mean += ctx.y_mean
+    np.multiply(std, ctx.y_std, out=std)
+    return mean, std
+
+
+def _observations(optimizer, x_idx: int, y_idx: int) -> np.ndarray | None:
+    if not optimizer._X:
+        return None
+    X = np.array(optimizer._X)
+    return X[:, [x_idx, y_idx]]
+
+
+def _render_heatmap(
+    xx: np.ndarray,
+    yy: np.ndarray,
+    mean_grid: np.ndarray,
+    std_grid: np.ndarray,
+    obs_xy: np.ndarray | None,
     param_x: str,
     param_y: str,
+    title: str,
     output_path: str,
-    resolution: int = 50,
-    title: Optional[str] = None,
+    dpi: int,
 ) -> str:
-    """Plot 2D heatmap of GP posterior mean for a parameter pair."""
+    """Draw and save one mean/uncertainty figure (picklable process-pool worker)."""
     import matplotlib.pyplot as plt
 
-    space = optimizer.space
-    px = space.get_bound(param_x)
-    py = space.get_bound(param_y)
-
-    x_vals = np.linspace(px.low, px.high, resolution)
-    y_vals = np.linspace(py.low, py.high, resolution)
-    xx, yy = np.meshgrid(x_vals, y_vals)
-
-    # Build grid with other params at midpoint
-    lows, highs = space.to_array_bounds()
-    mid = (lows + highs) / 2
-
-    x_idx = space.names.index(param_x)
-    y_idx = space.names.index(param_y)
-
-    grid = np.tile(mid, (resolution * resolution, 1))
-    grid[:, x_idx] = xx.ravel()
-    grid[:, y_idx] = yy.ravel()
-
-    # Predict
-    if optimizer._gp is None:
-        logger.warning("GP not fitted, skipping heatmap")
-        return output_path
-
-    mean, std = optimizer._gp.predict(
-        (grid - optimizer._X_mean) / optimizer._X_std, return_std=True
-    )
-    mean = mean * optimizer._y_std + optimizer._y_mean
-
     fig, axes = plt.subplots(1, 2, figsize=(14, 5))
 
     # Mean heatmap
     im1 = axes[0].pcolormesh(
-        xx, yy, mean.reshape(resolution, resolution), cmap="viridis", shading="auto"
+        xx, yy, mean_grid, cmap="viridis", shading="auto",
+        rasterized=True,
     )
     axes[0].set_xlabel(param_x)
     axes[0].set_ylabel(param_y)
@@ -63,9 +107,8 @@ def plot_parameter_heatmap(
     plt.colorbar(im1, ax=axes[0])
 
     # Uncertainty heatmap
-    std_reshaped = std.reshape(resolution, resolution)
     im2 = axes[1].pcolormesh(
-        xx, yy, std_reshaped, cmap="magma", shading="auto"
+        xx, yy, std_grid, cmap="magma", shading="auto", rasterized=True
     )
     axes[1].set_xlabel(param_x)
     axes[1].set_ylabel(param_y)
@@ -73,25 +116,66 @@ def plot_parameter_heatmap(
     plt.colorbar(im2, ax=axes[1])
 
     # Overlay observations
-    for ax in axes:
-        if optimizer._X:
-            X = np.array(optimizer._X)
-            ax.scatter(X[:, x_idx], X[:, y_idx], c="red", s=20, zorder=5, edgecolors="white")
+    if obs_xy is not None:
+        for ax in axes:
+            ax.scatter(obs_xy[:, 0], obs_xy[:, 1], c="red", s=20, zorder=5, edgecolors="white",
+                       rasterized=True)
 
-    fig.suptitle(title or f"Parameter Sensitivity: {param_x} vs {param_y}")
+    fig.suptitle(title)
     fig.tight_layout()
-    fig.savefig(output_path, dpi=150, bbox_inches="tight")
+    fig.savefig(output_path, dpi=dpi, bbox_inches="tight")
     plt.close(fig)
     logger.info("Parameter heatmap saved: %s", output_path)
     return output_path
 
 
+def plot_parameter_heatmap(
+    optimizer,
+    param_x: str,
+    param_y: str,
+    output_path: str,
+    resolution: int = 50,
+    title: str | None = None,
+    ctx: _HeatmapContext | None = None,
+    dpi: int = 100,
+) -> str:
+    """Plot 2D heatmap of GP posterior mean for a parameter pair."""
+    if optimizer._gp is None:
+        logger.warning("GP not fitted, skipping heatmap")
+        return output_path
+
+    if ctx is None or ctx.resolution != resolution or len(ctx.grid) != resolution * resolution:
+        ctx = _HeatmapContext(optimizer, resolution)
+
+    xx, yy = ctx.fill(0, optimizer.space, param_x, param_y)
+    mean, std = _predict_grid(optimizer, ctx)
+
+    return _render_heatmap(
+        xx, yy,
+        mean.reshape(resolution, resolution),
+        std.reshape(resolution, resolution),
+        _observations(optimizer, optimizer.space.index(param_x), optimizer.space.index(param_y)),
+        param_x, param_y,
+        title or f"Parameter Sensitivity: {param_x} vs {param_y}",
+        output_path, dpi,
+    )
+
+
 def plot_all_parameter_pairs(
     optimizer,
     output_dir: str,
     top_n: int = 6,
+    resolution: int = 50,
+    dpi: int = 100,
+    parallel: bool = True,
 ) -> list[str]:
-    """Generate heatmaps for top parameter pairs."""
+    """Generate heatmaps for top parameter pairs.
+
+    The GP is queried once for all pairs; figures are then rendered in a
+    process pool (falling back to serial rendering when a pool is unavailable,
+    e.g. inside daemonic worker processes).
+    """
+    from concurrent.futures import ProcessPoolExecutor
     from itertools import combinations
     from pathlib import Path
 
@@ -99,9 +183,34 @@ def plot_all_parameter_pairs(
     names = optimizer.space.names
     pairs = list(combinations(names, 2))[:top_n]
 
-    paths = []
-    for px, py in pairs:
-        path = str(Path(output_dir) / f"heatmap_{px}_vs_{py}.png")
-        plot_parameter_heatmap(optimizer, px, py, path)
-        paths.append(path)
-    return paths
+    if optimizer._gp is None:
+        logger.warning("GP not fitted, skipping heatmaps")
+        return [str(Path(output_dir) / f"heatmap_{px}_vs_{py}.png") for px, py in pairs]
+
+    ctx = _HeatmapContext(optimizer, resolution, n_pairs=len(pairs))
+    meshes = [ctx.fill(slot, optimizer.space, px, py) for slot, (px, py) in enumerate(pairs)]
+    mean, std = _predict_grid(optimizer, ctx)
+    mean = mean.reshape(len(pairs), resolution, resolution)
+    std = std.reshape(len(pairs), resolution, resolution)
+
+    jobs = [
+        (
+            xx, yy, mean[slot], std[slot],
+            _observations(optimizer, optimizer.space.index(px), optimizer.space.index(py)),
+            px, py,
+            f"Parameter Sensitivity: {px} vs {py}",
+            str(Path(output_dir) / f"heatmap_{px}_vs_{py}.png"),
+            dpi,
+        )
+        for slot, ((px, py), (xx, yy)) in enumerate(zip(pairs, meshes, strict=True))
+    ]
+
+    workers = min(MAX_RENDER_WORKERS, os.cpu_count() or 1, len(jobs))
+    if parallel and workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                return list(ex.map(_render_heatmap, *zip(*jobs, strict=True)))
+        except (OSError, RuntimeError, AssertionError) as e:
+            logger.warning("Parallel heatmap rendering unavailable (%s), rendering serially", e)
+
+    return [_render_heatmap(*job) for job in jobs]
@@ -7,6 +7,7 @@ import logging
 from typing import Optional
 
 import numpy as np
+from backend.src.learning.visualizations._sampling import decimate
 
 logger = logging.getLogger(__name__)
 
@@ -20,12 +21,16 @@ def plot_quality_distribution(
     """Plot histogram + box plot of quality scores."""
     import matplotlib.pyplot as plt
 
+    arr = np.asarray(scores, dtype=np.float64)
+    mean_v = float(arr.mean())
+    median_v = float(np.median(arr))
+
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8), gridspec_kw={"height_ratios": [3, 1]})
 
     # Histogram
-    ax1.hist(scores, bins=bins, edgecolor="black", alpha=0.7, color="steelblue")
-    ax1.axvline(np.mean(scores), color="red", linestyle="--", label=f"Mean: {np.mean(scores):.1f}")
-    ax1.axvline(np.median(scores), color="green", linestyle="--", label=f"Median: {np.median(scores):.1f}")
+    ax1.hist(arr, bins=bins, edgecolor="black", alpha=0.7, color="steelblue")
+    ax1.axvline(mean_v, color="red", linestyle="--", label=f"Mean: {mean_v:.1f}")
+    ax1.axvline(median_v, color="green", linestyle="--", label=f"Median: {median_v:.1f}")
     ax1.set_xlabel("Quality Score")
     ax1.set_ylabel("Count")
     ax1.set_title(title)
@@ -33,7 +38,7 @@ def plot_quality_distribution(
     ax1.grid(True, alpha=0.3)
 
     # Box plot
-    ax2.boxplot(scores, vert=False, widths=0.6)
+    ax2.boxplot(arr, vert=False, widths=0.6)
     ax2.set_xlabel("Quality Score")
     ax2.grid(True, alpha=0.3)
 
@@ -55,18 +60,24 @@ def plot_reward_components(
         return output_path
 
     components = list(component_history[0].keys())
-    trials = list(range(1, len(component_history) + 1))
+    n_trials, n_comp = len(component_history), len(components)
+    trials = np.arange(1, n_trials + 1)
+
+    # (n_trials, n_components) matrix built in one pass; one column per line
+    mat = np.fromiter(
+        (h.get(c, 0.0) for h in component_history for c in components),
+        dtype=np.float64,
+        count=n_trials * n_comp,
+    ).reshape(n_trials, n_comp)
 
     fig, ax = plt.subplots(1, 1, figsize=(12, 6))
 
-    for comp in components:
-        values = [h.get(comp, 0) for h in component_history]
-        ax.plot(trials, values, "-o", label=comp, markersize=3, alpha=0.8)
+    ax.plot(*decimate(trials, mat), "-o", markersize=3, alpha=0.8)
 
     ax.set_xlabel("Trial Number")
     ax.set_ylabel("Component Value")
     ax.set_title(title)
-    ax.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
+    ax.legend(components, bbox_to_anchor=(1.05, 1), loc="upper left")
     ax.grid(True, alpha=0.3)
 
     fig.tight_layout()
@@ -0,0 +1 @@
+"""事前コンパイル (AOT) 済み数値カーネル"""
@@ -0,0 +1,37 @@
+"""
+AOT Kernel Builder
+numba.pycc でスコア計算カーネルを拡張モジュール (scoring_kernels) として事前コンパイル
+
+初回呼び出し時のJITコンパイル・キャッシュ読み込みを省くためのもの。
+カーネル (src/_score_kernel.py) を変更したら再ビルドすること:
+
+    python -m src._kernels.build_aot
+"""
+
+import logging
+from pathlib import Path
+
+from numba.pycc import CC
+
+from src._score_kernel import _score_clips_kernel
+
+logger = logging.getLogger(__name__)
+
+# (starts, ends, kill_log, intensity, match_status, intensity_lut, match_lut, min_len, max_len, out)
+SCORE_CLIPS_SIGNATURE = "void(f8[:], f8[:], b1[:], i1[:], i1[:], i8[:], i8[:], f8, f8, i8[:])"
+
+
+def build(output_dir: Path = Path(__file__).parent) -> None:
+    """scoring_kernels 拡張モジュールを output_dir にビルド"""
+    cc = CC("scoring_kernels")
+    cc.output_dir = str(output_dir)
+    # JIT版と同じ関数本体をコンパイル（AOTでは prange は通常の range として扱われる）
+    kernel = getattr(_score_clips_kernel, "py_func", _score_clips_kernel)
+    cc.export("score_clips", SCORE_CLIPS_SIGNATURE)(kernel)
+    cc.compile()
+    logger.info(f"Built scoring_kernels in {output_dir}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    build()
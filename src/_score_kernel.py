@@ -0,0 +1,83 @@
+"""
+Score Kernel Module
+クリップスコア計算カーネル（事前コンパイル版 → numba JIT → NumPy の順に使用）
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba は任意依存
+    NUMBA_AVAILABLE = False
+    prange = range
+
+try:
+    # python -m src._kernels.build_aot でビルドした拡張モジュール（JITコンパイル待ちなし）
+    from src._kernels.scoring_kernels import score_clips as _aot_score_clips
+    AOT_AVAILABLE = True
+except ImportError:
+    AOT_AVAILABLE = False
+
+# カテゴリ → int8 コード（未知の値は末尾のコード = 0点）
+INTENSITY_CODES = {"very_high": 0, "high": 1, "medium": 2, "low": 3}
+INTENSITY_LUT = np.array([8, 6, 4, 2, 0], dtype=np.int64)
+MATCH_STATUS_CODES = {"victory": 0, "clutch": 1}
+MATCH_STATUS_LUT = np.array([5, 7, 0], dtype=np.int64)
+KILL_LOG_BONUS = 10
+
+
+def encode_intensity(values) -> np.ndarray:
+    """アクション強度の列を int8 コード配列に変換"""
+    unknown = len(INTENSITY_CODES)
+    return np.fromiter((INTENSITY_CODES.get(v, unknown) for v in values), dtype=np.int8)
+
+
+def encode_match_status(values) -> np.ndarray:
+    """マッチステータスの列を int8 コード配列に変換"""
+    unknown = len(MATCH_STATUS_CODES)
+    return np.fromiter((MATCH_STATUS_CODES.get(v, unknown) for v in values), dtype=np.int8)
+
+
+def _score_clips_kernel(starts, ends, kill_log, intensity, match_status,
+                        intensity_lut, match_lut, min_len, max_len, out):
+    """各クリップのスコアを out に書き込む（キルログ + 強度 + ステータス + 長さペナルティ）"""
+    for i in prange(starts.shape[0]):
+        score = intensity_lut[intensity[i]] + match_lut[match_status[i]]
+        if kill_log[i]:
+            score += KILL_LOG_BONUS
+        duration = ends[i] - starts[i]
+        if duration > max_len:
+            score -= 2
+        elif duration < min_len:
+            score -= 1
+        out[i] = score
+
+
+if NUMBA_AVAILABLE:
+    _score_clips_kernel = njit(cache=True, parallel=True)(_score_clips_kernel)
+
+
+def score_clips(starts: np.ndarray, ends: np.ndarray, kill_log: np.ndarray,
+                intensity: np.ndarray, match_status: np.ndarray,
+                min_len: float, max_len: float) -> np.ndarray:
+    """
+    クリップごとのスコア配列（int64）を返す
+
+    kill_log / intensity / match_status は各クリップに対応する分析結果の値
+    （intensity / match_status は encode_* で変換したコード）
+    """
+    if AOT_AVAILABLE or NUMBA_AVAILABLE:
+        kernel = _aot_score_clips if AOT_AVAILABLE else _score_clips_kernel
+        out = np.empty(len(starts), dtype=np.int64)
+        kernel(starts, ends, kill_log, intensity, match_status,
+               INTENSITY_LUT, MATCH_STATUS_LUT, float(min_len), float(max_len), out)
+        return out
+
+    # numba なし: ルックアップテーブルによるベクトル化版
+    durations = ends - starts
+    penalty = np.where(durations > max_len, -2, np.where(durations < min_len, -1, 0))
+    return (
+        INTENSITY_LUT[intensity] + MATCH_STATUS_LUT[match_status]
+        + np.where(kill_log, KILL_LOG_BONUS, 0) + penalty
+    )
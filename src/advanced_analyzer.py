@@ -5,10 +5,68 @@ Advanced AI Analyzer Module
 
 import logging
 from typing import List, Dict, Optional
-import statistics
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba は任意依存
+    NUMBA_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# 興奮度スコアのルックアップテーブル（カテゴリ → コード → スコア）
+_INTENSITY_IDX = {"very_high": 0, "high": 1, "medium": 2, "low": 3}
+_INTENSITY_LUT = np.array([15, 10, 5, 0], dtype=np.int16)
+_STATUS_IDX = {"victory": 0, "clutch": 1, "defeat": 2, "normal": 3}
+_STATUS_LUT = np.array([10, 15, -5, 0], dtype=np.int16)
+
+
+def _momentum_shift_kernel(scores, window, threshold, out_idx, out_change):
+    """
+    前後ウィンドウの移動平均差が閾値を超える位置を検出（累積和で O(N)）
+
+    scores は長さ 2*window 以上であること。検出数を返す。
+    """
+    sum_before = 0.0
+    sum_after = 0.0
+    for k in range(window):
+        sum_before += scores[k]
+        sum_after += scores[k + window]
+
+    count = 0
+    for i in range(scores.shape[0] - 2 * window + 1):
+        if i > 0:
+            sum_before += scores[i + window - 1] - scores[i - 1]
+            sum_after += scores[i + 2 * window - 1] - scores[i + window - 1]
+        change = (sum_after - sum_before) / window
+        if abs(change) > threshold:
+            out_idx[count] = i + window
+            out_change[count] = change
+            count += 1
+    return count
+
+
+if NUMBA_AVAILABLE:
+    _momentum_shift_kernel = njit(cache=True)(_momentum_shift_kernel)
+
+
+def _momentum_shifts(scores: np.ndarray, window: int, threshold: float):
+    """モメンタムシフトの (位置, 変化量) 配列を返す"""
+    if NUMBA_AVAILABLE:
+        out_idx = np.empty(len(scores), dtype=np.int64)
+        out_change = np.empty(len(scores), dtype=np.float64)
+        count = _momentum_shift_kernel(scores, window, threshold, out_idx, out_change)
+        return out_idx[:count], out_change[:count]
+
+    # numba なし: 累積和によるベクトル化版
+    csum = np.concatenate(([0.0], np.cumsum(scores)))
+    window_sums = csum[window:] - csum[:-window]
+    change = (window_sums[window:] - window_sums[:-window]) / window
+    hits = np.flatnonzero(np.abs(change) > threshold)
+    return hits + window, change[hits]
+
 
 class AdvancedAnalyzer:
     """高度なAI分析クラス"""
@@ -29,41 +87,33 @@ class AdvancedAnalyzer:
         """
         logger.info("Analyzing excitement levels")
 
-        enhanced_results = []
-
-        for result in analysis_results:
-            excitement_score = 0
-
-            # キルログ
-            if result.get("kill_log", False):
-                excitement_score += 20
-
-            # アクション強度
-            action_intensity = result.get("action_intensity", "low")
-            intensity_scores = {
-                "very_high": 15,
-                "high": 10,
-                "medium": 5,
-                "low": 0
-            }
-            excitement_score += intensity_scores.get(action_intensity, 0)
-
-            # マッチステータス
-            match_status = result.get("match_status", "normal")
-            status_scores = {
-                "victory": 10,
-                "clutch": 15,
-                "defeat": -5,
-                "normal": 0
-            }
-            excitement_score += status_scores.get(match_status, 0)
-
-            enhanced_results.append({
-                **result,
-                "excitement_score": excitement_score
-            })
+        n = len(analysis_results)
+        if n == 0:
+            return []
 
-        return enhanced_results
+        # カテゴリをコード配列に変換し、スコアを一括計算
+        kills = np.fromiter(
+            (bool(r.get("kill_log", False)) for r in analysis_results),
+            dtype=np.bool_, count=n
+        )
+        intensity_codes = np.fromiter(
+            (_INTENSITY_IDX.get(r.get("action_intensity", "low"), 3) for r in analysis_results),
+            dtype=np.int8, count=n
+        )
+        status_codes = np.fromiter(
+            (_STATUS_IDX.get(r.get("match_status", "normal"), 3) for r in analysis_results),
+            dtype=np.int8, count=n
+        )
+        scores = (
+            _INTENSITY_LUT[intensity_codes]
+            + _STATUS_LUT[status_codes]
+            + kills.astype(np.int16) * 20
+        )
+
+        return [
+            {**result, "excitement_score": score}
+            for result, score in zip(analysis_results, scores.tolist())
+        ]
 
     def detect_multi_kills(self, analysis_results: List[Dict],
                           time_window: float = 10.0) -> List[Dict]:
@@ -88,30 +138,28 @@ class AdvancedAnalyzer:
             return []
 
         multi_kills = []
-        kill_timestamps.sort()
+        ts = np.sort(np.asarray(kill_timestamps, dtype=np.float64))
 
-        i = 0
-        while i < len(kill_timestamps):
-            window_start = kill_timestamps[i]
-            kills_in_window = 1
+        # 各キルを起点とした時間窓の終端インデックスを二分探索で一括取得
+        end = np.searchsorted(ts, ts + time_window, side="right")
+        counts = end - np.arange(len(ts))
 
-            # 時間窓内のキルをカウント
-            j = i + 1
-            while j < len(kill_timestamps) and kill_timestamps[j] - window_start <= time_window:
-                kills_in_window += 1
-                j += 1
+        i = 0
+        while i < len(ts):
+            kills_in_window = int(counts[i])
 
             # マルチキル判定
             if kills_in_window >= 2:
                 kill_type = self._classify_multi_kill(kills_in_window)
                 multi_kills.append({
                     "type": kill_type,
-                    "timestamp": window_start,
+                    "timestamp": float(ts[i]),
                     "kill_count": kills_in_window,
-                    "end_timestamp": kill_timestamps[j - 1] if j > i else window_start
+                    "end_timestamp": float(ts[end[i] - 1])
                 })
 
-            i = j if j > i else i + 1
+            # 窓内のキルは次の起点にしない
+            i = int(end[i])
 
         logger.info(f"Detected {len(multi_kills)} multi-kill events")
         return multi_kills
@@ -169,38 +217,29 @@ class AdvancedAnalyzer:
             return []
 
         # 興奮度の時系列データ
-        excitement_timeline = [
-            (r["timestamp"], r.get("excitement_score", 0))
-            for r in analysis_results
-            if "excitement_score" in r
-        ]
-
-        if not excitement_timeline:
-            return []
-
-        shifts = []
+        timeline = [r for r in analysis_results if "excitement_score" in r]
 
         # 移動平均でトレンドを計算
         window_size = 5
-        for i in range(len(excitement_timeline) - window_size):
-            window_before = excitement_timeline[i:i + window_size]
-            window_after = excitement_timeline[i + window_size:i + window_size * 2]
-
-            if len(window_after) < window_size:
-                break
+        if len(timeline) < window_size * 2:
+            return []
 
-            avg_before = statistics.mean([x[1] for x in window_before])
-            avg_after = statistics.mean([x[1] for x in window_after])
+        times = np.fromiter((r["timestamp"] for r in timeline), dtype=np.float64, count=len(timeline))
+        scores = np.fromiter(
+            (r.get("excitement_score", 0) for r in timeline), dtype=np.float64, count=len(timeline)
+        )
 
-            # 大きな変化を検出
-            change = avg_after - avg_before
+        # 大きな変化を検出（閾値 10）
+        idx, changes = _momentum_shifts(scores, window_size, 10.0)
 
-            if abs(change) > 10:  # 閾値
-                shifts.append({
-                    "timestamp": excitement_timeline[i + window_size][0],
-                    "type": "momentum_up" if change > 0 else "momentum_down",
-                    "magnitude": abs(change)
-                })
+        shifts = [
+            {
+                "timestamp": t,
+                "type": "momentum_up" if change > 0 else "momentum_down",
+                "magnitude": abs(change)
+            }
+            for t, change in zip(times[idx].tolist(), changes.tolist())
+        ]
 
         logger.info(f"Detected {len(shifts)} momentum shifts")
         return shifts
@@ -221,45 +260,50 @@ class AdvancedAnalyzer:
         """
         logger.info("Suggesting highlights from patterns")
 
-        highlights = []
-
-        # マルチキルは必ず含める
-        for mk in multi_kills:
-            highlights.append({
-                "start": max(0, mk["timestamp"] - 3),
-                "end": mk.get("end_timestamp", mk["timestamp"]) + 3,
-                "type": "multi_kill",
-                "priority": 10,
-                "label": mk["type"]
+        # 高興奮度シーンはスコア配列のマスクで一括抽出
+        excite = np.fromiter(
+            (r.get("excitement_score", 0) for r in analysis_results),
+            dtype=np.float64, count=len(analysis_results)
+        )
+        hot = np.flatnonzero(excite >= 25).tolist()
+        hot_ts = np.fromiter(
+            (analysis_results[i]["timestamp"] for i in hot), dtype=np.float64, count=len(hot)
+        )
+        mk_ts = np.fromiter((mk["timestamp"] for mk in multi_kills), dtype=np.float64,
+                            count=len(multi_kills))
+        mk_end = np.fromiter((mk.get("end_timestamp", mk["timestamp"]) for mk in multi_kills),
+                             dtype=np.float64, count=len(multi_kills))
+        cm_ts = np.fromiter((cm["timestamp"] for cm in clutch_moments), dtype=np.float64,
+                            count=len(clutch_moments))
+
+        # 優先度順（マルチキル 10 → クラッチ 9 → 高興奮度 7）に列を連結
+        starts = np.maximum(0, np.concatenate((mk_ts - 3, cm_ts - 5, hot_ts - 2)))
+        ends = np.concatenate((mk_end + 3, cm_ts + 5, hot_ts + 3))
+        priorities = np.repeat([10, 9, 7], (len(mk_ts), len(cm_ts), len(hot_ts)))
+
+        n_mk = len(mk_ts)
+        n_mk_cm = n_mk + len(cm_ts)
+
+        def kind(row: int):
+            if row < n_mk:
+                return "multi_kill", multi_kills[row]["type"]
+            if row < n_mk_cm:
+                return "clutch", "CLUTCH"
+            return "high_excitement", "INTENSE"
+
+        # 重複を削除（時間が重なるクリップをマージ）し、残った行だけ dict 化
+        starts_l = starts.tolist()
+        merged_highlights = []
+        for head, end, priority, _ in self._merge_sweep(starts, ends, priorities.tolist()):
+            clip_type, label = kind(head)
+            merged_highlights.append({
+                "start": starts_l[head],
+                "end": end,
+                "type": clip_type,
+                "priority": priority,
+                "label": label
             })
 
-        # クラッチモーメント
-        for cm in clutch_moments:
-            highlights.append({
-                "start": max(0, cm["timestamp"] - 5),
-                "end": cm["timestamp"] + 5,
-                "type": "clutch",
-                "priority": 9,
-                "label": "CLUTCH"
-            })
-
-        # 高興奮度シーン
-        for result in analysis_results:
-            if result.get("excitement_score", 0) >= 25:
-                highlights.append({
-                    "start": max(0, result["timestamp"] - 2),
-                    "end": result["timestamp"] + 3,
-                    "type": "high_excitement",
-                    "priority": 7,
-                    "label": "INTENSE"
-                })
-
-        # 優先度順にソート
-        highlights.sort(key=lambda x: x.get("priority", 0), reverse=True)
-
-        # 重複を削除（時間が重なるクリップをマージ）
-        merged_highlights = self._merge_overlapping_clips(highlights)
-
         logger.info(f"Suggested {len(merged_highlights)} highlight clips")
         return merged_highlights
 
@@ -268,55 +312,110 @@ class AdvancedAnalyzer:
         if not clips:
             return []
 
-        # 開始時間でソート
-        sorted_clips = sorted(clips, key=lambda x: x["start"])
+        n = len(clips)
+        starts = np.fromiter((c["start"] for c in clips), dtype=np.float64, count=n)
+        ends = np.fromiter((c["end"] for c in clips), dtype=np.float64, count=n)
+        prio_l = [c.get("priority", 0) for c in clips]
+
+        # 生き残った行だけ dict 化（優先度の高い方のタイプを維持）
+        merged = []
+        for head, end, priority, was_merged in self._merge_sweep(starts, ends, prio_l):
+            first = clips[head]
+            if not was_merged:
+                merged.append(first)
+                continue
+            merged.append({
+                "start": first["start"],
+                "end": end,
+                "type": first["type"],
+                "priority": priority,
+                "label": first.get("label", "")
+            })
 
-        merged = [sorted_clips[0]]
+        return merged
 
-        for current in sorted_clips[1:]:
-            last = merged[-1]
+    @staticmethod
+    def _merge_sweep(starts: np.ndarray, ends: np.ndarray, prio_l: List) -> List[tuple]:
+        """
+        開始時間順のスイープで重なる区間をマージ
 
+        Returns:
+            [(先頭行インデックス, end, priority, マージされたか), ...]
+        """
+        if not len(starts):
+            return []
+
+        # 開始時間でソート（安定ソートで同時刻は入力順＝優先度順を維持）
+        order = np.argsort(starts, kind="stable").tolist()
+        ends_l = ends.tolist()
+        starts_l = starts.tolist()
+
+        # 先頭クリップのインデックスと end/priority のみ更新
+        heads = [order[0]]
+        out_end = [ends_l[order[0]]]
+        out_prio = [prio_l[order[0]]]
+        merged_flag = [False]
+
+        for idx in order[1:]:
             # 重複チェック
-            if current["start"] <= last["end"]:
-                # マージ
-                merged[-1] = {
-                    "start": min(last["start"], current["start"]),
-                    "end": max(last["end"], current["end"]),
-                    "type": last["type"],  # 優先度の高い方のタイプを維持
-                    "priority": max(last.get("priority", 0), current.get("priority", 0)),
-                    "label": last.get("label", "")
-                }
+            if starts_l[idx] <= out_end[-1]:
+                if ends_l[idx] > out_end[-1]:
+                    out_end[-1] = ends_l[idx]
+                if prio_l[idx] > out_prio[-1]:
+                    out_prio[-1] = prio_l[idx]
+                merged_flag[-1] = True
             else:
-                merged.append(current)
+                heads.append(idx)
+                out_end.append(ends_l[idx])
+                out_prio.append(prio_l[idx])
+                merged_flag.append(False)
 
-        return merged
+        return list(zip(heads, out_end, out_prio, merged_flag))
 
-    def calculate_clip_quality_score(self, clip: Dict, analysis_results: List[Dict]) -> float:
+    def _prepare_arrays(self, analysis_results: List[Dict]):
+        """
+        分析結果をタイムスタンプ順の配列に変換（クリップ評価の前処理）
+
+        Returns:
+            (timestamps, excitement_scores, kill_flags)
+        """
+        n = len(analysis_results)
+        ts = np.fromiter((r.get("timestamp", 0) for r in analysis_results), dtype=np.float64, count=n)
+        excite = np.fromiter(
+            (r.get("excitement_score", 0) for r in analysis_results), dtype=np.float64, count=n
+        )
+        kills = np.fromiter(
+            (bool(r.get("kill_log", False)) for r in analysis_results), dtype=np.int8, count=n
+        )
+        order = np.argsort(ts, kind="stable")
+        return ts[order], excite[order], kills[order]
+
+    def calculate_clip_quality_score(self, clip: Dict, analysis_results: List[Dict],
+                                     arrays=None) -> float:
         """
         クリップの品質スコアを計算
 
         Args:
             clip: クリップ情報
             analysis_results: AI分析結果
+            arrays: _prepare_arrays() の結果（複数クリップを評価する場合に再利用）
 
         Returns:
             品質スコア（0-100）
         """
-        # クリップ内の分析結果を取得
-        clip_analyses = [
-            r for r in analysis_results
-            if clip["start"] <= r.get("timestamp", 0) <= clip["end"]
-        ]
+        ts, excite, kills = arrays if arrays is not None else self._prepare_arrays(analysis_results)
+
+        # クリップ内の分析結果を二分探索で取得
+        lo = int(np.searchsorted(ts, clip["start"], side="left"))
+        hi = int(np.searchsorted(ts, clip["end"], side="right"))
 
-        if not clip_analyses:
+        if hi <= lo:
             return 0.0
 
         score = 0.0
 
         # 平均興奮度
-        avg_excitement = statistics.mean([
-            r.get("excitement_score", 0) for r in clip_analyses
-        ])
+        avg_excitement = float(excite[lo:hi].mean())
         score += min(50, avg_excitement * 2)
 
         # クリップの長さ（5-10秒が理想）
@@ -327,7 +426,7 @@ class AdvancedAnalyzer:
             score += 10
 
         # アクション密度（キル数/秒）
-        kill_count = sum(1 for r in clip_analyses if r.get("kill_log", False))
+        kill_count = int(kills[lo:hi].sum())
         action_density = kill_count / duration if duration > 0 else 0
         score += min(30, action_density * 100)
 
@@ -347,12 +446,11 @@ class AdvancedAnalyzer:
             return {"variety_score": 0, "issues": ["no_clips"]}
 
         # クリップタイプの分布
-        types = [c.get("type", "unknown") for c in clips]
-        unique_types = len(set(types))
+        unique_types = len({c.get("type", "unknown") for c in clips})
 
-        # クリップ長のバラエティ
-        durations = [c["end"] - c["start"] for c in clips]
-        duration_variance = statistics.variance(durations) if len(durations) > 1 else 0
+        # クリップ長のバラエティ（不偏分散）
+        durations = np.fromiter((c["end"] - c["start"] for c in clips), dtype=np.float64, count=len(clips))
+        duration_variance = float(durations.var(ddof=1)) if durations.size > 1 else 0
 
         # バラエティスコア計算
         variety_score = (unique_types * 20) + min(30, duration_variance * 5)
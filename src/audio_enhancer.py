@@ -6,9 +6,25 @@ AI音声強化モジュール - ノイズキャンセル、音声クリアネス
 import logging
 import subprocess
 from pathlib import Path
+from typing import List
+
+from src.ffmpeg_runner import run_ffmpeg
+from src.media_probe import probe_video
 
 logger = logging.getLogger(__name__)
 FFMPEG_PATH = "ffmpeg"
+STDERR_TAIL_BYTES = 4096
+
+# highpass + lowpass + afftdn (FFTベースノイズ除去)
+NOISE_REMOVAL_FILTERS = ["highpass=f=200", "lowpass=f=3000", "afftdn=nf=-25"]
+
+# EQ + compressor + gate
+VOICE_CLARITY_FILTERS = [
+    "equalizer=f=300:width_type=o:width=2:g=3",
+    "equalizer=f=3000:width_type=o:width=2:g=5",
+    "acompressor=threshold=-20dB:ratio=4:attack=5:release=50",
+    "agate=threshold=-50dB:ratio=2",
+]
 
 
 class AudioEnhancer:
@@ -18,44 +34,97 @@ class AudioEnhancer:
         self.config = config
         self.audio_config = config.get("audio_enhancer", {})
 
-    def remove_background_noise(self, input_path: str, output_path: str) -> str:
-        """背景ノイズ除去 (RNNoise風)"""
-        logger.info("Removing background noise from audio")
+    def enhance_all(self, input_path: str, output_path: str,
+                    remove_noise: bool = None, enhance_voice: bool = None) -> str:
+        """
+        ノイズ除去と音声クリアネス向上を1回のFFmpeg実行で適用
+
+        フィルタを1つの -af グラフに連結するため、AACのデコード/エンコードは1回のみ
+
+        Args:
+            input_path: 入力動画
+            output_path: 出力動画
+            remove_noise: ノイズ除去を行うか（None の場合は設定値）
+            enhance_voice: 音声クリアネス向上を行うか（None の場合は設定値）
+        """
+        if remove_noise is None:
+            remove_noise = self.audio_config.get("remove_noise", True)
+        if enhance_voice is None:
+            enhance_voice = self.audio_config.get("enhance_voice_clarity", True)
+
+        filters: List[str] = []
+        if remove_noise:
+            filters.extend(NOISE_REMOVAL_FILTERS)
+        if enhance_voice:
+            filters.extend(VOICE_CLARITY_FILTERS)
+
+        if not filters:
+            logger.info("No audio enhancement enabled, skipping")
+            return str(input_path)
+
+        logger.info(f"Enhancing audio with {len(filters)} filters in a single pass")
+        self._run_filters(input_path, output_path, filters)
+        return str(output_path)
 
-        # highpass + lowpass + afftdn (FFTベースノイズ除去)
-        filter_str = "highpass=f=200,lowpass=f=3000,afftdn=nf=-25"
+    def enhance_audio_track(self, input_path: str, output_path: str) -> str:
+        """
+        音声トラックのみに音声クリアネス向上を適用して書き出す（映像は含めない .m4a 等）
 
+        映像の強化と並列に実行し、最後に mux_audio() で結合するためのもの。
+        enhance_voice_clarity() と同じフィルタのみ（ゲーム音を帯域制限するノイズ除去はかけない）。
+        入力に音声がない場合は書き出さずに入力パスを返す
+        """
+        if not probe_video(input_path).has_audio:
+            logger.info("No audio stream, skipping audio enhancement")
+            return str(input_path)
+
+        logger.info("Enhancing voice clarity of the audio track")
+        self._run_filters(input_path, output_path, VOICE_CLARITY_FILTERS, audio_only=True)
+        return str(output_path)
+
+    def mux_audio(self, video_path: str, audio_path: str, output_path: str) -> str:
+        """映像と強化済み音声をストリームコピーで結合（再エンコードなし）"""
         cmd = [
-            FFMPEG_PATH, "-y", "-i", str(input_path),
-            "-af", filter_str,
-            "-c:v", "copy",
-            "-c:a", "aac", "-b:a", "192k",
+            FFMPEG_PATH, "-y",
+            "-i", str(video_path), "-i", str(audio_path),
+            "-map", "0:v", "-map", "1:a",
+            "-c", "copy",
             str(output_path)
         ]
+        self._run(cmd, "FFmpeg audio mux failed")
+        return str(output_path)
 
-        subprocess.run(cmd, check=True, capture_output=True)
+    def remove_background_noise(self, input_path: str, output_path: str) -> str:
+        """背景ノイズ除去 (RNNoise風)"""
+        logger.info("Removing background noise from audio")
+        self.enhance_all(input_path, output_path, remove_noise=True, enhance_voice=False)
         logger.info("Background noise removal completed")
         return str(output_path)
 
     def enhance_voice_clarity(self, input_path: str, output_path: str) -> str:
         """音声クリアネス向上"""
         logger.info("Enhancing voice clarity")
+        return self.enhance_all(input_path, output_path, remove_noise=False, enhance_voice=True)
 
-        # EQ + compressor + gate
-        filter_str = (
-            "equalizer=f=300:width_type=o:width=2:g=3,"
-            "equalizer=f=3000:width_type=o:width=2:g=5,"
-            "acompressor=threshold=-20dB:ratio=4:attack=5:release=50,"
-            "agate=threshold=-50dB:ratio=2"
-        )
-
+    def _run_filters(self, input_path: str, output_path: str, filters: List[str],
+                     audio_only: bool = False) -> None:
+        """音声フィルタチェーンを適用（映像はコピー、audio_only なら映像を含めない）"""
         cmd = [
             FFMPEG_PATH, "-y", "-i", str(input_path),
-            "-af", filter_str,
-            "-c:v", "copy",
+            "-af", ",".join(filters),
+            *(["-vn"] if audio_only else ["-c:v", "copy"]),
             "-c:a", "aac", "-b:a", "192k",
             str(output_path)
         ]
+        self._run(cmd, "FFmpeg audio filtering failed")
 
-        subprocess.run(cmd, check=True, capture_output=True)
-        return str(output_path)
+    def _run(self, cmd: List[str], error_message: str) -> None:
+        """FFmpegを実行し、失敗時は stderr の末尾をログに残して再送出"""
+        # stderr は run_ffmpeg が逐次読み、末尾のみ保持する
+        try:
+            run_ffmpeg(cmd)
+        except subprocess.CalledProcessError as e:
+            # 長時間の処理では進捗ログが肥大化するため末尾のみ記録
+            tail = (e.stderr or "")[-STDERR_TAIL_BYTES:]
+            logger.error(f"{error_message}: {tail}")
+            raise
@@ -3,12 +3,18 @@ Audio Processing Module
 オーディオの処理と改善
 """
 
-import subprocess
+import hashlib
+import json
+import re
 import logging
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 import os
 import shutil
+import threading
+
+from src.ffmpeg_runner import run_ffmpeg, run_ffmpeg_async
+from src.media_probe import probe_video
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +39,235 @@ def get_ffmpeg_path():
 FFMPEG_PATH = get_ffmpeg_path()
 
 
+def _output_args(output_path, final: bool) -> List[str]:
+    """
+    出力指定を作成
+
+    faststart は書き出し後にファイル全体を書き直す2パス目になるため、
+    配信される最終出力にだけ付け、中間ファイルには付けない
+    """
+    if final and Path(output_path).suffix.lower() in (".mp4", ".mov", ".m4a"):
+        return ["-movflags", "+faststart", str(output_path)]
+    return [str(output_path)]
+
+
+# ラウドネス測定結果のキャッシュ（同じ素材の再処理では測定を省略）
+LOUDNESS_CACHE_PATH = Path.home() / ".cache" / "movie_auto_editor" / "loudness.json"
+FINGERPRINT_BYTES = 1 << 20
+_loudness_lock = threading.Lock()
+_EBUR128_I_RE = re.compile(r"^\s*I:\s*(-?[\d.]+|-inf) LUFS", re.MULTILINE)
+_EBUR128_PEAK_RE = re.compile(r"^\s*Peak:\s*(-?[\d.]+|-inf) dBFS", re.MULTILINE)
+
+
+def _fingerprint(path) -> str:
+    """サイズと先頭・末尾1MiBから内容の指紋を作る（同じ内容で再生成されたファイルも一致）"""
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            f.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def measure_loudness(path) -> Optional[Tuple[float, float]]:
+    """
+    ebur128 で統合ラウドネス (LUFS) とトゥルーピーク (dBFS) を測定
+
+    結果は内容の指紋をキーに LOUDNESS_CACHE_PATH に保存し、2回目以降は測定を省略する。
+    無音や測定失敗時は None
+    """
+    key = _fingerprint(path)
+    with _loudness_lock:
+        try:
+            cache = json.loads(LOUDNESS_CACHE_PATH.read_text())
+        except (OSError, ValueError):
+            cache = {}
+    if key in cache:
+        integrated, peak = cache[key]
+        return integrated, peak
+
+    cmd = [FFMPEG_PATH, "-i", str(path), "-vn", "-af", "ebur128=peak=true", "-f", "null", "-"]
+    # ebur128 のサマリーは info レベルで出力される
+    result = run_ffmpeg(cmd, check=False, loglevel="info")
+    i_match = _EBUR128_I_RE.findall(result.stderr)
+    peak_match = _EBUR128_PEAK_RE.findall(result.stderr)
+    if result.returncode != 0 or not i_match or not peak_match:
+        logger.warning(f"Loudness measurement failed for {path}")
+        return None
+
+    integrated, peak = float(i_match[-1]), float(peak_match[-1])
+    if integrated <= -70.0:  # ゲート以下（無音）
+        return None
+
+    with _loudness_lock:
+        try:
+            cache = json.loads(LOUDNESS_CACHE_PATH.read_text())
+        except (OSError, ValueError):
+            cache = {}
+        cache[key] = [integrated, peak]
+        LOUDNESS_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = LOUDNESS_CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(cache))
+        os.replace(tmp_path, LOUDNESS_CACHE_PATH)
+
+    logger.info(f"Measured loudness: {integrated} LUFS, peak {peak} dBFS")
+    return integrated, peak
+
+
+# 個別処理で使うフィルター
+LOUDNESS_TARGET_LUFS = -16.0
+LOUDNESS_TRUE_PEAK_DB = -1.5
+LOUDNORM_FILTER = f"loudnorm=I={LOUDNESS_TARGET_LUFS:g}:TP={LOUDNESS_TRUE_PEAK_DB:g}:LRA=11"
+GAME_EQ_FILTER = "equalizer=f=2000:width_type=h:width=1000:g=3,equalizer=f=8000:width_type=h:width=2000:g=2"
+NOISE_FILTER = "highpass=f=200,lowpass=f=3000,afftdn=nf=-25"
+
+
+class AudioChain:
+    """
+    オーディオ処理を1つのフィルターグラフにまとめるビルダー
+
+    各メソッドはフィルターを蓄積するだけで、render() で1回だけFFmpegを実行する。
+    映像ストリームのコピー・AACエンコードは処理の数に関係なく1回で済む
+    """
+
+    def __init__(self):
+        self._filters: List[str] = []
+        self._music: Optional[tuple] = None
+        self._fade: Optional[tuple] = None
+
+    def normalize(self, measured: Optional[Tuple[float, float]] = None) -> "AudioChain":
+        """
+        EBU R128ラウドネス正規化
+
+        measured に入力の測定値 (measure_loudness の結果) を渡すと、loudnorm の代わりに
+        目標値との差分を一定ゲインとして掛けるだけになる（ピークが上限を超えない範囲）。
+        測定値は入力ファイルのものなので、チェーンの最初に追加すること
+        """
+        if measured is None:
+            self._filters.append(LOUDNORM_FILTER)
+        else:
+            integrated, peak = measured
+            gain = min(LOUDNESS_TARGET_LUFS - integrated, LOUDNESS_TRUE_PEAK_DB - peak)
+            self._filters.append(f"volume={gain:.2f}dB:precision=float")
+        return self
+
+    def enhance_game(self) -> "AudioChain":
+        """中域・高域を強調して銃声を際立たせる"""
+        self._filters.append(GAME_EQ_FILTER)
+        return self
+
+    def denoise(self) -> "AudioChain":
+        """背景ノイズ除去"""
+        self._filters.append(NOISE_FILTER)
+        return self
+
+    def bass_boost(self, gain: int = 5) -> "AudioChain":
+        """低音ブースト"""
+        self._filters.append(f"equalizer=f=100:width_type=h:width=50:g={gain}")
+        return self
+
+    def fade(self, fade_in: float = 1.0, fade_out: float = 1.0) -> "AudioChain":
+        """フェードイン・アウト（BGMを含めた最終ミックスに適用）"""
+        self._fade = (fade_in, fade_out)
+        return self
+
+    def background_music(self, music_path: str, video_volume: float = 0.7,
+                         music_volume: float = 0.3) -> "AudioChain":
+        """BGMをループさせてミックス"""
+        self._music = (music_path, video_volume, music_volume)
+        return self
+
+    def render(self, input_path: str, output_path: str,
+               label: str = "Audio processing", final: bool = False) -> str:
+        """
+        蓄積した処理を1回のFFmpeg実行で適用
+
+        Args:
+            input_path: 入力動画
+            output_path: 出力パス
+            label: ログ・エラーメッセージ用の処理名
+            final: 最終出力か（True の場合のみ faststart で moov を先頭に移動）
+        """
+        duration = probe_video(input_path).duration if self._fade else 0.0
+        cmd = self.command(input_path, _output_args(output_path, final), duration)
+
+        result = run_ffmpeg(cmd, check=False)
+
+        if result.returncode != 0:
+            logger.error(f"{label} failed: {result.stderr}")
+            raise RuntimeError(f"{label} failed")
+
+        return str(output_path)
+
+    async def render_async(self, input_path: str, output_path: str,
+                           label: str = "Audio processing", final: bool = False,
+                           on_progress: Optional[Callable[[float], None]] = None) -> str:
+        """
+        render() の非同期版
+
+        FFmpegを asyncio のサブプロセスとして待つため、他の処理と並行して実行できる
+
+        Args:
+            on_progress: 進捗コールバック（処理済みの秒数）
+        """
+        duration = probe_video(input_path).duration if self._fade else 0.0
+        cmd = self.command(input_path, _output_args(output_path, final), duration)
+
+        result = await run_ffmpeg_async(cmd, check=False, on_progress=on_progress)
+
+        if result.returncode != 0:
+            logger.error(f"{label} failed: {result.stderr}")
+            raise RuntimeError(f"{label} failed")
+
+        return str(output_path)
+
+    def command(self, input_arg: str, output_args: List[str], duration: float = 0.0) -> List[str]:
+        """
+        FFmpegコマンドを組み立てる
+
+        Args:
+            input_arg: 入力ファイルパス
+            output_args: 出力指定（_output_args の結果）
+            duration: 動画の長さ（フェードアウト位置の計算用）
+        """
+        filters = list(self._filters)
+        post: List[str] = []
+        if self._fade:
+            fade_in, fade_out = self._fade
+            fade_out_start = duration - fade_out
+            post.append(f"afade=t=in:st=0:d={fade_in},afade=t=out:st={fade_out_start}:d={fade_out}")
+
+        cmd = [FFMPEG_PATH, "-y", "-i", str(input_arg)]
+        if self._music:
+            music_path, video_volume, music_volume = self._music
+            game = ",".join(filters + [f"volume={video_volume}"])
+            graph = (
+                f"[0:a]{game}[a0];[1:a]volume={music_volume}[a1];"
+                f"[a0][a1]amix=inputs=2:duration=first"
+            )
+            if post:
+                graph += "," + ",".join(post)
+            cmd += [
+                "-stream_loop", "-1",  # BGMをループ
+                "-i", music_path,
+                "-filter_complex", graph + "[aout]",
+                "-map", "0:v",
+                "-map", "[aout]",
+            ]
+        else:
+            chain = filters + post
+            if chain:
+                cmd += ["-af", ",".join(chain)]
+
+        cmd += ["-c:v", "copy", "-c:a", "aac", "-b:a", "192k"]
+        if self._music:
+            cmd.append("-shortest")  # 動画の長さに合わせる
+        cmd += output_args
+        return cmd
+
+
 class AudioProcessor:
     """オーディオ処理クラス"""
 
@@ -40,9 +275,17 @@ class AudioProcessor:
         self.config = config
         self.audio_config = config.get("audio_processing", {})
 
+    def build_chain(self) -> AudioChain:
+        """
+        複数のオーディオ処理を1パスで適用するチェーンを作成
+
+        例: processor.build_chain().normalize().enhance_game().fade(1.0, 1.0).render(src, dst)
+        """
+        return AudioChain()
+
     def add_background_music(self, video_path: str, music_path: str,
                             output_path: str, video_volume: float = 0.7,
-                            music_volume: float = 0.3) -> str:
+                            music_volume: float = 0.3, final: bool = False) -> str:
         """
         BGMを追加
 
@@ -52,32 +295,15 @@ class AudioProcessor:
             output_path: 出力パス
             video_volume: ゲーム音量（0.0-1.0）
             music_volume: BGM音量（0.0-1.0）
+            final: 最終出力か（faststart を付ける）
         """
         logger.info(f"Adding background music: {music_path}")
 
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", video_path,
-            "-stream_loop", "-1",  # BGMをループ
-            "-i", music_path,
-            "-filter_complex",
-            f"[0:a]volume={video_volume}[a0];[1:a]volume={music_volume}[a1];[a0][a1]amix=inputs=2:duration=first[aout]",
-            "-map", "0:v",
-            "-map", "[aout]",
-            "-c:v", "copy",
-            "-c:a", "aac",
-            "-shortest",  # 動画の長さに合わせる
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Background music failed: {result.stderr}")
-            raise RuntimeError("Background music addition failed")
-
-        return str(output_path)
+        return (
+            self.build_chain()
+            .background_music(music_path, video_volume, music_volume)
+            .render(video_path, output_path, "Background music", final)
+        )
 
     def add_sound_effect(self, video_path: str, sound_path: str,
                         output_path: str, timestamp: float,
@@ -109,7 +335,7 @@ class AudioProcessor:
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False)
 
         if result.returncode != 0:
             logger.error(f"Sound effect failed: {result.stderr}")
@@ -118,7 +344,7 @@ class AudioProcessor:
         return str(output_path)
 
     def normalize_audio(self, input_path: str, output_path: str,
-                       target_level: str = "-23dB") -> str:
+                       target_level: str = "-23dB", final: bool = False) -> str:
         """
         音量を正規化（ラウドネスノーマライゼーション）
 
@@ -126,90 +352,46 @@ class AudioProcessor:
             input_path: 入力動画
             output_path: 出力パス
             target_level: 目標ラウドネス（-23dB for YouTube, -14dB for Spotify）
+            final: 最終出力か（faststart を付ける）
         """
         logger.info(f"Normalizing audio to {target_level}")
 
-        # EBU R128ラウドネス正規化
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-af", f"loudnorm=I=-16:TP=-1.5:LRA=11",
-            "-c:v", "copy",
-            "-c:a", "aac",
-            "-b:a", "192k",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Audio normalization failed: {result.stderr}")
-            raise RuntimeError("Audio normalization failed")
-
-        return str(output_path)
+        return (
+            self.build_chain()
+            .normalize(measure_loudness(input_path))
+            .render(input_path, output_path, "Audio normalization", final)
+        )
 
-    def enhance_game_audio(self, input_path: str, output_path: str) -> str:
+    def enhance_game_audio(self, input_path: str, output_path: str,
+                           final: bool = False) -> str:
         """
         ゲーム音声を強調（銃声・足音を強調）
 
         Args:
             input_path: 入力動画
             output_path: 出力パス
+            final: 最終出力か（faststart を付ける）
         """
         logger.info("Enhancing game audio")
 
-        # 中域・高域を強調して銃声を際立たせる
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-af", "equalizer=f=2000:width_type=h:width=1000:g=3,equalizer=f=8000:width_type=h:width=2000:g=2",
-            "-c:v", "copy",
-            "-c:a", "aac",
-            "-b:a", "192k",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        return self.build_chain().enhance_game().render(input_path, output_path, "Audio enhancement", final)
 
-        if result.returncode != 0:
-            logger.error(f"Audio enhancement failed: {result.stderr}")
-            raise RuntimeError("Audio enhancement failed")
-
-        return str(output_path)
-
-    def remove_background_noise(self, input_path: str, output_path: str) -> str:
+    def remove_background_noise(self, input_path: str, output_path: str,
+                                final: bool = False) -> str:
         """
         背景ノイズを除去
 
         Args:
             input_path: 入力動画
             output_path: 出力パス
+            final: 最終出力か（faststart を付ける）
         """
         logger.info("Removing background noise")
 
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-af", "highpass=f=200,lowpass=f=3000,afftdn=nf=-25",
-            "-c:v", "copy",
-            "-c:a", "aac",
-            "-b:a", "192k",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Noise removal failed: {result.stderr}")
-            raise RuntimeError("Noise removal failed")
-
-        return str(output_path)
+        return self.build_chain().denoise().render(input_path, output_path, "Noise removal", final)
 
     def add_bass_boost(self, input_path: str, output_path: str,
-                      gain: int = 5) -> str:
+                      gain: int = 5, final: bool = False) -> str:
         """
         低音ブースト（インパクトを強調）
 
@@ -217,27 +399,11 @@ class AudioProcessor:
             input_path: 入力動画
             output_path: 出力パス
             gain: ゲイン（dB）
+            final: 最終出力か（faststart を付ける）
         """
         logger.info(f"Adding bass boost: +{gain}dB")
 
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-af", f"equalizer=f=100:width_type=h:width=50:g={gain}",
-            "-c:v", "copy",
-            "-c:a", "aac",
-            "-b:a", "192k",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Bass boost failed: {result.stderr}")
-            raise RuntimeError("Bass boost failed")
-
-        return str(output_path)
+        return self.build_chain().bass_boost(gain).render(input_path, output_path, "Bass boost", final)
 
     def create_audio_ducking(self, video_path: str, music_path: str,
                            output_path: str, threshold: float = -20,
@@ -270,7 +436,7 @@ class AudioProcessor:
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False)
 
         if result.returncode != 0:
             logger.error(f"Audio ducking failed: {result.stderr}")
@@ -279,7 +445,8 @@ class AudioProcessor:
         return str(output_path)
 
     def fade_in_out(self, input_path: str, output_path: str,
-                    fade_in: float = 1.0, fade_out: float = 1.0) -> str:
+                    fade_in: float = 1.0, fade_out: float = 1.0,
+                    final: bool = False) -> str:
         """
         フェードイン・フェードアウトを追加
 
@@ -288,37 +455,8 @@ class AudioProcessor:
             output_path: 出力パス
             fade_in: フェードイン時間（秒）
             fade_out: フェードアウト時間（秒）
+            final: 最終出力か（faststart を付ける）
         """
         logger.info(f"Adding fade in ({fade_in}s) and fade out ({fade_out}s)")
 
-        # まず動画の長さを取得
-        probe_cmd = [
-            FFMPEG_PATH.replace("ffmpeg.exe", "ffprobe.exe"),
-            "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            input_path
-        ]
-
-        result = subprocess.run(probe_cmd, capture_output=True, text=True)
-        duration = float(result.stdout.strip())
-
-        fade_out_start = duration - fade_out
-
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-af", f"afade=t=in:st=0:d={fade_in},afade=t=out:st={fade_out_start}:d={fade_out}",
-            "-c:v", "copy",
-            "-c:a", "aac",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Fade in/out failed: {result.stderr}")
-            raise RuntimeError("Fade in/out failed")
-
-        return str(output_path)
+        return self.build_chain().fade(fade_in, fade_out).render(input_path, output_path, "Fade in/out", final)
@@ -3,7 +3,9 @@ Automatic Chapter Generation Module
 自動チャプター生成モジュール (YouTube対応)
 """
 
+import bisect
 import logging
+from pathlib import Path
 from typing import List, Dict
 
 logger = logging.getLogger(__name__)
@@ -38,17 +40,19 @@ class ChapterGenerator:
             "title": "🎮 Intro"
         })
 
+        # マルチキルを時刻順に並べ、クリップごとに二分探索で判定
+        sorted_mks = sorted(multi_kills or [], key=lambda mk: mk["timestamp"])
+        mk_ts = [mk["timestamp"] for mk in sorted_mks]
+
         # クリップごとにチャプター生成
         for i, clip in enumerate(clips, 1):
             timestamp = self._format_timestamp(current_time)
 
-            # マルチキルチェック
+            # マルチキルチェック（クリップ内で最も早いマルチキル）
             chapter_title = f"Clip {i}"
-            if multi_kills:
-                for mk in multi_kills:
-                    if clip["start"] <= mk["timestamp"] <= clip["end"]:
-                        chapter_title = f"🔥 {mk['type']}"
-                        break
+            idx = bisect.bisect_left(mk_ts, clip["start"])
+            if idx < len(mk_ts) and mk_ts[idx] <= clip["end"]:
+                chapter_title = f"🔥 {sorted_mks[idx]['type']}"
 
             chapters.append({
                 "timestamp": timestamp,
@@ -62,15 +66,14 @@ class ChapterGenerator:
 
     def _format_timestamp(self, seconds: float) -> str:
         """秒をYouTubeチャプター形式に変換"""
-        minutes = int(seconds // 60)
-        secs = int(seconds % 60)
+        minutes, secs = divmod(int(seconds), 60)
         return f"{minutes}:{secs:02d}"
 
     def export_youtube_description(self, chapters: List[Dict], output_file: str):
         """YouTube説明文用のチャプターをエクスポート"""
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write("📖 Chapters:\n")
-            for chapter in chapters:
-                f.write(f"{chapter['timestamp']} - {chapter['title']}\n")
+        # 全文をメモリ上で組み立てて1回で書き込む
+        lines = ["📖 Chapters:\n"]
+        lines.extend(f"{c['timestamp']} - {c['title']}\n" for c in chapters)
+        Path(output_file).write_text("".join(lines), encoding="utf-8")
 
         logger.info(f"Chapter description exported: {output_file}")
@@ -4,11 +4,36 @@ Composition Optimizer Module
 """
 
 import logging
-from typing import List, Dict, Optional
-import statistics
+from dataclasses import dataclass, replace
+from typing import Any, List, Dict, Optional, Tuple
+
+import numpy as np
+
+from src._score_kernel import encode_intensity, encode_match_status, score_clips
 
 logger = logging.getLogger(__name__)
 
+# 強度コード（_score_kernel.INTENSITY_CODES）→ ペース調整のバケット
+# 0: 高強度 (very_high, high), 1: 中強度, 2: 低強度, 3: 使わない（未知の値）
+_PACING_BUCKET = np.array([0, 0, 1, 2, 3], dtype=np.int8)
+_PACING_MAX_LOW = 2
+
+
+@dataclass(slots=True)
+class ClipSoA:
+    """
+    最適化処理中のクリップ（構造体配列）
+
+    各ステップはクリップ辞書をコピーせずに配列とインデックスだけを扱い、
+    辞書への変換は optimize_clips の戻り値を作るときに1回だけ行う
+    """
+    starts: np.ndarray       # float64
+    ends: np.ndarray         # float64
+    scores: np.ndarray       # int64
+    intensity: np.ndarray    # int8（encode_intensity のコード）
+    labels: List[Any]        # 出力用の action_intensity の値
+    meta: List[Dict]         # 元のクリップ辞書
+
 
 class CompositionOptimizer:
     """動画構成最適化クラス"""
@@ -35,189 +60,216 @@ class CompositionOptimizer:
         logger.info(f"Optimizing {len(clips)} clips")
 
         # 1. クリップにスコアを付与
-        scored_clips = self._score_clips(clips, analysis_results)
+        soa = self._score_clips(clips, analysis_results)
 
         # 2. 長さを調整
-        adjusted_clips = self._adjust_clip_lengths(scored_clips)
+        soa = self._adjust_clip_lengths(soa)
 
         # 3. スコア順に並び替え（ベストクリップを先に）
-        sorted_clips = self._sort_clips_by_score(adjusted_clips)
+        order = self._sort_clips_by_score(soa)
 
         # 4. 目標時間に合わせてクリップ数を調整
-        optimized_clips = self._trim_to_target_duration(sorted_clips)
+        soa, order = self._trim_to_target_duration(soa, order)
 
         # 5. ペース調整（飽きさせないリズム作り）
-        final_clips = self._optimize_pacing(optimized_clips)
+        order = self._optimize_pacing(soa, order)
+
+        final_clips = self._to_clip_dicts(soa, order)
 
         logger.info(f"Optimized to {len(final_clips)} clips, total duration: {self._total_duration(final_clips):.1f}s")
 
         return final_clips
 
-    def _score_clips(self, clips: List[Dict], analysis_results: List[Dict]) -> List[Dict]:
-        """クリップにスコアを付与"""
-        scored = []
-
-        for clip in clips:
-            # クリップの中間時点
-            mid_time = (clip["start"] + clip["end"]) / 2
-
-            # 最も近い分析結果を取得
-            closest_analysis = min(
-                analysis_results,
-                key=lambda x: abs(x.get("timestamp", 0) - mid_time)
-            )
-
-            # スコア計算
-            score = 0
-
-            # キルログがあれば高スコア
-            if closest_analysis.get("kill_log", False):
-                score += 10
-
-            # アクション強度に応じたスコア
-            action_intensity = closest_analysis.get("action_intensity", "low")
-            intensity_scores = {"very_high": 8, "high": 6, "medium": 4, "low": 2}
-            score += intensity_scores.get(action_intensity, 0)
-
-            # マッチステータス
-            match_status = closest_analysis.get("match_status", "normal")
-            if match_status == "victory":
-                score += 5
-            elif match_status == "clutch":
-                score += 7
-
-            # クリップの長さもスコアに影響（長すぎると減点）
-            duration = clip["end"] - clip["start"]
-            if duration > self.max_clip_length:
-                score -= 2
-            elif duration < self.min_clip_length:
-                score -= 1
-
-            scored.append({
-                **clip,
-                "score": score,
-                "action_intensity": action_intensity
-            })
-
-        return scored
-
-    def _adjust_clip_lengths(self, clips: List[Dict]) -> List[Dict]:
-        """クリップの長さを調整"""
-        adjusted = []
-
-        for clip in clips:
-            duration = clip["end"] - clip["start"]
-
-            # 長すぎるクリップを分割
-            if duration > self.max_clip_length:
-                # ハイライト部分を中心に切り出し
-                center = (clip["start"] + clip["end"]) / 2
-                half_max = self.max_clip_length / 2
-                new_start = max(clip["start"], center - half_max)
-                new_end = min(clip["end"], center + half_max)
-
-                adjusted.append({
-                    **clip,
-                    "start": new_start,
-                    "end": new_end
-                })
-            # 短すぎるクリップは前後を延長
-            elif duration < self.min_clip_length:
-                extension = (self.min_clip_length - duration) / 2
-                adjusted.append({
-                    **clip,
-                    "start": clip["start"] - extension,
-                    "end": clip["end"] + extension
-                })
-            else:
-                adjusted.append(clip)
-
-        return adjusted
-
-    def _sort_clips_by_score(self, clips: List[Dict]) -> List[Dict]:
-        """スコア順にソート（高い順）"""
-        return sorted(clips, key=lambda x: x.get("score", 0), reverse=True)
+    def _score_clips(self, clips: List[Dict], analysis_results: List[Dict]) -> ClipSoA:
+        """
+        クリップにスコアを付与
 
-    def _trim_to_target_duration(self, clips: List[Dict]) -> List[Dict]:
-        """目標時間に合わせてクリップ数を調整"""
+        各クリップの中間時点に最も近い分析結果を、ソート済みタイムスタンプへの二分探索で
+        まとめて求める（距離が同じ場合は analysis_results で先に出現するものを採用）
+        """
+        starts = np.fromiter((c["start"] for c in clips), dtype=np.float64, count=len(clips))
+        ends = np.fromiter((c["end"] for c in clips), dtype=np.float64, count=len(clips))
         if not clips:
-            return clips
+            return ClipSoA(starts, ends, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8), [], [])
+        if not analysis_results:
+            raise ValueError("analysis_results is empty")
+
+        # 分析結果のフィールドを並列配列にエンコード
+        ts = np.fromiter((a.get("timestamp", 0) for a in analysis_results),
+                         dtype=np.float64, count=len(analysis_results))
+        intensities = [a.get("action_intensity", "low") for a in analysis_results]
+        kill_log = np.fromiter((bool(a.get("kill_log", False)) for a in analysis_results),
+                               dtype=np.bool_, count=len(analysis_results))
+        intensity_codes = encode_intensity(intensities)
+        match_codes = encode_match_status(a.get("match_status", "normal") for a in analysis_results)
+
+        nearest = self._nearest_indices(ts, (starts + ends) / 2)
+
+        # スコア計算（クリップの長さもスコアに影響: 長すぎる・短すぎると減点）
+        scores = score_clips(
+            starts, ends, kill_log[nearest], intensity_codes[nearest], match_codes[nearest],
+            self.min_clip_length, self.max_clip_length,
+        )
+
+        return ClipSoA(
+            starts=starts,
+            ends=ends,
+            scores=scores,
+            intensity=intensity_codes[nearest],
+            labels=[intensities[i] for i in nearest.tolist()],
+            meta=clips,
+        )
+
+    @staticmethod
+    def _nearest_indices(ts: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        各 target に最も近い ts のインデックス（元の並び順）を返す
 
-        current_duration = self._total_duration(clips)
+        同じ距離の候補が複数ある場合は元のインデックスが小さい方を選ぶ（min() と同じ結果）
+        """
+        order = np.argsort(ts, kind="stable")
+        ts_sorted = ts[order]
+        n = len(ts_sorted)
+
+        # 右側の候補: target 以上で最小の値（同値が並ぶ場合は先頭 = 元インデックス最小）
+        right = np.searchsorted(ts_sorted, targets, side="left")
+        # 左側の候補: target 未満で最大の値の同値連続の先頭
+        left = np.searchsorted(ts_sorted, ts_sorted[np.maximum(right - 1, 0)], side="left")
+
+        right_c = np.minimum(right, n - 1)
+        d_left = np.abs(ts_sorted[left] - targets)
+        d_right = np.abs(ts_sorted[right_c] - targets)
+        o_left = order[left]
+        o_right = order[right_c]
+
+        use_right = (right < n) & (
+            (right == 0) | (d_right < d_left) | ((d_right == d_left) & (o_right < o_left))
+        )
+        return np.where(use_right, o_right, o_left)
+
+    def _adjust_clip_lengths(self, soa: ClipSoA) -> ClipSoA:
+        """
+        クリップの長さを調整
+
+        分岐なしの np.where で新しい開始・終了を一括計算する
+        """
+        starts, ends = soa.starts, soa.ends
+        durations = ends - starts
+
+        # 長すぎるクリップはハイライト部分（中心）を切り出し、短すぎるクリップは前後を延長
+        long_mask = durations > self.max_clip_length
+        short_mask = ~long_mask & (durations < self.min_clip_length)
+        centers = (starts + ends) / 2
+        half_max = self.max_clip_length / 2
+        extension = (self.min_clip_length - durations) / 2
+
+        new_starts = np.where(long_mask, np.maximum(starts, centers - half_max),
+                              np.where(short_mask, starts - extension, starts))
+        new_ends = np.where(long_mask, np.minimum(ends, centers + half_max),
+                            np.where(short_mask, ends + extension, ends))
+        return replace(soa, starts=new_starts, ends=new_ends)
+
+    def _sort_clips_by_score(self, soa: ClipSoA) -> np.ndarray:
+        """スコア順（高い順、同点は元の順）のインデックスを返す"""
+        return np.argsort(-soa.scores, kind="stable")
+
+    def _trim_to_target_duration(self, soa: ClipSoA, order: np.ndarray) -> Tuple[ClipSoA, np.ndarray]:
+        """目標時間に合わせてクリップ数を調整（order の先頭から目標時間に収まる分だけ残す）"""
+        if len(order) == 0:
+            return soa, order
+
+        # order 順の累積時間（先頭から順に足すので逐次加算と同じ値になる）
+        accumulated = np.cumsum(soa.ends[order] - soa.starts[order])
 
         # 目標時間を超えている場合、低スコアのクリップを削除
-        if current_duration > self.target_duration:
-            trimmed = []
-            accumulated_duration = 0
-
-            for clip in clips:
-                clip_duration = clip["end"] - clip["start"]
-
-                if accumulated_duration + clip_duration <= self.target_duration:
-                    trimmed.append(clip)
-                    accumulated_duration += clip_duration
-                else:
-                    # 残り時間に収まるようクリップを短縮
-                    remaining = self.target_duration - accumulated_duration
-                    if remaining >= self.min_clip_length:
-                        trimmed.append({
-                            **clip,
-                            "end": clip["start"] + remaining
-                        })
-                    break
-
-            return trimmed
-
-        return clips
-
-    def _optimize_pacing(self, clips: List[Dict]) -> List[Dict]:
+        if accumulated[-1] <= self.target_duration:
+            return soa, order
+
+        # 目標時間を最初に超える位置を二分探索（負の長さのクリップがあっても単調になるよう累積最大値で探す）
+        cut = int(np.searchsorted(np.maximum.accumulate(accumulated), self.target_duration, side="right"))
+        # 残り時間に収まるようクリップを短縮
+        remaining = self.target_duration - (float(accumulated[cut - 1]) if cut > 0 else 0)
+        if remaining < self.min_clip_length:
+            return soa, order[:cut]
+
+        idx = order[cut]
+        ends = soa.ends.copy()
+        ends[idx] = soa.starts[idx] + remaining
+        return replace(soa, ends=ends), order[:cut + 1]
+
+    def _optimize_pacing(self, soa: ClipSoA, order: np.ndarray) -> np.ndarray:
         """
         ペース最適化
         - 高強度クリップと中強度クリップを交互に配置
         - 視聴者を飽きさせないリズムを作る
         """
-        if len(clips) <= 2:
-            return clips
-
-        # 強度別に分類
-        high_intensity = [c for c in clips if c.get("action_intensity") in ["very_high", "high"]]
-        medium_intensity = [c for c in clips if c.get("action_intensity") == "medium"]
-        low_intensity = [c for c in clips if c.get("action_intensity") == "low"]
-
-        # 交互配置
-        optimized = []
-        hi_idx = 0
-        mi_idx = 0
-
-        # 最初は必ず高強度で始める（フック）
-        if high_intensity:
-            optimized.append(high_intensity[hi_idx])
-            hi_idx += 1
-
-        # 高強度と中強度を交互に
-        while hi_idx < len(high_intensity) or mi_idx < len(medium_intensity):
-            if mi_idx < len(medium_intensity):
-                optimized.append(medium_intensity[mi_idx])
-                mi_idx += 1
-
-            if hi_idx < len(high_intensity):
-                optimized.append(high_intensity[hi_idx])
-                hi_idx += 1
-
-        # 低強度は最後に（あまり使わない）
-        optimized.extend(low_intensity[:2])  # 最大2個まで
-
-        return optimized
+        if len(order) <= 2:
+            return order
+
+        # 強度別のヒストグラムと、各クリップのバケット内での順位
+        bucket = _PACING_BUCKET[soa.intensity[order]]
+        counts = np.bincount(bucket, minlength=4)
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        grouped = np.argsort(bucket, kind="stable")
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[grouped] = np.arange(len(order)) - offsets[bucket[grouped]]
+
+        # 並び順を (グループ, グループ内位置) で表し、lexsort で1回に並べ替える
+        #   0: 最初は必ず高強度で始める（フック）
+        #   1: 中強度と高強度を交互に (m0, h1, m1, h2, ...)
+        #   2/3: 交互に並べて余った中強度 / 高強度
+        #   4: 低強度は最後に（あまり使わない、最大2個まで）
+        pairs = min(counts[1], max(counts[0] - 1, 0))
+        is_high = bucket == 0
+        is_medium = bucket == 1
+        group = np.select(
+            [
+                is_high & (rank == 0),
+                is_medium & (rank < pairs),
+                is_high & (rank <= pairs),
+                is_medium,
+                is_high,
+                (bucket == 2) & (rank < _PACING_MAX_LOW),
+            ],
+            [0, 1, 1, 2, 3, 4],
+            default=5,
+        )
+        position = np.where(is_medium & (rank < pairs), 2 * rank,
+                            np.where(is_high & (rank <= pairs), 2 * rank - 1, rank))
+
+        keep = group < 5
+        return order[keep][np.lexsort((position[keep], group[keep]))]
+
+    def _to_clip_dicts(self, soa: ClipSoA, order: np.ndarray) -> List[Dict]:
+        """order 順のクリップ辞書リストに変換（元のキーに start/end/score/action_intensity を反映）"""
+        starts = soa.starts.tolist()
+        ends = soa.ends.tolist()
+        scores = soa.scores.tolist()
+        return [
+            {
+                **soa.meta[i],
+                "start": starts[i],
+                "end": ends[i],
+                "score": scores[i],
+                "action_intensity": soa.labels[i],
+            }
+            for i in order.tolist()
+        ]
 
     def _total_duration(self, clips: List[Dict]) -> float:
         """クリップの合計時間を計算"""
         return sum(clip["end"] - clip["start"] for clip in clips)
 
-    def create_hook_intro(self, clips: List[Dict]) -> Dict:
+    def create_hook_intro(self, clips: List[Dict], presorted: bool = False) -> Dict:
         """
         最初の3秒用のフッククリップを作成
         （最もスコアの高い1-3秒を最初に見せる）
 
+        Args:
+            clips: スコア付きクリップリスト
+            presorted: clips がスコアの高い順に並んでいる場合 True（先頭をそのまま使い走査を省略）。
+                optimize_clips の戻り値はペース調整後の並びなので False のまま渡すこと
+
         Returns:
             フック用クリップ情報
         """
@@ -225,7 +277,10 @@ class CompositionOptimizer:
             return None
 
         # 最高スコアのクリップ
-        best_clip = max(clips, key=lambda x: x.get("score", 0))
+        if presorted:
+            best_clip = clips[0]
+        else:
+            best_clip = max(clips, key=lambda x: x.get("score", 0))
 
         # 最も盛り上がる3秒を抽出
         mid_point = (best_clip["start"] + best_clip["end"]) / 2
@@ -271,12 +326,12 @@ class CompositionOptimizer:
         if not clips:
             return {"status": "no_clips"}
 
-        scores = [c.get("score", 0) for c in clips]
+        scores = np.fromiter((c.get("score", 0) for c in clips), dtype=np.float64, count=len(clips))
 
         return {
-            "avg_score": statistics.mean(scores) if scores else 0,
-            "score_variance": statistics.variance(scores) if len(scores) > 1 else 0,
-            "peak_moment": max(range(len(scores)), key=lambda i: scores[i]) if scores else 0,
+            "avg_score": float(scores.mean()),
+            "score_variance": float(scores.var(ddof=1)) if scores.size > 1 else 0,
+            "peak_moment": int(scores.argmax()),
             "total_duration": self._total_duration(clips),
             "clip_count": len(clips),
             "pacing_score": self._calculate_pacing_score(clips)
@@ -290,8 +345,8 @@ class CompositionOptimizer:
         if not clips:
             return 0.0
 
-        durations = [c["end"] - c["start"] for c in clips]
-        avg_duration = statistics.mean(durations)
+        durations = np.fromiter((c["end"] - c["start"] for c in clips), dtype=np.float64, count=len(clips))
+        avg_duration = float(durations.mean())
 
         # 理想的なペース（5秒）との差を評価
         deviation = abs(avg_duration - self.optimal_pace)
@@ -3,18 +3,43 @@ Visual Effects Module
 動画への視覚エフェクト適用
 """
 
-import subprocess
 import logging
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 import os
 import shutil
+import subprocess
+
+from src.ffmpeg_runner import run_ffmpeg
+from src.gpu_encoder import cuda_overlay_available, hwaccel_input_args, video_encode_args
+from src.media_probe import probe_video
 
 logger = logging.getLogger(__name__)
 
+# 検出したFFmpegパスを子プロセスへ引き継ぐ環境変数
+FFMPEG_ENV_VAR = "MAE_FFMPEG"
+
+
 # FFmpegパスを取得
+@lru_cache(maxsize=1)
 def get_ffmpeg_path():
-    """FFmpegの実行可能ファイルパスを取得"""
+    """
+    FFmpegの実行可能ファイルパスを取得
+
+    結果はプロセス内でキャッシュし、環境変数 MAE_FFMPEG にも保存する
+    （サブプロセスや再インポート時は PATH 探索・ファイル存在確認を省略）
+    """
+    ffmpeg_path = os.environ.get(FFMPEG_ENV_VAR)
+    if ffmpeg_path:
+        return ffmpeg_path
+
+    ffmpeg_path = _find_ffmpeg()
+    os.environ[FFMPEG_ENV_VAR] = ffmpeg_path
+    return ffmpeg_path
+
+
+def _find_ffmpeg():
     ffmpeg_path = shutil.which("ffmpeg")
     if ffmpeg_path:
         return ffmpeg_path
@@ -32,6 +57,105 @@ def get_ffmpeg_path():
 
 FFMPEG_PATH = get_ffmpeg_path()
 
+# HWエンコーダーがない場合のエンコード引数（libx264 既定設定）
+CPU_VIDEO_ARGS = ["-c:v", "libx264"]
+
+# カラーグレーディングのプリセット
+COLOR_GRADING_FILTERS = {
+    "cinematic": "eq=contrast=1.2:brightness=0.05:saturation=0.9,curves=vintage",
+    "vibrant": "eq=contrast=1.1:saturation=1.3",
+    "warm": "eq=contrast=1.05:saturation=1.1,colortemperature=7000",
+    "cool": "eq=contrast=1.05:saturation=1.1,colortemperature=3000",
+    "desaturated": "eq=saturation=0.7:contrast=1.15"
+}
+
+
+# 各エフェクトのフィルターグラフ断片
+# (入力パッド, 出力パッド, 内部パッドの接頭辞, パラメータ) -> (映像グラフ, 音声フィルター or None)
+def _color_grading_graph(src: str, dst: str, tag: str, preset: str = "cinematic"):
+    filter_str = COLOR_GRADING_FILTERS.get(preset, COLOR_GRADING_FILTERS["cinematic"])
+    return f"[{src}]{filter_str}[{dst}]", None
+
+
+def _vignette_graph(src: str, dst: str, tag: str, intensity: float = 0.3):
+    return f"[{src}]vignette=PI/4*{intensity}[{dst}]", None
+
+
+def _shake_graph(src: str, dst: str, tag: str, intensity: int = 5):
+    return (
+        f"[{src}]crop=in_w-{intensity*2}:in_h-{intensity*2}"
+        f":x={intensity}*sin(2*PI*t):y={intensity}*cos(2*PI*t)[{dst}]"
+    ), None
+
+
+def _zoom_graph(src: str, dst: str, tag: str, zoom_factor: float = 1.5, duration: float = 2.0):
+    return f"[{src}]zoompan=z='min(zoom+0.0015,{zoom_factor})':d={int(duration*30)}:s=1920x1080[{dst}]", None
+
+
+def _slow_motion_graph(src: str, dst: str, tag: str, speed: float = 0.5):
+    # setptsフィルターでスローモーション（音声も同じ倍率で伸ばす）
+    pts_factor = 1.0 / speed
+    return f"[{src}]setpts={pts_factor}*PTS[{dst}]", f"atempo={speed}"
+
+
+def _chromatic_aberration_graph(src: str, dst: str, tag: str):
+    # 緑・青チャンネルを2pxずらし、元のサイズに切り戻してから合成
+    return (
+        f"[{src}]split=3[{tag}r][{tag}g][{tag}b];"
+        f"[{tag}r]lutrgb=r=val:g=0:b=0[{tag}red];"
+        f"[{tag}g]lutrgb=r=0:g=val:b=0,pad=iw+4:ih:2:0,crop=iw-4:ih:0:0[{tag}green];"
+        f"[{tag}b]lutrgb=r=0:g=0:b=val,pad=iw+4:ih:2:0,crop=iw-4:ih:0:0[{tag}blue];"
+        f"[{tag}red][{tag}green]blend=all_mode=addition[{tag}rg];"
+        f"[{tag}rg][{tag}blue]blend=all_mode=addition[{dst}]"
+    ), None
+
+
+# GPU（overlay_cuda）で処理できるエフェクト
+# zoompan に相当するCUDAフィルターはない（scale_cuda のサイズはフレームごとに変えられない）ため、ズームはCPUのまま
+CUDA_EFFECTS = frozenset({"vignette"})
+VIGNETTE_MASK_DIR = "cache/vignette"
+
+
+@lru_cache(maxsize=None)
+def vignette_mask(width: int, height: int, intensity: float) -> Optional[str]:
+    """
+    ビネットをアルファ付きの黒画像 (PNG) として書き出す
+
+    vignette フィルターの減衰率を白画像から求め、(1 - 減衰率) をアルファにする。
+    この画像を重ねると vignette フィルターと同じ結果になるので、overlay_cuda でGPU上のまま適用できる
+    """
+    mask_path = Path(VIGNETTE_MASK_DIR) / f"vignette_{width}x{height}_{intensity:g}.png"
+    if mask_path.exists():
+        return str(mask_path)
+
+    mask_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = mask_path.with_name(f"{mask_path.stem}.{os.getpid()}.tmp.png")
+    try:
+        run_ffmpeg([
+            FFMPEG_PATH, "-y", "-f", "lavfi", "-i",
+            f"color=black:s={width}x{height},format=rgba[b];"
+            f"color=white:s={width}x{height},format=gray,"
+            f"vignette=angle=PI/4*{intensity}:dither=0,negate[a];[b][a]alphamerge",
+            "-frames:v", "1", str(tmp_path)
+        ])
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Vignette mask rendering failed: {e}")
+        return None
+    # 並列実行時に書きかけのファイルを読まれないよう一時ファイルからリネーム
+    os.replace(tmp_path, mask_path)
+    return str(mask_path)
+
+
+# エフェクト名 → フィルターグラフ断片
+EFFECT_FILTERS: Dict[str, Callable[..., Tuple[str, Optional[str]]]] = {
+    "color_grading": _color_grading_graph,
+    "vignette": _vignette_graph,
+    "shake": _shake_graph,
+    "zoom": _zoom_graph,
+    "slow_motion": _slow_motion_graph,
+    "chromatic_aberration": _chromatic_aberration_graph,
+}
+
 
 class VisualEffects:
     """視覚エフェクトを適用するクラス"""
@@ -39,6 +163,7 @@ class VisualEffects:
     def __init__(self, config: dict):
         self.config = config
         self.effects_config = config.get("effects", {})
+        self.use_hw = config.get("gpu_encoder", {}).get("enable", True)
 
     def apply_transition(self, clip1_path: str, clip2_path: str, output_path: str,
                         transition_type: str = "fade", duration: float = 0.5) -> str:
@@ -58,18 +183,18 @@ class VisualEffects:
         cmd = [
             FFMPEG_PATH,
             "-y",
-            "-i", clip1_path,
-            "-i", clip2_path,
+            *(hwaccel_input_args() if self.use_hw else []), "-i", clip1_path,
+            *(hwaccel_input_args() if self.use_hw else []), "-i", clip2_path,
             "-filter_complex",
             f"[0:v][1:v]xfade=transition={transition_type}:duration={duration}:offset=0[vout];[0:a][1:a]acrossfade=d={duration}[aout]",
             "-map", "[vout]",
             "-map", "[aout]",
-            "-c:v", "libx264",
+            *(video_encode_args(cpu_args=CPU_VIDEO_ARGS) if self.use_hw else CPU_VIDEO_ARGS),
             "-c:a", "aac",
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False)
 
         if result.returncode != 0:
             logger.error(f"Transition effect failed: {result.stderr}")
@@ -90,30 +215,7 @@ class VisualEffects:
             speed: 速度倍率（0.5 = 半分の速度）
         """
         logger.info(f"Applying slow motion from {start_time}s to {end_time}s at {speed}x speed")
-
-        # setptsフィルターでスローモーション
-        pts_factor = 1.0 / speed
-
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-filter_complex",
-            f"[0:v]setpts={pts_factor}*PTS[v];[0:a]atempo={speed}[a]",
-            "-map", "[v]",
-            "-map", "[a]",
-            "-c:v", "libx264",
-            "-c:a", "aac",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Slow motion effect failed: {result.stderr}")
-            raise RuntimeError("Slow motion effect failed")
-
-        return str(output_path)
+        return self.apply_chain(input_path, output_path, [("slow_motion", {"speed": speed})])
 
     def apply_zoom(self, input_path: str, output_path: str,
                    zoom_factor: float = 1.5, duration: float = 2.0) -> str:
@@ -127,27 +229,8 @@ class VisualEffects:
             duration: ズームにかける時間（秒）
         """
         logger.info(f"Applying zoom effect (factor: {zoom_factor})")
-
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-filter_complex",
-            f"[0:v]zoompan=z='min(zoom+0.0015,{zoom_factor})':d={int(duration*30)}:s=1920x1080[v]",
-            "-map", "[v]",
-            "-map", "0:a?",
-            "-c:v", "libx264",
-            "-c:a", "copy",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Zoom effect failed: {result.stderr}")
-            raise RuntimeError("Zoom effect failed")
-
-        return str(output_path)
+        return self.apply_chain(input_path, output_path,
+                                [("zoom", {"zoom_factor": zoom_factor, "duration": duration})])
 
     def apply_color_grading(self, input_path: str, output_path: str,
                            preset: str = "cinematic") -> str:
@@ -160,35 +243,7 @@ class VisualEffects:
             preset: cinematic, vibrant, warm, cool, desaturated
         """
         logger.info(f"Applying color grading: {preset}")
-
-        # プリセットに応じたフィルター設定
-        color_filters = {
-            "cinematic": "eq=contrast=1.2:brightness=0.05:saturation=0.9,curves=vintage",
-            "vibrant": "eq=contrast=1.1:saturation=1.3",
-            "warm": "eq=contrast=1.05:saturation=1.1,colortemperature=7000",
-            "cool": "eq=contrast=1.05:saturation=1.1,colortemperature=3000",
-            "desaturated": "eq=saturation=0.7:contrast=1.15"
-        }
-
-        filter_str = color_filters.get(preset, color_filters["cinematic"])
-
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-vf", filter_str,
-            "-c:v", "libx264",
-            "-c:a", "copy",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Color grading failed: {result.stderr}")
-            raise RuntimeError("Color grading failed")
-
-        return str(output_path)
+        return self.apply_chain(input_path, output_path, [("color_grading", {"preset": preset})])
 
     def apply_vignette(self, input_path: str, output_path: str,
                        intensity: float = 0.3) -> str:
@@ -201,24 +256,7 @@ class VisualEffects:
             intensity: 強度（0.0 - 1.0）
         """
         logger.info(f"Applying vignette effect (intensity: {intensity})")
-
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-vf", f"vignette=PI/4*{intensity}",
-            "-c:v", "libx264",
-            "-c:a", "copy",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Vignette effect failed: {result.stderr}")
-            raise RuntimeError("Vignette effect failed")
-
-        return str(output_path)
+        return self.apply_chain(input_path, output_path, [("vignette", {"intensity": intensity})])
 
     def apply_shake(self, input_path: str, output_path: str,
                     intensity: int = 5) -> str:
@@ -231,57 +269,125 @@ class VisualEffects:
             intensity: 揺れの強度（ピクセル数）
         """
         logger.info(f"Applying shake effect (intensity: {intensity})")
+        return self.apply_chain(input_path, output_path, [("shake", {"intensity": intensity})])
+
+    def apply_chromatic_aberration(self, input_path: str, output_path: str) -> str:
+        """
+        色収差効果を適用（グリッチ風）
+
+        Args:
+            input_path: 入力動画
+            output_path: 出力パス
+        """
+        logger.info("Applying chromatic aberration effect")
+        return self.apply_chain(input_path, output_path, [("chromatic_aberration", {})])
+
+    def apply_chain(self, input_path: str, output_path: str,
+                    effects: List[Tuple[str, dict]],
+                    on_progress: Optional[Callable[[float], None]] = None) -> str:
+        """
+        複数のエフェクトを1回のFFmpeg実行（デコード・エンコード各1回）で適用
+
+        HWエンコーダーがあればデコード・エンコードはGPUで行う。エフェクトはCPUフィルターのため、
+        -hwaccel_output_format は指定せずデコード済みフレームをシステムメモリで受け取る
+
+        Args:
+            input_path: 入力動画
+            output_path: 出力パス
+            effects: (エフェクト名, パラメータ) のリスト。EFFECT_FILTERS のキーを指定し、順番に適用
+            on_progress: 進捗コールバック（処理済みの秒数）
+        """
+        if not effects:
+            raise ValueError("No effects specified")
+
+        names = [name for name, _ in effects]
+        logger.info(f"Applying effect chain: {' -> '.join(names)}")
+
+        # すべてGPUで処理できるエフェクトなら、デコードからエンコードまでフレームをGPUに置いたまま処理
+        if self.use_hw and CUDA_EFFECTS.issuperset(names) and cuda_overlay_available():
+            if self._apply_chain_cuda(input_path, output_path, effects, on_progress):
+                return str(output_path)
+
+        video_graphs = []
+        audio_filters = []
+        src = "0:v"
+        for i, (name, params) in enumerate(effects):
+            builder = EFFECT_FILTERS.get(name)
+            if builder is None:
+                raise ValueError(f"Unknown effect: {name}")
+            dst = f"v{i}"
+            video_graph, audio_filter = builder(src, dst, f"e{i}", **(params or {}))
+            video_graphs.append(video_graph)
+            if audio_filter:
+                audio_filters.append(audio_filter)
+            src = dst
+
+        # 音声を加工するエフェクトがあれば音声も再エンコード、なければコピー
+        if audio_filters and probe_video(input_path).has_audio:
+            video_graphs.append(f"[0:a]{','.join(audio_filters)}[aout]")
+            audio_args = ["-map", "[aout]", "-c:a", "aac"]
+        else:
+            audio_args = ["-map", "0:a?", "-c:a", "copy"]
 
         cmd = [
             FFMPEG_PATH,
             "-y",
-            "-i", input_path,
-            "-vf", f"crop=in_w-{intensity*2}:in_h-{intensity*2}:x={intensity}*sin(2*PI*t):y={intensity}*cos(2*PI*t)",
-            "-c:v", "libx264",
-            "-c:a", "copy",
+            *(hwaccel_input_args() if self.use_hw else []), "-i", input_path,
+            "-filter_complex", ";".join(video_graphs),
+            "-map", f"[{src}]",
+            *(video_encode_args(cpu_args=CPU_VIDEO_ARGS) if self.use_hw else CPU_VIDEO_ARGS),
+            *audio_args,
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False, on_progress=on_progress)
 
         if result.returncode != 0:
-            logger.error(f"Shake effect failed: {result.stderr}")
-            raise RuntimeError("Shake effect failed")
+            logger.error(f"Effect chain failed ({', '.join(names)}): {result.stderr}")
+            raise RuntimeError(f"Effect chain failed: {', '.join(names)}")
 
         return str(output_path)
 
-    def apply_chromatic_aberration(self, input_path: str, output_path: str) -> str:
+    def _apply_chain_cuda(self, input_path: str, output_path: str,
+                          effects: List[Tuple[str, dict]],
+                          on_progress: Optional[Callable[[float], None]] = None) -> bool:
         """
-        色収差効果を適用（グリッチ風）
+        ビネットをGPU上で適用（NVDEC → scale_cuda → overlay_cuda → NVENC）
 
-        Args:
-            input_path: 入力動画
-            output_path: 出力パス
+        失敗した場合は False を返し、呼び出し側でCPUのフィルターグラフにフォールバックする
         """
-        logger.info("Applying chromatic aberration effect")
+        info = probe_video(input_path)
+        masks = [
+            vignette_mask(info.width, info.height, (params or {}).get("intensity", 0.3))
+            for _, params in effects
+        ]
+        if any(mask is None for mask in masks):
+            return False
 
         cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-filter_complex",
-            "[0:v]split=3[r][g][b];"
-            "[r]lutrgb=r=val:g=0:b=0[red];"
-            "[g]lutrgb=r=0:g=val:b=0,pad=iw+4:ih:2:0[green];"
-            "[b]lutrgb=r=0:g=0:b=val,pad=iw+4:ih:2:0[blue];"
-            "[red][green]blend=all_mode=addition[rg];"
-            "[rg][blue]blend=all_mode=addition[v]",
-            "-map", "[v]",
+            FFMPEG_PATH, "-y",
+            "-hwaccel", "cuda", "-hwaccel_output_format", "cuda", "-i", input_path,
+        ]
+        # overlay_cuda はアルファ付きの重ね合わせに yuv420p のメイン映像が必要
+        graph = ["[0:v]scale_cuda=format=yuv420p[c0]"]
+        src = "c0"
+        for i, mask in enumerate(masks, start=1):
+            cmd += ["-loop", "1", "-i", mask]
+            graph.append(f"[{i}:v]format=yuva420p,hwupload_cuda[m{i}]")
+            graph.append(f"[{src}][m{i}]overlay_cuda=shortest=1[c{i}]")
+            src = f"c{i}"
+
+        cmd += [
+            "-filter_complex", ";".join(graph),
+            "-map", f"[{src}]",
             "-map", "0:a?",
-            "-c:v", "libx264",
+            *(video_encode_args(cpu_args=CPU_VIDEO_ARGS) if self.use_hw else CPU_VIDEO_ARGS),
             "-c:a", "copy",
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
+        result = run_ffmpeg(cmd, check=False, on_progress=on_progress)
         if result.returncode != 0:
-            logger.error(f"Chromatic aberration failed: {result.stderr}")
-            raise RuntimeError("Chromatic aberration failed")
-
-        return str(output_path)
+            logger.warning(f"CUDA effect chain failed, falling back to CPU filters: {result.stderr}")
+            return False
+        return True
@@ -5,7 +5,8 @@ Engagement Prediction Module
 
 import logging
 from typing import List, Dict
-import statistics
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -41,15 +42,17 @@ class EngagementPredictor:
             return scores
 
         # 1. 平均興奮度
-        excitement_scores = [r.get("excitement_score", 0) for r in analysis_results]
-        avg_excitement = statistics.mean(excitement_scores) if excitement_scores else 0
+        excitement_scores = np.fromiter((r.get("excitement_score", 0) for r in analysis_results),
+                                        dtype=np.float64, count=len(analysis_results))
+        avg_excitement = float(excitement_scores.mean()) if excitement_scores.size else 0
 
-        # 2. クリップのバラエティ
-        clip_lengths = [c["end"] - c["start"] for c in clips]
-        variety_score = statistics.stdev(clip_lengths) if len(clip_lengths) > 1 else 0
+        # 2. クリップのバラエティ（クリップ長は1回だけ配列化して使い回す）
+        clip_lengths = np.fromiter((c["end"] - c["start"] for c in clips),
+                                   dtype=np.float64, count=len(clips))
+        variety_score = float(clip_lengths.std(ddof=1)) if clip_lengths.size > 1 else 0
 
         # 3. 総動画長
-        total_duration = sum(clip_lengths)
+        total_duration = float(clip_lengths.sum())
 
         # スコア計算
         scores["overall_score"] = min(100, int(avg_excitement * 2 + variety_score * 5))
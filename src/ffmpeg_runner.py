@@ -0,0 +1,125 @@
+"""
+FFmpeg Runner Module
+FFmpeg実行ヘルパー（stderrを逐次読み捨て、メモリ使用量を一定に保つ）
+"""
+
+import asyncio
+import logging
+import re
+import subprocess
+from collections import deque
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 保持する stderr の末尾行数（エラー表示・サマリー解析用）
+STDERR_TAIL_LINES = 64
+PIPE_BUFFER_SIZE = 1 << 20
+
+# 進捗: 人間向けの統計行 (frame=... time=... を毎秒何度も上書き) は止め、
+# -progress の key=value 形式を stderr に出す（更新は約0.5秒ごと）
+PROGRESS_ARGS = ["-nostats", "-progress", "pipe:2"]
+
+# -progress の1行: "out_time_us=4000000" / "bitrate= 137.4kbits/s" / "progress=continue"
+_PROGRESS_LINE_RE = re.compile(r"^(\w+)=\s*(.*)$")
+
+
+def _with_progress_args(cmd: List[str], loglevel: str) -> List[str]:
+    """ログレベルと -progress 出力の指定を実行ファイルの直後に挿入"""
+    return [cmd[0], "-loglevel", loglevel, *PROGRESS_ARGS, *cmd[1:]]
+
+
+def _handle_stderr_line(line: str, tail: deque,
+                        on_progress: Optional[Callable[[float], None]]) -> None:
+    """stderr の1行を処理（進捗行はコールバックへ、それ以外は末尾に保持）"""
+    match = _PROGRESS_LINE_RE.match(line)
+    if match is None:
+        tail.append(line)
+        return
+    # 進捗行はエラー表示用の末尾に残さない
+    key, value = match.groups()
+    if on_progress is not None and key == "out_time_us" and value.isdigit():
+        on_progress(int(value) / 1_000_000)
+
+
+def run_ffmpeg(cmd: List[str], check: bool = True,
+               on_progress: Optional[Callable[[float], None]] = None,
+               stdin=None, env: Optional[dict] = None,
+               loglevel: str = "error") -> subprocess.CompletedProcess:
+    """
+    FFmpegを実行し、stderr を1行ずつ読みながら末尾だけを保持する
+
+    capture_output=True は終了まで stderr 全体をメモリに溜めるため、長時間のエンコードでは
+    進捗行だけで数MB〜数百MBになる。ここでは末尾 STDERR_TAIL_LINES 行のみ残す
+
+    Args:
+        cmd: 実行するコマンド（先頭はFFmpegの実行ファイル）
+        check: True の場合、失敗時に CalledProcessError を送出
+        on_progress: 進捗コールバック（処理済みの秒数）
+        stdin: 標準入力（パイプ入力時など）
+        env: 環境変数
+        loglevel: FFmpegのログレベル（フィルターの測定結果など info 出力を解析する場合は "info"）
+
+    Returns:
+        CompletedProcess（stderr は進捗行を除いた末尾のみの文字列、stdout は None）
+    """
+    cmd = _with_progress_args(cmd, loglevel)
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    # stdout は破棄し stderr だけをパイプで読むので、読み取り側が詰まることはない
+    with subprocess.Popen(
+        cmd,
+        stdin=stdin if stdin is not None else subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        bufsize=PIPE_BUFFER_SIZE,
+        text=True,
+        errors="replace",
+        env=env,
+    ) as proc:
+        for line in proc.stderr:
+            _handle_stderr_line(line, tail, on_progress)
+        returncode = proc.wait()
+
+    stderr = "".join(tail)
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+    return subprocess.CompletedProcess(cmd, returncode, stdout=None, stderr=stderr)
+
+
+async def run_ffmpeg_async(cmd: List[str], check: bool = True,
+                           on_progress: Optional[Callable[[float], None]] = None,
+                           env: Optional[dict] = None,
+                           loglevel: str = "error") -> subprocess.CompletedProcess:
+    """
+    run_ffmpeg() の非同期版（asyncio のサブプロセスとして待つ）
+
+    同じく -loglevel / -progress を挿入し、stderr を1行ずつ読んで末尾だけを保持する。
+    communicate() のように stderr 全体をメモリに溜めることはない。
+    待機中にキャンセルされた場合はFFmpegを終了させる
+    """
+    cmd = _with_progress_args(cmd, loglevel)
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+        limit=PIPE_BUFFER_SIZE,
+    )
+    try:
+        async for line in proc.stderr:
+            _handle_stderr_line(line.decode("utf-8", errors="replace"), tail, on_progress)
+        returncode = await proc.wait()
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+
+    stderr = "".join(tail)
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+    return subprocess.CompletedProcess(cmd, returncode, stdout=None, stderr=stderr)
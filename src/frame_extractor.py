@@ -1,17 +1,53 @@
 """
 Frame Extractor Module
-OpenCVを使用して動画からフレームを抽出
+NVDEC（OpenCV cudacodec）/ FFmpeg（フォールバック: OpenCV）を使用して動画からフレームを抽出
 """
 
 import cv2
 import os
 import logging
+import subprocess
 from pathlib import Path
 from typing import List
 import asyncio
 
+from src.ffmpeg_runner import run_ffmpeg
+from src.video_editor import FFMPEG_PATH
+
 logger = logging.getLogger(__name__)
 
+# libjpeg-turbo (SIMD) によるJPEGエンコード（オプション）
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _TURBOJPEG = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except (ImportError, OSError, RuntimeError):
+    _TURBOJPEG = None
+    TURBOJPEG_AVAILABLE = False
+
+
+def _cuda_decode_available() -> bool:
+    """OpenCVがCUDAビルドかつGPUが利用可能か"""
+    try:
+        return hasattr(cv2, "cudacodec") and cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+
+def _write_jpeg(path: Path, frame, quality: int) -> None:
+    """BGRフレームをJPEGで保存（TurboJPEGがあれば使用、なければcv2.imwrite）"""
+    if TURBOJPEG_AVAILABLE:
+        with open(path, "wb") as f:
+            f.write(_TURBOJPEG.encode(frame, quality=quality, pixel_format=TJPF_BGR))
+    else:
+        cv2.imwrite(str(path), frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+
+
+def _jpeg_quality_to_qscale(quality: int) -> int:
+    """JPEG品質(0-100)をFFmpegの -q:v (2=最高, 31=最低) に変換"""
+    quality = max(0, min(100, quality))
+    return round(2 + (100 - quality) * 29 / 100)
+
 
 class FrameExtractor:
     """動画からフレームを抽出するクラス"""
@@ -41,9 +77,105 @@ class FrameExtractor:
         return await loop.run_in_executor(None, self._extract_frames_sync, video_path, output_dir)
 
     def _extract_frames_sync(self, video_path: str, output_dir: Path) -> List[str]:
-        """同期版のフレーム抽出"""
+        """同期版のフレーム抽出（NVDEC → FFmpeg → OpenCV逐次デコードの順に試行）"""
         logger.info(f"Starting frame extraction from: {video_path}")
 
+        if _cuda_decode_available():
+            try:
+                return self._extract_frames_cuda(video_path, output_dir)
+            except cv2.error as e:
+                logger.warning(f"CUDA frame extraction failed, falling back to FFmpeg: {e}")
+                for leftover in output_dir.glob("frame_*.jpg"):
+                    leftover.unlink()
+
+        try:
+            return self._extract_frames_ffmpeg(video_path, output_dir)
+        except (OSError, subprocess.CalledProcessError) as e:
+            detail = e.stderr[-2000:] if getattr(e, "stderr", None) else e
+            logger.warning(f"FFmpeg frame extraction failed, falling back to OpenCV: {detail}")
+            for leftover in output_dir.glob("raw_*.jpg"):
+                leftover.unlink()
+            return self._extract_frames_opencv(video_path, output_dir)
+
+    def _extract_frames_cuda(self, video_path: str, output_dir: Path) -> List[str]:
+        """
+        cv2.cudacodec（NVDEC）でデコードし、保存するフレームだけをCPUへ転送
+
+        デコードはGPU上の専用ハードウェアで行われ、間引いたフレームはダウンロードされない
+        """
+        # FPSはコンテナのメタデータから取得
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        if fps <= 0:
+            raise cv2.error(f"Cannot determine FPS of video file: {video_path}")
+
+        reader = cv2.cudacodec.createVideoReader(video_path)
+        frame_interval = max(1, int(fps * self.interval_seconds))
+
+        extracted_frames = []
+        frame_count = 0
+
+        while len(extracted_frames) < self.max_frames:
+            ret, gpu_frame = reader.nextFrame()
+            if not ret:
+                break
+
+            if frame_count % frame_interval == 0:
+                frame = gpu_frame.download()
+                if frame.ndim == 3 and frame.shape[2] == 4:
+                    # cudacodec の出力は BGRA
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+
+                timestamp = frame_count / fps
+                frame_path = output_dir / f"frame_{len(extracted_frames):06d}_t{timestamp:.2f}s.jpg"
+                _write_jpeg(frame_path, frame, self.quality)
+                extracted_frames.append(str(frame_path))
+
+            frame_count += 1
+
+        if len(extracted_frames) >= self.max_frames:
+            logger.warning(f"Reached max frames limit: {self.max_frames}")
+
+        logger.info(f"Frame extraction (CUDA) completed: {len(extracted_frames)} frames extracted")
+
+        return extracted_frames
+
+    def _extract_frames_ffmpeg(self, video_path: str, output_dir: Path) -> List[str]:
+        """
+        FFmpegの fps フィルタで必要なフレームだけを出力
+
+        デコーダ側で間引くため、保存しないフレームの画素コピーやJPEG化が発生しない
+        """
+        cmd = [
+            FFMPEG_PATH, "-y", "-hide_banner",
+            "-hwaccel", "auto",
+            "-i", str(video_path),
+            "-vf", f"fps=1/{self.interval_seconds}",
+            "-q:v", str(_jpeg_quality_to_qscale(self.quality)),
+            "-frames:v", str(self.max_frames),
+            str(output_dir / "raw_%06d.jpg")
+        ]
+        run_ffmpeg(cmd, loglevel="error")
+
+        # 出力順のインデックスからタイムスタンプを復元してリネーム
+        extracted_frames = []
+        for index, raw_path in enumerate(sorted(output_dir.glob("raw_*.jpg"))):
+            timestamp = index * self.interval_seconds
+            frame_path = output_dir / f"frame_{index:06d}_t{timestamp:.2f}s.jpg"
+            os.replace(raw_path, frame_path)
+            extracted_frames.append(str(frame_path))
+
+        if len(extracted_frames) >= self.max_frames:
+            logger.warning(f"Reached max frames limit: {self.max_frames}")
+
+        logger.info(f"Frame extraction completed: {len(extracted_frames)} frames extracted")
+
+        return extracted_frames
+
+    def _extract_frames_opencv(self, video_path: str, output_dir: Path) -> List[str]:
+        """OpenCVで全フレームを逐次デコードして抽出"""
+
         # 動画を開く
         cap = cv2.VideoCapture(video_path)
 
@@ -78,11 +210,7 @@ class FrameExtractor:
                     frame_path = output_dir / frame_filename
 
                     # JPEG品質を指定して保存
-                    cv2.imwrite(
-                        str(frame_path),
-                        frame,
-                        [cv2.IMWRITE_JPEG_QUALITY, self.quality]
-                    )
+                    _write_jpeg(frame_path, frame, self.quality)
 
                     extracted_frames.append(str(frame_path))
                     saved_count += 1
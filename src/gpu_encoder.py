@@ -3,14 +3,239 @@ GPU Accelerated Encoding Module
 GPUアクセラレーション対応エンコーダー (NVENC, H.265/HEVC, AV1)
 """
 
+import json
 import logging
+import os
+import shutil
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.ffmpeg_runner import run_ffmpeg
 
 logger = logging.getLogger(__name__)
 FFMPEG_PATH = "ffmpeg"
 
+# 自動選択するH.264ハードウェアエンコーダー (優先順)
+# (エンコーダー名, エンコード引数, 入力側デコード引数)
+HW_H264_ENCODERS = [
+    ("h264_nvenc", ["-preset", "p5", "-cq", "19", "-rc", "vbr", "-b:v", "0"], ["-hwaccel", "cuda"]),
+    ("h264_qsv", ["-preset", "slow", "-global_quality", "18"], ["-hwaccel", "qsv"]),
+    ("h264_videotoolbox", ["-q:v", "65"], ["-hwaccel", "videotoolbox"]),
+]
+
+# ハードウェアエンコーダーがない場合のCPUエンコード
+CPU_H264_ARGS = ["-c:v", "libx264", "-preset", "slow", "-crf", "18"]
+
+# NVENCの画質向上オプション（先読み・適応量子化・Bフレーム参照・2パス）。AV1 NVENC には使わない
+NVENC_QUALITY_ARGS = [
+    "-rc-lookahead", "20",
+    "-spatial-aq", "1", "-temporal-aq", "1", "-aq-strength", "8",
+    "-bf", "3", "-b_ref_mode", "middle",
+    "-multipass", "fullres",
+]
+
+# 一括エンコード時の同時実行数（コンシューマー向けGPUは同時セッション数に制限がある）
+HW_MAX_SESSIONS = 2
+# CPUエンコード1本あたりに割り当てるスレッド数
+CPU_THREADS_PER_ENCODE = 4
+
+
+@lru_cache(maxsize=1)
+def _ffmpeg_encoders() -> str:
+    """ffmpeg -encoders の出力（プロセス内で1回だけ取得）"""
+    try:
+        result = subprocess.run(
+            [FFMPEG_PATH, "-hide_banner", "-encoders"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=5
+        )
+        return result.stdout
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Could not list FFmpeg encoders: {e}")
+        return ""
+
+
+@lru_cache(maxsize=1)
+def _ffmpeg_filters() -> frozenset:
+    """ffmpeg -filters のフィルター名一覧（プロセス内で1回だけ取得）"""
+    try:
+        result = subprocess.run(
+            [FFMPEG_PATH, "-hide_banner", "-filters"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=5
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Could not list FFmpeg filters: {e}")
+        return frozenset()
+    # 各行: " TSC bilateral_cuda    V->V       GPU accelerated bilateral filter"
+    return frozenset(
+        parts[1] for parts in (line.split() for line in result.stdout.splitlines())
+        if len(parts) > 2 and "->" in parts[2]
+    )
+
+
+# GPU検出結果のキャッシュ（FFmpegバイナリが変わらない限りプロセスをまたいで再利用）
+GPU_CACHE_PATH = Path.home() / ".cache" / "movie_auto_editor" / "gpu.json"
+
+
+def _ffmpeg_binary_key() -> Optional[str]:
+    """FFmpegバイナリのパス・更新時刻・サイズからキャッシュキーを作る（見つからなければ None）"""
+    path = shutil.which(FFMPEG_PATH)
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{os.path.realpath(path)}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def _vendor_from_encoders(output: str) -> str:
+    """ffmpeg -encoders の出力からGPUベンダーを判定"""
+    if "h264_nvenc" in output:
+        logger.info("NVIDIA NVENC detected")
+        return "nvidia"
+    elif "h264_amf" in output:
+        logger.info("AMD AMF detected")
+        return "amd"
+    elif "h264_qsv" in output:
+        logger.info("Intel QSV detected")
+        return "intel"
+    else:
+        logger.info("No GPU encoder detected, using CPU")
+        return "cpu"
+
+
+@lru_cache(maxsize=1)
+def _detect_gpu_cached() -> str:
+    """
+    利用可能なGPUエンコーダーのベンダーを検出（プロセス内・GPU_CACHE_PATH の両方にキャッシュ）
+
+    ビルドに含まれるエンコーダーはバイナリで決まるため、バイナリの更新時刻・サイズをキーにする
+    """
+    key = _ffmpeg_binary_key()
+    try:
+        cache = json.loads(GPU_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        cache = {}
+    if key is not None and key in cache:
+        return cache[key]
+
+    try:
+        vendor = _vendor_from_encoders(_ffmpeg_encoders())
+    except Exception as e:
+        logger.warning(f"GPU detection failed: {e}")
+        return "cpu"
+
+    if key is not None:
+        cache[key] = vendor
+        try:
+            GPU_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = GPU_CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(cache))
+            os.replace(tmp_path, GPU_CACHE_PATH)
+        except OSError as e:
+            logger.warning(f"Could not save GPU detection cache: {e}")
+    return vendor
+
+
+def has_ffmpeg_filter(name: str) -> bool:
+    """FFmpegビルドに指定フィルターが含まれるか"""
+    return name in _ffmpeg_filters()
+
+
+def cuda_filters_available() -> bool:
+    """CUDAフィルターを使えるか（NVENCが実際に動作し、bilateral_cuda がビルドに含まれる）"""
+    hw = detect_hw_encoder()
+    return hw is not None and hw[0] == "h264_nvenc" and has_ffmpeg_filter("bilateral_cuda")
+
+
+def cuda_overlay_available() -> bool:
+    """GPU上で合成できるか（NVENCが実際に動作し、scale_cuda / overlay_cuda がビルドに含まれる）"""
+    hw = detect_hw_encoder()
+    return (hw is not None and hw[0] == "h264_nvenc"
+            and has_ffmpeg_filter("scale_cuda") and has_ffmpeg_filter("overlay_cuda"))
+
+
+@lru_cache(maxsize=None)
+def filter_works(filter_str: str) -> bool:
+    """
+    フィルターが実際に動作するか1フレームで確認（結果はキャッシュ）
+
+    GPUフィルター (libplacebo 等) はビルドに含まれていてもデバイスがなければ失敗する
+    """
+    cmd = [
+        FFMPEG_PATH, "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", "color=black:s=256x256,format=yuv420p",
+        "-frames:v", "1", "-vf", filter_str, "-f", "null", "-"
+    ]
+    try:
+        return subprocess.run(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30
+        ).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+def libplacebo_available() -> bool:
+    """Vulkan (libplacebo) フィルターを使えるか"""
+    return has_ffmpeg_filter("libplacebo") and filter_works("libplacebo=format=yuv420p")
+
+
+def _encoder_works(encoder: str) -> bool:
+    """1フレームの試験エンコードでデバイスが実際に使えるか確認"""
+    cmd = [
+        FFMPEG_PATH, "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", "color=black:s=256x256",
+        "-frames:v", "1", "-c:v", encoder, "-f", "null", "-"
+    ]
+    try:
+        return subprocess.run(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=15
+        ).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+@lru_cache(maxsize=1)
+def detect_hw_encoder() -> Optional[tuple]:
+    """
+    利用可能なH.264ハードウェアエンコーダーを検出（結果はキャッシュ）
+
+    ビルドに含まれていてもGPUがなければ失敗するため、試験エンコードで確認する
+
+    Returns:
+        (エンコーダー名, エンコード引数, デコード引数) または None
+    """
+    available = _ffmpeg_encoders()
+    for entry in HW_H264_ENCODERS:
+        if entry[0] in available and _encoder_works(entry[0]):
+            logger.info(f"Hardware H.264 encoder selected: {entry[0]}")
+            return entry
+    logger.info("No hardware H.264 encoder available, using libx264")
+    return None
+
+
+def video_encode_args(cpu_args: Optional[List[str]] = None) -> List[str]:
+    """
+    H.264出力用の -c:v 以降の引数（HWエンコーダー優先）
+
+    Args:
+        cpu_args: HWエンコーダーがない場合の引数（None の場合は libx264 slow/crf18）
+    """
+    hw = detect_hw_encoder()
+    if hw is None:
+        return list(CPU_H264_ARGS if cpu_args is None else cpu_args)
+    return ["-c:v", hw[0], *hw[1]]
+
+
+def hwaccel_input_args() -> List[str]:
+    """入力 (-i の前) に付けるハードウェアデコード引数"""
+    hw = detect_hw_encoder()
+    return list(hw[2]) if hw is not None else []
+
 
 class GPUEncoder:
     """GPUエンコーダークラス"""
@@ -19,36 +244,103 @@ class GPUEncoder:
         self.config = config
         self.gpu_config = config.get("gpu_encoder", {})
         self.gpu_available = self._detect_gpu()
+        self._max_sessions = self._default_max_sessions()
 
     def _detect_gpu(self) -> str:
-        """利用可能なGPUエンコーダーを検出"""
+        """利用可能なGPUエンコーダーを検出（結果はモジュール単位でキャッシュ）"""
+        return _detect_gpu_cached()
+
+    def _default_max_sessions(self) -> int:
+        """一括エンコードの同時実行数（設定 max_sessions が 0 / 未指定なら自動）"""
+        configured = self.gpu_config.get("max_sessions", 0)
+        if configured:
+            return max(1, int(configured))
+        if self.gpu_available == "cpu":
+            return max(1, (os.cpu_count() or 1) // CPU_THREADS_PER_ENCODE)
+        return HW_MAX_SESSIONS
+
+    def encode_batch(self, jobs: List[Tuple[str, str]],
+                     codec: str = "h264", quality: str = "high",
+                     preset: str = "p4", max_workers: Optional[int] = None) -> List[str]:
+        """
+        複数動画を並列エンコード
+
+        各ジョブは独立したFFmpegプロセスのため、スレッドで並列に起動する。
+        GPUは同時セッション数まで、CPUはコア数をジョブ間で分け合う
+
+        Args:
+            jobs: [(入力動画パス, 出力動画パス), ...]
+            codec: コーデック (h264, h265, av1)
+            quality: 品質 (low, medium, high, ultra)
+            preset: プリセット (p1-p7, fast, medium, slow)
+            max_workers: 同時実行数 (None = max_sessions と件数の小さい方)
+
+        Returns:
+            入力順の出力ファイルパス
+        """
+        if not jobs:
+            return []
+
+        workers = max_workers or min(len(jobs), self._max_sessions)
+        threads = None
+        if self.gpu_available == "cpu":
+            threads = max(1, (os.cpu_count() or 1) // workers)
+
+        logger.info(f"Batch encoding {len(jobs)} videos ({workers} parallel)")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self.encode_video, src, dst, codec, quality, preset, threads)
+                for src, dst in jobs
+            ]
+            return [f.result() for f in futures]
+
+    def stream_copy_concat(self, input_path: str, clips: List[Dict], output_path: str) -> str:
+        """
+        同一ソースのクリップを再エンコードせずに連結（concat デマルチプレクサ + -c copy）
+
+        各クリップは inpoint/outpoint で指定する。ストリームコピーのため切り出し位置は
+        キーフレーム単位になる。コピーできない場合（出力コンテナが入力のコーデックに
+        対応していない等）は同じリストを再エンコードして連結する
+
+        Args:
+            input_path: 入力動画パス
+            clips: クリップ情報のリスト [{"start": 10.0, "end": 25.0}, ...]
+            output_path: 出力動画パス
+
+        Returns:
+            出力ファイルパス
+        """
+        if not clips:
+            raise ValueError("No clips to concatenate")
+
+        # concat リストのパスは単一引用符で囲み、内部の ' は '\'' でエスケープ
+        source = os.path.abspath(input_path).replace("'", "'\\''")
+        lines = []
+        for clip in clips:
+            lines.append(f"file '{source}'")
+            lines.append(f"inpoint {float(clip['start']):.6f}")
+            lines.append(f"outpoint {float(clip['end']):.6f}")
+
+        fd, list_path = tempfile.mkstemp(suffix=".txt", prefix="concat_")
         try:
-            # NVIDIAチェック
-            result = subprocess.run(
-                [FFMPEG_PATH, "-hide_banner", "-encoders"],
-                capture_output=True, text=True, timeout=5
-            )
-            output = result.stdout
-
-            if "h264_nvenc" in output:
-                logger.info("NVIDIA NVENC detected")
-                return "nvidia"
-            elif "h264_amf" in output:
-                logger.info("AMD AMF detected")
-                return "amd"
-            elif "h264_qsv" in output:
-                logger.info("Intel QSV detected")
-                return "intel"
-            else:
-                logger.info("No GPU encoder detected, using CPU")
-                return "cpu"
-        except Exception as e:
-            logger.warning(f"GPU detection failed: {e}")
-            return "cpu"
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+            base = [FFMPEG_PATH, "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+            result = run_ffmpeg([*base, "-c", "copy", str(output_path)], check=False)
+            if result.returncode != 0:
+                logger.warning(f"Stream copy concat failed, re-encoding: {result.stderr}")
+                run_ffmpeg([*base, *video_encode_args(), "-c:a", "aac", "-b:a", "192k", str(output_path)])
+        finally:
+            os.unlink(list_path)
+
+        logger.info(f"Concatenated {len(clips)} clips: {output_path}")
+        return str(output_path)
 
     def encode_video(self, input_path: str, output_path: str,
                     codec: str = "h264", quality: str = "high",
-                    preset: str = "p4") -> str:
+                    preset: str = "p4", threads: Optional[int] = None,
+                    on_progress: Optional[Callable[[float], None]] = None) -> str:
         """
         GPU加速エンコード
 
@@ -58,6 +350,8 @@ class GPUEncoder:
             codec: コーデック (h264, h265, av1)
             quality: 品質 (low, medium, high, ultra)
             preset: プリセット (p1-p7, fast, medium, slow)
+            threads: CPUエンコード時のスレッド数 (None = FFmpeg既定)
+            on_progress: 進捗コールバック（エンコード済みの秒数）
 
         Returns:
             出力ファイルパス
@@ -65,16 +359,17 @@ class GPUEncoder:
         logger.info(f"GPU encoding: {codec} with {quality} quality")
 
         if self.gpu_available == "nvidia":
-            return self._encode_nvidia(input_path, output_path, codec, quality, preset)
+            return self._encode_nvidia(input_path, output_path, codec, quality, preset, on_progress)
         elif self.gpu_available == "amd":
-            return self._encode_amd(input_path, output_path, codec, quality)
+            return self._encode_amd(input_path, output_path, codec, quality, on_progress)
         elif self.gpu_available == "intel":
-            return self._encode_intel(input_path, output_path, codec, quality)
+            return self._encode_intel(input_path, output_path, codec, quality, on_progress)
         else:
-            return self._encode_cpu(input_path, output_path, codec, quality)
+            return self._encode_cpu(input_path, output_path, codec, quality, threads, on_progress)
 
     def _encode_nvidia(self, input_path: str, output_path: str,
-                      codec: str, quality: str, preset: str) -> str:
+                      codec: str, quality: str, preset: str,
+                      on_progress: Optional[Callable[[float], None]] = None) -> str:
         """NVIDIA NVENCエンコード"""
         codec_map = {
             "h264": "h264_nvenc",
@@ -92,25 +387,37 @@ class GPUEncoder:
         video_codec = codec_map.get(codec, "h264_nvenc")
         cq_value = quality_map.get(quality, "18")
 
-        cmd = [
-            FFMPEG_PATH, "-y",
-            "-hwaccel", "cuda",
-            "-i", str(input_path),
-            "-c:v", video_codec,
-            "-preset", preset,
-            "-cq", cq_value,
-            "-rc", "vbr",
-            "-b:v", "0",
-            "-c:a", "aac", "-b:a", "192k",
-            str(output_path)
-        ]
+        # 先読み・AQ・Bフレーム参照は H.264/HEVC のみ（設定 nvenc_quality_tuning で無効化可能）
+        tuning = []
+        if video_codec != "av1_nvenc" and self.gpu_config.get("nvenc_quality_tuning", True):
+            tuning = NVENC_QUALITY_ARGS
+
+        def build_cmd(extra_args: List[str]) -> List[str]:
+            return [
+                FFMPEG_PATH, "-y",
+                "-hwaccel", "cuda",
+                "-i", str(input_path),
+                "-c:v", video_codec,
+                "-preset", preset,
+                "-cq", cq_value,
+                "-rc", "vbr",
+                "-b:v", "0",
+                *extra_args,
+                "-c:a", "aac", "-b:a", "192k",
+                str(output_path)
+            ]
 
-        subprocess.run(cmd, check=True, capture_output=True)
+        result = run_ffmpeg(build_cmd(tuning), check=not tuning, on_progress=on_progress)
+        if result.returncode != 0:
+            # Turing より前のGPUは b_ref_mode 等に非対応のため、基本設定で再実行
+            logger.warning(f"NVENC quality options rejected, retrying without them: {result.stderr}")
+            run_ffmpeg(build_cmd([]), on_progress=on_progress)
         logger.info(f"NVIDIA NVENC encoding completed: {output_path}")
         return str(output_path)
 
     def _encode_amd(self, input_path: str, output_path: str,
-                   codec: str, quality: str) -> str:
+                   codec: str, quality: str,
+                   on_progress: Optional[Callable[[float], None]] = None) -> str:
         """AMD AMFエンコード"""
         codec_map = {
             "h264": "h264_amf",
@@ -128,11 +435,12 @@ class GPUEncoder:
             str(output_path)
         ]
 
-        subprocess.run(cmd, check=True, capture_output=True)
+        run_ffmpeg(cmd, on_progress=on_progress)
         return str(output_path)
 
     def _encode_intel(self, input_path: str, output_path: str,
-                     codec: str, quality: str) -> str:
+                     codec: str, quality: str,
+                     on_progress: Optional[Callable[[float], None]] = None) -> str:
         """Intel QSVエンコード"""
         codec_map = {
             "h264": "h264_qsv",
@@ -152,11 +460,12 @@ class GPUEncoder:
             str(output_path)
         ]
 
-        subprocess.run(cmd, check=True, capture_output=True)
+        run_ffmpeg(cmd, on_progress=on_progress)
         return str(output_path)
 
     def _encode_cpu(self, input_path: str, output_path: str,
-                   codec: str, quality: str) -> str:
+                   codec: str, quality: str, threads: Optional[int] = None,
+                   on_progress: Optional[Callable[[float], None]] = None) -> str:
         """CPUエンコード (フォールバック)"""
         codec_map = {
             "h264": "libx264",
@@ -179,9 +488,10 @@ class GPUEncoder:
             "-c:v", video_codec,
             "-preset", "slow",
             "-crf", crf_value,
+            *(["-threads", str(threads)] if threads else []),
             "-c:a", "aac", "-b:a", "192k",
             str(output_path)
         ]
 
-        subprocess.run(cmd, check=True, capture_output=True)
+        run_ffmpeg(cmd, on_progress=on_progress)
         return str(output_path)
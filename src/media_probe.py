@@ -0,0 +1,71 @@
+"""
+Media Probe Module
+動画メタデータ取得（ffprobeサブプロセスを使わずに読み取り、結果をキャッシュ）
+"""
+
+import logging
+import os
+from functools import lru_cache
+from typing import NamedTuple
+
+import cv2
+
+try:
+    import av
+    PYAV_AVAILABLE = True
+except ImportError:
+    PYAV_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class VideoInfo(NamedTuple):
+    """動画の基本情報"""
+    width: int
+    height: int
+    duration: float
+    fps: float
+    has_audio: bool = True
+
+
+def probe_video(path) -> VideoInfo:
+    """
+    動画の解像度・尺・FPSを取得
+
+    (パス, 更新時刻, サイズ) をキーにキャッシュするため、同じファイルを何度調べても
+    読み取りは1回。ファイルが書き換えられた場合は再取得される
+    """
+    path = str(path)
+    st = os.stat(path)
+    return _probe_cached(path, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=128)
+def _probe_cached(path: str, mtime_ns: int, size: int) -> VideoInfo:
+    if PYAV_AVAILABLE:
+        with av.open(path) as container:
+            stream = container.streams.video[0]
+            if container.duration:
+                duration = container.duration / av.time_base
+            elif stream.duration and stream.time_base:
+                duration = float(stream.duration * stream.time_base)
+            else:
+                duration = 0.0
+            fps = float(stream.average_rate) if stream.average_rate else 0.0
+            return VideoInfo(stream.width, stream.height, duration, fps, bool(container.streams.audio))
+
+    # PyAVがない場合はOpenCVで取得（フレーム数/FPSから尺を概算、音声の有無は判定できないため有りとする）
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video file: {path}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return VideoInfo(
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            frames / fps if fps > 0 else 0.0,
+            fps,
+        )
+    finally:
+        cap.release()
@@ -5,13 +5,27 @@ Multi-Model Vision Analysis
 
 import logging
 import asyncio
-from typing import List, Dict, Optional
+from typing import Awaitable, Callable, List, Dict, Optional
 from collections import Counter
-from src.ollama_client import OllamaClient
+from src.ollama_client import (
+    AIOHTTP_AVAILABLE, FRAME_WINDOW_FACTOR, OllamaClient, frame_timestamp, gather_in_window
+)
+
+if AIOHTTP_AVAILABLE:
+    import aiohttp
 
 logger = logging.getLogger(__name__)
 
 
+def _with_tag(model: str) -> str:
+    """タグ省略時は Ollama と同じく :latest とみなす"""
+    return model if ":" in model else f"{model}:latest"
+
+
+# アンサンブルで多数決する項目（項目名 → 欠損時の値）
+_VOTE_FIELDS = {"kill_log": False, "action_intensity": "low", "match_status": "normal"}
+
+
 class MultiModelAnalyzer:
     """複数ビジョンモデルを使った高精度分析"""
 
@@ -34,6 +48,11 @@ class MultiModelAnalyzer:
             model_config["ollama"]["vision_model"] = model
             self.clients[model] = OllamaClient(model_config)
 
+        # 全クライアントで共有する aiohttp セッション（イベントループ上で遅延生成）
+        self._session = None
+        # モデルの有無の確認（初回の解析時に1回だけ）
+        self._model_check = None
+
         self.strategy = self.multi_config.get("strategy", "ensemble")  # ensemble, confidence, specialized
         logger.info(f"MultiModelAnalyzer initialized with {len(self.models)} models: {self.models}")
         logger.info(f"Strategy: {self.strategy}")
@@ -48,38 +67,144 @@ class MultiModelAnalyzer:
         Returns:
             統合された分析結果
         """
+        self._share_session()
+        if self._model_check is None:
+            self._model_check = asyncio.ensure_future(asyncio.to_thread(self._check_models))
+        await self._model_check
+
         if not self.enabled or len(self.models) == 1:
             # シングルモデルモード
             return await self.clients[self.models[0]].analyze_frame(frame_path)
 
+        # タイムスタンプはファイル名から1回だけ求め、統合結果・デフォルト結果で使い回す
+        timestamp = frame_timestamp(frame_path)
+
         if self.strategy == "ensemble":
-            return await self._ensemble_analysis(frame_path)
+            return await self._ensemble_analysis(frame_path, timestamp)
         elif self.strategy == "confidence":
             return await self._confidence_based_analysis(frame_path)
         elif self.strategy == "specialized":
-            return await self._specialized_analysis(frame_path)
+            return await self._specialized_analysis(frame_path, timestamp)
         else:
-            return await self._ensemble_analysis(frame_path)
+            return await self._ensemble_analysis(frame_path, timestamp)
+
+    async def analyze_frames_batch(self, frame_paths: List[str],
+                                   on_progress: Optional[Callable[[int], Awaitable[None]]] = None) -> List[Dict]:
+        """
+        複数フレームを並行して分析（入力順で返す）
+
+        全フレームをまとめて投入し、同時に処理中のフレーム数は OllamaClient と同じ窓で制限する
+        （各モデルへのリクエスト数は各クライアントのセマフォで制限）
+
+        Args:
+            frame_paths: フレーム画像パスのリスト
+            on_progress: 完了したフレーム数を受け取るコルーチン関数
+
+        Returns:
+            入力順の分析結果リスト
+        """
+        max_concurrency = max(client.max_concurrency for client in self.clients.values())
+        return await gather_in_window(
+            self.analyze_frame, frame_paths, max_concurrency * FRAME_WINDOW_FACTOR, on_progress
+        )
+
+    async def aclose(self) -> None:
+        """各クライアントのセッションと共有セッションを閉じる"""
+        for client in self.clients.values():
+            await client.aclose()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _check_models(self) -> None:
+        """
+        使用するモデルがOllamaサーバーにあるか確認
 
-    async def _ensemble_analysis(self, frame_path: str) -> Dict:
+        ない場合は警告し、auto_pull が有効ならダウンロードする（完了まで解析を待たせる）
+        """
+        used = self.models if self.enabled else self.models[:1]
+        client = self.clients[used[0]]
+        available = client.list_models()
+        if available is None:
+            return
+
+        installed = {_with_tag(name) for name in available}
+        for model in used:
+            if _with_tag(model) in installed:
+                continue
+            if self.multi_config.get("auto_pull", False) and client.pull_model(model):
+                continue
+            logger.warning(f"Model not found on Ollama server: {model} (run: ollama pull {model})")
+
+    def _share_session(self) -> None:
+        """
+        1つの aiohttp セッション（コネクションプール）を全モデルのクライアントで共有
+
+        モデルごとに接続を張らず、同じOllamaサーバーへのkeep-alive接続を使い回す。
+        同時に処理されるかはサーバー側の OLLAMA_NUM_PARALLEL / OLLAMA_MAX_LOADED_MODELS による
+        """
+        if not AIOHTTP_AVAILABLE or (self._session is not None and not self._session.closed):
+            return
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.config["ollama"]["timeout"])
+        )
+        for client in self.clients.values():
+            client.attach_session(self._session)
+
+    def close(self) -> None:
+        """各クライアントのワーカープールとキャッシュを閉じる"""
+        for client in self.clients.values():
+            client.close()
+
+    async def _ensemble_analysis(self, frame_path: str, timestamp: float) -> Dict:
         """
         アンサンブル投票方式
-        全モデルで解析 → 多数決
+        全モデルで解析 → 多数決（全項目の過半数が決まった時点で残りのモデルはキャンセル）
         """
         logger.info(f"Ensemble analysis with {len(self.models)} models")
 
-        # 全モデルで並列解析
-        tasks = [
-            client.analyze_frame(frame_path)
-            for client in self.clients.values()
-        ]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # エラーハンドリング
-        valid_results = [r for r in results if not isinstance(r, Exception)]
+        # 全モデルで並列解析し、完了順に集計
+        tasks = {
+            asyncio.create_task(client.analyze_frame(frame_path)): model
+            for model, client in self.clients.items()
+        }
+        early_exit = self.multi_config.get("ensemble_early_exit", True)
+        majority = len(tasks) // 2 + 1
+        votes = {field: Counter() for field in _VOTE_FIELDS}
+        completed = {}
+
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # エラーハンドリング（失敗したモデルは投票に含めない）
+                    if task.exception() is not None:
+                        continue
+                    result = task.result()
+                    completed[tasks[task]] = result
+                    for field, default in _VOTE_FIELDS.items():
+                        votes[field][result.get(field, default)] += 1
+
+                # 全項目で過半数が揃えば、残りのモデルの結果に関係なく多数決の結果は変わらない
+                if early_exit and pending and completed and all(
+                    counter.most_common(1)[0][1] >= majority for counter in votes.values()
+                ):
+                    logger.info(
+                        f"Ensemble decided by {len(completed)}/{len(tasks)} models, "
+                        f"cancelling {len(pending)} pending"
+                    )
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        # 同数時の扱いが変わらないよう、投票はモデルの並び順で行う
+        models_used = [m for m in self.models if m in completed]
+        valid_results = [completed[m] for m in models_used]
         if not valid_results:
             logger.error("All models failed!")
-            return self._default_result(frame_path)
+            return self._default_result(timestamp)
 
         # 投票
         kill_log_votes = [r.get("kill_log", False) for r in valid_results]
@@ -97,13 +222,13 @@ class MultiModelAnalyzer:
 
         # 統合結果
         ensemble_result = {
-            "timestamp": valid_results[0].get("timestamp", 0),
+            "timestamp": timestamp,
             "kill_log": kill_log,
             "action_intensity": action_intensity,
             "match_status": match_status,
             "confidence": avg_confidence,
             "ensemble_votes": len(valid_results),
-            "models_used": [m for m, r in zip(self.models, results) if not isinstance(r, Exception)]
+            "models_used": models_used
         }
 
         logger.info(f"Ensemble result: kill_log={kill_log} (confidence={avg_confidence:.2f})")
@@ -111,40 +236,52 @@ class MultiModelAnalyzer:
 
     async def _confidence_based_analysis(self, frame_path: str) -> Dict:
         """
-        信頼度ベース方式
-        プライマリモデルで解析 → 信頼度低い場合のみセカンダリで再解析
-        """
-        primary_model = self.models[0]
-        secondary_models = self.models[1:]
-
-        logger.info(f"Confidence-based analysis: primary={primary_model}")
+        信頼度ベース方式（K段カスケード）
+        低コストのモデルから順に解析 → 信頼度がその段の閾値以上になった時点で終了
 
-        # プライマリモデルで解析
-        primary_client = self.clients[primary_model]
-        result = await primary_client.analyze_frame(frame_path)
-
-        confidence = result.get("confidence", 0.5)
-        threshold = self.multi_config.get("confidence_threshold", 0.7)
+        最後の段まで閾値に届かなければ、最も信頼度の高い結果を採用する
+        """
+        order = self._cascade_order()
+        thresholds = self._cascade_thresholds(len(order))
 
-        # 信頼度が低い場合のみ追加解析
-        if confidence < threshold and secondary_models:
-            logger.info(f"Low confidence ({confidence:.2f}), running secondary analysis")
+        logger.info(f"Confidence-based analysis: primary={order[0]}")
 
-            # セカンダリモデルで再解析
-            secondary_client = self.clients[secondary_models[0]]
-            secondary_result = await secondary_client.analyze_frame(frame_path)
+        result = None
+        confidence = 0.0
+        for k, model in enumerate(order):
+            stage_result = await self.clients[model].analyze_frame(frame_path)
+            stage_confidence = stage_result.get("confidence", 0.5 if k == 0 else 0)
 
             # より信頼度の高い結果を採用
-            if secondary_result.get("confidence", 0) > confidence:
-                logger.info("Using secondary model result (higher confidence)")
-                result = secondary_result
-                result["fallback_used"] = True
-            else:
+            if result is None or stage_confidence > confidence:
+                if k > 0:
+                    logger.info(f"Using {model} result (higher confidence)")
+                    stage_result["fallback_used"] = True
+                result, confidence = stage_result, stage_confidence
+            elif not result.get("fallback_used"):
                 result["fallback_checked"] = True
 
+            # 信頼度が閾値以上なら以降の（より高コストな）モデルは使わない
+            if k == len(order) - 1 or stage_confidence >= thresholds[k]:
+                break
+            logger.info(f"Low confidence ({stage_confidence:.2f}), running {order[k + 1]}")
+
         return result
 
-    async def _specialized_analysis(self, frame_path: str) -> Dict:
+    def _cascade_order(self) -> List[str]:
+        """カスケードでモデルを使う順番（model_costs の昇順、指定がなければ models の順）"""
+        costs = self.multi_config.get("model_costs") or {}
+        if not costs:
+            return list(self.models)
+        return sorted(self.models, key=lambda m: costs.get(m, float("inf")))
+
+    def _cascade_thresholds(self, stages: int) -> List[float]:
+        """各段の信頼度閾値（cascade_thresholds で足りない段は confidence_threshold）"""
+        default = self.multi_config.get("confidence_threshold", 0.7)
+        thresholds = list(self.multi_config.get("cascade_thresholds") or [])[:stages]
+        return thresholds + [default] * (stages - len(thresholds))
+
+    async def _specialized_analysis(self, frame_path: str, timestamp: float) -> Dict:
         """
         専門化分担方式
         各モデルが得意分野を担当
@@ -165,11 +302,11 @@ class MultiModelAnalyzer:
         # 有効な結果のみ
         valid_results = [r for r in results if not isinstance(r, Exception)]
         if not valid_results:
-            return self._default_result(frame_path)
+            return self._default_result(timestamp)
 
         # 各モデルの得意分野を統合
         combined_result = {
-            "timestamp": valid_results[0].get("timestamp", 0),
+            "timestamp": timestamp,
             "kill_log": results[0].get("kill_log", False) if len(results) > 0 else False,  # Qwen2-VL
             "action_intensity": results[1].get("action_intensity", "low") if len(results) > 1 else "low",  # LLaVA
             "match_status": valid_results[0].get("match_status", "normal"),
@@ -179,10 +316,8 @@ class MultiModelAnalyzer:
 
         return combined_result
 
-    def _default_result(self, frame_path: str) -> Dict:
+    def _default_result(self, timestamp: float) -> Dict:
         """デフォルトの解析結果"""
-        from pathlib import Path
-        timestamp = float(Path(frame_path).stem.split("_")[-1]) / 1000
         return {
             "timestamp": timestamp,
             "kill_log": False,
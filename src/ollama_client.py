@@ -5,29 +5,161 @@ Ollama APIとの連携（Vision & Thinking）
 
 import requests
 import base64
+import hashlib
 import logging
 import asyncio
-from typing import List, Dict, Optional
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Dict, Optional, Tuple
 from pathlib import Path
-import json
+
+import numpy as np
+import orjson
+
+from src.response_cache import ResponseCache
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# フレームファイル名中のタイムスタンプ (例: frame_000001_t12.34s.jpg)
+_TS_RE = re.compile(r"_t([0-9]*\.?[0-9]+)s\.(?:jpg|jpeg|png|webp)$", re.IGNORECASE)
+
+
+# 一括解析で同時に処理中にするフレーム数（max_concurrency の何倍か）。
+# 送信枠より多めに用意し、送信中に次のフレームの読み込み・エンコードを済ませておく
+FRAME_WINDOW_FACTOR = 2
+
+
+async def gather_in_window(func: Callable[[str], Awaitable[Dict]], frame_paths: List[str],
+                           window: int,
+                           on_progress: Optional[Callable[[int], Awaitable[None]]] = None) -> List[Dict]:
+    """
+    全フレームに func を並行適用（同時に処理中のフレームは window 件まで、入力順で返す）
+
+    バッチの区切りで全件の完了を待たないため、遅いフレームがあっても空いた枠にすぐ次のフレームが入る
+
+    Args:
+        func: 1フレームを解析するコルーチン関数
+        frame_paths: フレーム画像パスのリスト
+        window: 同時に処理中にするフレーム数の上限
+        on_progress: 完了したフレーム数を受け取るコルーチン関数
+    """
+    semaphore = asyncio.Semaphore(max(1, window))
+    done = 0
+
+    async def run(frame_path: str) -> Dict:
+        nonlocal done
+        async with semaphore:
+            result = await func(frame_path)
+        done += 1
+        if on_progress is not None:
+            await on_progress(done)
+        return result
+
+    return await asyncio.gather(*[run(p) for p in frame_paths])
+
+
+def frame_timestamp(frame_path) -> float:
+    """フレームのパス（またはファイル名）からタイムスタンプ（秒）を取得。形式外なら 0.0"""
+    m = _TS_RE.search(str(frame_path))
+    return float(m.group(1)) if m else 0.0
+
 
 class OllamaClient:
     """Ollama APIクライアント"""
 
-    def __init__(self, config: dict):
+    # Vision解析用のプロンプト（全フレーム共通）
+    _VISION_PROMPT = """Analyze this FPS game screenshot and provide a JSON response with the following fields:
+
+{
+    "kill_log": boolean,  // Is there a kill notification/log visible on screen?
+    "match_status": string,  // "playing", "victory", "defeat", "result_screen", or "unknown"
+    "action_intensity": string,  // "low", "medium", or "high" based on visual action/combat
+    "enemy_visible": boolean,  // Are enemy players visible?
+    "ui_elements": string,  // Brief description of visible UI elements
+    "scene_description": string  // Brief description of what's happening
+}
+
+Only respond with valid JSON, no additional text."""
+
+    def __init__(self, config: dict, session=None):
+        """
+        Args:
+            config: 設定
+            session: 共有する aiohttp.ClientSession（省略時は自前で遅延生成。渡した場合は呼び出し側が閉じる）
+        """
         self.config = config
         self.base_url = config["ollama"]["base_url"]
         self.vision_model = config["ollama"]["vision_model"]
         self.thinking_model = config["ollama"]["thinking_model"]
         self.timeout = config["ollama"]["timeout"]
-
-    def _encode_image(self, image_path: str) -> str:
-        """画像をBase64エンコード"""
+        # 同時に投げるVisionリクエスト数の上限
+        self.max_concurrency = config["ollama"].get("max_concurrency", 4)
+
+        # aiohttpセッションとセマフォはイベントループ上で遅延生成
+        self._session = None
+        self._owns_session = True
+        self._semaphore = None
+        if session is not None:
+            self.attach_session(session)
+
+        # 同期パス用: 専用ワーカープール（同時実行数を max_concurrency に制限）と
+        # スレッドごとの requests.Session（keep-alive接続を再利用）
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="ollama"
+        )
+        self._tls = threading.local()
+        self._http_sessions = []
+        self._http_lock = threading.Lock()
+
+        # フレーム内容をキーにした応答キャッシュ（再実行時はOllamaを呼ばない）
+        self._cache = None
+        if config["ollama"].get("response_cache", False):
+            self._cache = ResponseCache(config["ollama"].get("cache_dir", "./cache/ollama"))
+
+    def _read_image(self, image_path: str) -> bytes:
+        """画像ファイルを読み込む"""
         with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode("utf-8")
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(image_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            return image_file.read()
+
+    def _cache_key(self, raw: bytes) -> str:
+        """モデル・プロンプト・画像内容から決まるキャッシュキー"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.vision_model.encode())
+        h.update(b"\0")
+        h.update(self._VISION_PROMPT.encode())
+        h.update(b"\0")
+        h.update(raw)
+        return h.hexdigest()
+
+    def _prepare_frame(self, frame_path: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """
+        フレームを読み込み、キャッシュを確認
+
+        Returns:
+            (キャッシュキー, キャッシュ済み応答, Base64画像)
+            キャッシュヒット時は Base64画像 が None、キャッシュ無効時はキーが None
+        """
+        raw = self._read_image(frame_path)
+        if self._cache is None:
+            return None, None, base64.b64encode(raw).decode("ascii")
+
+        key = self._cache_key(raw)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return key, cached, None
+        return key, None, base64.b64encode(raw).decode("ascii")
 
     async def analyze_frame(self, frame_path: str) -> Dict:
         """
@@ -39,82 +171,191 @@ class OllamaClient:
         Returns:
             解析結果の辞書
         """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._analyze_frame_sync, frame_path)
+        if not AIOHTTP_AVAILABLE:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self._executor, self._analyze_frame_sync, frame_path)
+
+        try:
+            # 画像の読み込み・キャッシュ確認・Base64エンコード（ファイルI/Oはスレッドで）
+            key, cached, image_base64 = await asyncio.to_thread(self._prepare_frame, frame_path)
+            if cached is not None:
+                return self._parse_vision_response({"response": cached}, frame_path)[0]
+
+            session = self._get_session()
+            async with self._get_semaphore():
+                async with session.post(
+                    f"{self.base_url}/api/generate",
+                    data=self._vision_body(image_base64),
+                    headers=_JSON_HEADERS,
+                ) as response:
+                    response.raise_for_status()
+                    result = orjson.loads(await response.read())
+
+            analysis, parsed = self._parse_vision_response(result, frame_path)
+            # JSONとして読めなかった応答はキャッシュせず、次回もモデルに問い合わせる
+            if parsed and key is not None:
+                await asyncio.to_thread(self._cache.put, key, result.get("response", "{}"))
+
+            return analysis
+
+        except Exception as e:
+            logger.error(f"Error analyzing frame {frame_path}: {e}")
+            return self._error_result(frame_path, e)
+
+    async def analyze_frames_batch(self, frame_paths: List[str],
+                                   on_progress: Optional[Callable[[int], Awaitable[None]]] = None) -> List[Dict]:
+        """
+        複数フレームを並行して解析（同時実行数は max_concurrency で制限）
+
+        全フレームをまとめて投入し、Ollamaへのリクエストが常に max_concurrency 件流れ続けるようにする
+        （サーバー側の並列処理・連続バッチングを途切れさせない）
+
+        Args:
+            frame_paths: フレーム画像パスのリスト
+            on_progress: 完了したフレーム数を受け取るコルーチン関数
+
+        Returns:
+            入力順の解析結果リスト
+        """
+        return await gather_in_window(
+            self.analyze_frame, frame_paths, self.max_concurrency * FRAME_WINDOW_FACTOR, on_progress
+        )
+
+    def attach_session(self, session) -> None:
+        """
+        他のクライアントと共有する aiohttp.ClientSession を使う
+
+        同じOllamaサーバーへのkeep-alive接続を複数モデルのクライアントで使い回す。
+        共有セッションは aclose() では閉じない（作成した側が閉じる）
+        """
+        self._session = session
+        self._owns_session = False
+
+    async def aclose(self) -> None:
+        """aiohttpセッションを閉じる（共有セッションの場合は切り離すだけ）"""
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._owns_session = True
+
+    def close(self) -> None:
+        """ワーカープール・HTTPセッション・キャッシュを閉じる"""
+        self._executor.shutdown(wait=True)
+        with self._http_lock:
+            for session in self._http_sessions:
+                session.close()
+            self._http_sessions.clear()
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+
+    def _http_session(self) -> requests.Session:
+        """呼び出しスレッド専用の requests.Session"""
+        session = getattr(self._tls, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._tls.session = session
+            with self._http_lock:
+                self._http_sessions.append(session)
+        return session
+
+    def _get_session(self):
+        """共有aiohttpセッション（keep-alive接続を再利用）"""
+        if not self._owns_session:
+            return self._session
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _vision_body(self, image_base64: str) -> bytes:
+        """Vision解析用のリクエストボディ（orjsonで直接bytesにシリアライズ）"""
+        return orjson.dumps({
+            "model": self.vision_model,
+            "prompt": self._VISION_PROMPT,
+            "images": [image_base64],
+            "stream": False,
+            "format": "json"
+        })
 
     def _analyze_frame_sync(self, frame_path: str) -> Dict:
         """同期版のフレーム解析"""
         try:
-            # 画像をBase64エンコード
-            image_base64 = self._encode_image(frame_path)
-
-            # プロンプト作成
-            prompt = self._create_vision_prompt()
+            # 画像をBase64エンコード（キャッシュヒット時はそのまま返す）
+            key, cached, image_base64 = self._prepare_frame(frame_path)
+            if cached is not None:
+                return self._parse_vision_response({"response": cached}, frame_path)[0]
 
             # Ollama APIリクエスト
-            response = requests.post(
+            response = self._http_session().post(
                 f"{self.base_url}/api/generate",
-                json={
-                    "model": self.vision_model,
-                    "prompt": prompt,
-                    "images": [image_base64],
-                    "stream": False,
-                    "format": "json"
-                },
+                data=self._vision_body(image_base64),
+                headers=_JSON_HEADERS,
                 timeout=self.timeout
             )
 
             response.raise_for_status()
-            result = response.json()
+            result = orjson.loads(response.content)
 
-            # レスポンスをパース
-            try:
-                analysis = json.loads(result.get("response", "{}"))
-            except json.JSONDecodeError:
-                # JSONパースに失敗した場合、テキストレスポンスをそのまま使用
-                analysis = {
-                    "raw_response": result.get("response", ""),
-                    "kill_log": False,
-                    "match_status": "unknown",
-                    "action_intensity": "low"
-                }
-
-            # フレームパスとタイムスタンプを追加
-            frame_name = Path(frame_path).name
-            timestamp = self._extract_timestamp(frame_name)
-
-            analysis["frame_path"] = frame_path
-            analysis["timestamp"] = timestamp
-
-            logger.debug(f"Frame analysis completed: {frame_name}")
+            analysis, parsed = self._parse_vision_response(result, frame_path)
+            # JSONとして読めなかった応答はキャッシュせず、次回もモデルに問い合わせる
+            if parsed and key is not None:
+                self._cache.put(key, result.get("response", "{}"))
 
             return analysis
 
         except Exception as e:
             logger.error(f"Error analyzing frame {frame_path}: {e}")
-            return {
-                "frame_path": frame_path,
-                "timestamp": self._extract_timestamp(Path(frame_path).name),
-                "error": str(e),
+            return self._error_result(frame_path, e)
+
+    def _parse_vision_response(self, result: Dict, frame_path: str) -> Tuple[Dict, bool]:
+        """
+        Ollamaのレスポンスを解析結果に変換
+
+        Returns:
+            (解析結果, 応答をJSONオブジェクトとして読めたか)
+        """
+        try:
+            analysis = orjson.loads(result.get("response", "{}"))
+            parsed = isinstance(analysis, dict)
+        except orjson.JSONDecodeError:
+            parsed = False
+        if not parsed:
+            # JSONパースに失敗した場合、テキストレスポンスをそのまま使用
+            analysis = {
+                "raw_response": result.get("response", ""),
                 "kill_log": False,
                 "match_status": "unknown",
                 "action_intensity": "low"
             }
 
-    def _create_vision_prompt(self) -> str:
-        """Vision解析用のプロンプトを作成"""
-        return """Analyze this FPS game screenshot and provide a JSON response with the following fields:
+        # フレームパスとタイムスタンプを追加
+        frame_name = Path(frame_path).name
+        timestamp = self._extract_timestamp(frame_name)
 
-{
-    "kill_log": boolean,  // Is there a kill notification/log visible on screen?
-    "match_status": string,  // "playing", "victory", "defeat", "result_screen", or "unknown"
-    "action_intensity": string,  // "low", "medium", or "high" based on visual action/combat
-    "enemy_visible": boolean,  // Are enemy players visible?
-    "ui_elements": string,  // Brief description of visible UI elements
-    "scene_description": string  // Brief description of what's happening
-}
+        analysis["frame_path"] = frame_path
+        analysis["timestamp"] = timestamp
 
-Only respond with valid JSON, no additional text."""
+        logger.debug(f"Frame analysis completed: {frame_name}")
+
+        return analysis, parsed
+
+    def _error_result(self, frame_path: str, error: Exception) -> Dict:
+        """解析失敗時の結果"""
+        return {
+            "frame_path": frame_path,
+            "timestamp": self._extract_timestamp(Path(frame_path).name),
+            "error": str(error),
+            "kill_log": False,
+            "match_status": "unknown",
+            "action_intensity": "low"
+        }
 
     async def determine_clips(self, analysis_results: List[Dict]) -> List[Dict]:
         """
@@ -127,7 +368,7 @@ Only respond with valid JSON, no additional text."""
             クリップ情報のリスト [{"start": 10.0, "end": 25.0, "reason": "3 kills"}, ...]
         """
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._determine_clips_sync, analysis_results)
+        return await loop.run_in_executor(self._executor, self._determine_clips_sync, analysis_results)
 
     def _determine_clips_sync(self, analysis_results: List[Dict]) -> List[Dict]:
         """同期版のクリップ決定"""
@@ -136,7 +377,7 @@ Only respond with valid JSON, no additional text."""
             prompt = self._create_thinking_prompt(analysis_results)
 
             # Ollama APIリクエスト
-            response = requests.post(
+            response = self._http_session().post(
                 f"{self.base_url}/api/generate",
                 json={
                     "model": self.thinking_model,
@@ -148,13 +389,13 @@ Only respond with valid JSON, no additional text."""
             )
 
             response.raise_for_status()
-            result = response.json()
+            result = orjson.loads(response.content)
 
             # レスポンスをパース
             try:
-                clips_data = json.loads(result.get("response", "{}"))
+                clips_data = orjson.loads(result.get("response", "{}"))
                 clips = clips_data.get("clips", [])
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 logger.error("Failed to parse thinking model response")
                 clips = self._fallback_clip_detection(analysis_results)
 
@@ -168,20 +409,17 @@ Only respond with valid JSON, no additional text."""
 
     def _create_thinking_prompt(self, analysis_results: List[Dict]) -> str:
         """Thinking用のプロンプトを作成"""
-        # 解析結果をテキストに変換
-        timeline = []
-        for result in analysis_results:
-            timestamp = result.get("timestamp", 0)
-            kill_log = result.get("kill_log", False)
-            action = result.get("action_intensity", "low")
-
-            timeline.append(f"[{timestamp:.1f}s] Kill: {kill_log}, Action: {action}")
-
-        timeline_text = "\n".join(timeline)
+        # 解析結果をテキストに変換（中間リストを作らずに連結）
+        timeline_text = "\n".join(
+            f"[{r.get('timestamp', 0):.1f}s] Kill: {r.get('kill_log', False)}, "
+            f"Action: {r.get('action_intensity', 'low')}"
+            for r in analysis_results
+        )
 
         # 動画の実際の尺を計算してAIに伝える
-        timestamps = [r.get("timestamp", 0) for r in analysis_results]
-        video_duration = max(timestamps) + 2.0 if timestamps else 0.0
+        video_duration = max(
+            (r.get("timestamp", 0) + 2.0 for r in analysis_results), default=0.0
+        )
 
         return f"""You are a video editing assistant. Based on the following FPS game frame analysis timeline, identify the best highlight clips.
 
@@ -206,58 +444,67 @@ Only respond with valid JSON, no additional text."""
 
     def _fallback_clip_detection(self, analysis_results: List[Dict]) -> List[Dict]:
         """フォールバック: シンプルなルールベースのクリップ検出"""
-        clips = []
-        kill_timestamps = []
-
         # キルログがあるタイムスタンプを収集
-        for result in analysis_results:
-            if result.get("kill_log", False):
-                kill_timestamps.append(result.get("timestamp", 0))
-
-        # 連続するキルをグループ化
-        if kill_timestamps:
-            current_clip_start = kill_timestamps[0] - 5  # 5秒前から
-            last_timestamp = kill_timestamps[0]
-
-            for timestamp in kill_timestamps[1:]:
-                if timestamp - last_timestamp > 10:  # 10秒以上離れている
-                    # 現在のクリップを保存
-                    clips.append({
-                        "start": max(0, current_clip_start),
-                        "end": last_timestamp + 5,  # 5秒後まで
-                        "reason": "Kill sequence"
-                    })
-                    # 新しいクリップを開始
-                    current_clip_start = timestamp - 5
-                last_timestamp = timestamp
-
-            # 最後のクリップを保存
-            clips.append({
-                "start": max(0, current_clip_start),
-                "end": last_timestamp + 5,
-                "reason": "Kill sequence"
-            })
+        ts = np.fromiter(
+            (r.get("timestamp", 0) for r in analysis_results if r.get("kill_log", False)),
+            dtype=np.float64,
+        )
+
+        clips = []
+        if len(ts):
+            # 10秒以上離れている箇所でキルをグループ分割
+            bounds = np.flatnonzero(np.diff(ts) > 10)
+            starts = np.concatenate(([0], bounds + 1))
+            ends = np.concatenate((bounds, [len(ts) - 1]))
+
+            # 5秒前から5秒後まで
+            clips = [
+                {
+                    "start": max(0.0, float(ts[s] - 5)),
+                    "end": float(ts[e] + 5),
+                    "reason": "Kill sequence"
+                }
+                for s, e in zip(starts.tolist(), ends.tolist())
+            ]
 
         logger.info(f"Fallback detection found {len(clips)} clips")
         return clips
 
     def _extract_timestamp(self, frame_name: str) -> float:
         """フレームファイル名からタイムスタンプを抽出"""
+        # ファイル名形式: frame_000001_t12.34s.jpg
+        return frame_timestamp(frame_name)
+
+    def list_models(self) -> Optional[List[str]]:
+        """Ollamaサーバーにあるモデル名（name:tag）の一覧。取得できなければ None"""
         try:
-            # ファイル名形式: frame_000001_t12.34s.jpg
-            parts = frame_name.split("_t")
-            if len(parts) > 1:
-                time_str = parts[1].replace("s.jpg", "").replace("s.png", "")
-                return float(time_str)
+            response = self._http_session().get(f"{self.base_url}/api/tags", timeout=5)
+            response.raise_for_status()
+            return [m["name"] for m in orjson.loads(response.content).get("models", [])]
         except Exception as e:
-            logger.warning(f"Could not extract timestamp from {frame_name}: {e}")
+            logger.warning(f"Failed to list Ollama models: {e}")
+            return None
 
-        return 0.0
+    def pull_model(self, model: str) -> bool:
+        """モデルをOllamaサーバーにダウンロード（完了まで待つ）"""
+        logger.info(f"Pulling Ollama model: {model}")
+        try:
+            response = self._http_session().post(
+                f"{self.base_url}/api/pull",
+                data=orjson.dumps({"model": model, "stream": False}),
+                headers=_JSON_HEADERS,
+                timeout=None  # 数GBのダウンロードになるためタイムアウトなし
+            )
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to pull model {model}: {e}")
+            return False
 
     def test_connection(self) -> bool:
         """Ollama接続テスト"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self._http_session().get(f"{self.base_url}/api/tags", timeout=5)
             response.raise_for_status()
             logger.info("Ollama connection successful")
             return True
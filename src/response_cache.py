@@ -0,0 +1,54 @@
+"""
+Response Cache Module
+Ollamaレスポンスのディスクキャッシュ（SQLite）
+"""
+
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """フレーム内容のハッシュをキーにモデル応答を保存するキャッシュ"""
+
+    def __init__(self, cache_dir: str):
+        path = Path(cache_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        self.db_path = path / "responses.sqlite3"
+
+        # 解析はスレッドプールから呼ばれるため接続はロックで共有
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+        logger.info(f"Response cache opened: {self.db_path}")
+
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュ済みの応答を取得（なければ None）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, response: str) -> None:
+        """応答を保存"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response) VALUES (?, ?)", (key, response)
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        """接続を閉じる"""
+        with self._lock:
+            self._conn.close()
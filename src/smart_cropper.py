@@ -4,14 +4,61 @@ Smart Cropping Module (Face/Object Tracking)
 """
 
 import logging
-import subprocess
+import os
+import tempfile
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
 import cv2
 import numpy as np
 from pathlib import Path
 
+from src.ffmpeg_runner import run_ffmpeg
+from src.gpu_encoder import hwaccel_input_args, video_encode_args
+from src.media_probe import probe_video
+
 logger = logging.getLogger(__name__)
 FFMPEG_PATH = "ffmpeg"
 
+# OpenCV DNN顔検出モデル (ResNet-10 SSD)
+FACE_PROTOTXT = "models/face/deploy.prototxt"
+FACE_MODEL = "models/face/res10_300x300_ssd_iter_140000.caffemodel"
+FACE_INPUT_SIZE = (300, 300)
+FACE_MEAN = (104.0, 177.0, 123.0)
+FACE_BATCH_SIZE = 16
+FACE_CONFIDENCE = 0.5
+
+
+@lru_cache(maxsize=1)
+def _load_face_cascade():
+    """Haarカスケードを1回だけ読み込む（OpenCVビルドによっては利用不可）"""
+    if not hasattr(cv2, "CascadeClassifier"):
+        return None
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    return None if cascade.empty() else cascade
+
+
+@lru_cache(maxsize=4)
+def _load_face_net(prototxt: str, model: str):
+    """DNN顔検出器を1回だけ読み込み、CUDAがあればFP16で実行する"""
+    if not (Path(prototxt).exists() and Path(model).exists()):
+        return None
+    try:
+        net = cv2.dnn.readNetFromCaffe(prototxt, model)
+    except cv2.error as e:
+        logger.warning(f"Face detector load failed: {e}")
+        return None
+
+    try:
+        cuda = cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        cuda = False
+    if cuda:
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA_FP16)
+        logger.info("Face detector running on CUDA (FP16)")
+    return net
+
 
 class SmartCropper:
     """スマートクロッピングクラス"""
@@ -19,7 +66,8 @@ class SmartCropper:
     def __init__(self, config: dict):
         self.config = config
         self.cropper_config = config.get("smart_cropper", {})
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.use_hw = config.get("gpu_encoder", {}).get("enable", True)
+        self.face_cascade = _load_face_cascade()
 
     def create_vertical_video(self, input_path: str, output_path: str,
                              tracking_mode: str = "center") -> str:
@@ -46,36 +94,167 @@ class SmartCropper:
     def _crop_center(self, input_path: str, output_path: str) -> str:
         """中央クロッピング"""
         # 元の解像度を取得
-        probe_cmd = [
-            "ffprobe", "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height",
-            "-of", "csv=p=0",
-            str(input_path)
-        ]
-        result = subprocess.run(probe_cmd, capture_output=True, text=True, check=True)
-        width, height = map(int, result.stdout.strip().split(','))
+        info = probe_video(input_path)
+        width, height = info.width, info.height
 
         # 9:16の幅を計算
         target_width = int(height * 9 / 16)
         x_offset = (width - target_width) // 2
 
         cmd = [
-            FFMPEG_PATH, "-y", "-i", str(input_path),
+            FFMPEG_PATH, "-y",
+            *(hwaccel_input_args() if self.use_hw else []), "-i", str(input_path),
             "-vf", f"crop={target_width}:{height}:{x_offset}:0",
+            *(video_encode_args(cpu_args=[]) if self.use_hw else []),  # CPU時はFFmpeg既定のエンコード設定
             "-c:a", "copy",
             str(output_path)
         ]
 
-        subprocess.run(cmd, check=True, capture_output=True)
+        run_ffmpeg(cmd)
         return str(output_path)
 
     def _crop_with_face_tracking(self, input_path: str, output_path: str) -> str:
-        """顔追跡クロッピング (簡易実装)"""
+        """
+        顔追跡クロッピング
+
+        一定間隔でサンプリングしたフレームをまとめて顔検出し、顔中心をEMAで平滑化して
+        sendcmd でクロップ位置を時間ごとに切り替える
+        """
         logger.info("Face tracking cropping")
-        # 実際の実装にはMediaPipeやYOLOが必要
-        # 現状は中央クロッピングにフォールバック
-        return self._crop_center(input_path, output_path)
+
+        info = probe_video(input_path)
+        target_width = int(info.height * 9 / 16)
+        if target_width >= info.width:
+            return self._crop_center(input_path, output_path)
+
+        centers = self._track_face_centers(input_path, info.fps)
+        if not centers:
+            logger.info("No faces tracked, falling back to center crop")
+            return self._crop_center(input_path, output_path)
+
+        # 顔中心をEMAで平滑化し、クロップ範囲内に収める
+        alpha = self.cropper_config.get("face_smoothing", 0.3)
+        max_x = info.width - target_width
+        keyframes = []
+        smoothed = None
+        for t, cx in centers:
+            if cx is None:
+                cx = smoothed if smoothed is not None else info.width / 2
+            smoothed = cx if smoothed is None else alpha * cx + (1 - alpha) * smoothed
+            x = int(min(max(smoothed - target_width / 2, 0), max_x)) & ~1
+            keyframes.append((t, x))
+
+        return self._render_tracked_crop(input_path, output_path, target_width, info.height, keyframes)
+
+    def _track_face_centers(self, input_path: str, fps: float) -> List[Tuple[float, Optional[float]]]:
+        """サンプリングしたフレームごとの (時刻, 顔中心X) を返す（検出なしは None）"""
+        net = _load_face_net(
+            self.cropper_config.get("face_prototxt", FACE_PROTOTXT),
+            self.cropper_config.get("face_model", FACE_MODEL),
+        )
+        if net is None and self.face_cascade is None:
+            logger.warning("No face detector available")
+            return []
+
+        interval = self.cropper_config.get("face_sample_interval", 0.5)
+        step = max(1, int(round((fps or 30.0) * interval)))
+
+        cap = cv2.VideoCapture(str(input_path))
+        if not cap.isOpened():
+            logger.warning(f"Cannot open video file: {input_path}")
+            return []
+
+        centers: List[Tuple[float, Optional[float]]] = []
+        times: List[float] = []
+        frames: List[np.ndarray] = []
+        index = 0
+        try:
+            while True:
+                # サンプリング対象外のフレームはデコードのみ（grab）で読み飛ばす
+                if index % step:
+                    if not cap.grab():
+                        break
+                    index += 1
+                    continue
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                times.append(index / (fps or 30.0))
+                frames.append(frame)
+                index += 1
+                if len(frames) == FACE_BATCH_SIZE:
+                    centers.extend(zip(times, self._detect_face_centers(net, frames)))
+                    times, frames = [], []
+            if frames:
+                centers.extend(zip(times, self._detect_face_centers(net, frames)))
+        finally:
+            cap.release()
+
+        return centers
+
+    def _detect_face_centers(self, net, frames: List[np.ndarray]) -> List[Optional[float]]:
+        """フレームのバッチから最も確信度の高い顔の中心Xを返す"""
+        if net is None:
+            return [self._detect_face_center_haar(frame) for frame in frames]
+
+        width = frames[0].shape[1]
+        blob = cv2.dnn.blobFromImages(frames, 1.0, FACE_INPUT_SIZE, FACE_MEAN)
+        net.setInput(blob)
+        # 出力: [1, 1, N, 7] = (画像番号, クラス, 確信度, x1, y1, x2, y2)
+        detections = net.forward().reshape(-1, 7)
+        detections = detections[detections[:, 2] >= FACE_CONFIDENCE]
+
+        best: List[Optional[float]] = [None] * len(frames)
+        best_conf = [0.0] * len(frames)
+        for image_id, _, conf, x1, _, x2, _ in detections:
+            i = int(image_id)
+            if 0 <= i < len(frames) and conf > best_conf[i]:
+                best_conf[i] = conf
+                best[i] = float((x1 + x2) / 2 * width)
+        return best
+
+    def _detect_face_center_haar(self, frame: np.ndarray) -> Optional[float]:
+        """Haarカスケードで最大の顔の中心Xを返す（縮小画像で検出）"""
+        scale = 320 / frame.shape[1] if frame.shape[1] > 320 else 1.0
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
+        if len(faces) == 0:
+            return None
+        x, _, w, _ = max(faces, key=lambda f: f[2] * f[3])
+        return (x + w / 2) / scale
+
+    def _render_tracked_crop(self, input_path: str, output_path: str, crop_width: int,
+                             height: int, keyframes: List[Tuple[float, int]]) -> str:
+        """キーフレームごとのクロップ位置を sendcmd で切り替えて1回でエンコード"""
+        commands = []
+        last_x = None
+        for t, x in keyframes:
+            if x != last_x:
+                commands.append(f"{t:.3f} crop x {x};")
+                last_x = x
+
+        fd, cmd_path = tempfile.mkstemp(suffix=".cmd", prefix="facecrop_")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(commands) + "\n")
+
+            # sendcmdのパスはフィルター記法のエスケープが必要
+            escaped = cmd_path.replace("\\", "/").replace(":", "\\:")
+            cmd = [
+                FFMPEG_PATH, "-y",
+                *(hwaccel_input_args() if self.use_hw else []), "-i", str(input_path),
+                "-vf", f"sendcmd=f='{escaped}',crop={crop_width}:{height}:{keyframes[0][1]}:0",
+                *(video_encode_args(cpu_args=[]) if self.use_hw else []),  # CPU時はFFmpeg既定のエンコード設定
+                "-c:a", "copy",
+                str(output_path)
+            ]
+            run_ffmpeg(cmd)
+        finally:
+            os.unlink(cmd_path)
+
+        return str(output_path)
 
     def _crop_with_action_tracking(self, input_path: str, output_path: str) -> str:
         """アクション追跡クロッピング"""
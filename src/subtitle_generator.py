@@ -5,13 +5,56 @@ Automatic Subtitle Generation Module (Whisper)
 
 import logging
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import whisper
+from typing import List
 import json
 
+import numpy as np
+
+try:
+    # CTranslate2 ランタイム + int8 量子化（openai-whisper より高速・省VRAM）
+    import ctranslate2
+    from faster_whisper import WhisperModel
+    FASTER_WHISPER_AVAILABLE = True
+except ImportError:
+    FASTER_WHISPER_AVAILABLE = False
+    import whisper  # faster-whisper がなければ openai-whisper（どちらもなければ ImportError）
+
+BATCHED_PIPELINE_AVAILABLE = False
+if FASTER_WHISPER_AVAILABLE:
+    try:
+        # VAD区間を長さの近いもの同士でまとめてバッチ推論（faster-whisper 1.1 以降）
+        from faster_whisper import BatchedInferencePipeline
+        BATCHED_PIPELINE_AVAILABLE = True
+    except ImportError:
+        pass
+
+SILERO_VAD_AVAILABLE = False
+if not FASTER_WHISPER_AVAILABLE:
+    try:
+        # openai-whisper 用の発話区間検出（faster-whisper は同じ Silero VAD を vad_filter で内蔵）
+        import torch
+        from silero_vad import get_speech_timestamps, load_silero_vad
+        SILERO_VAD_AVAILABLE = True
+    except ImportError:
+        pass
+
+from src.ffmpeg_runner import run_ffmpeg
+from src.gpu_encoder import hwaccel_input_args, video_encode_args
+
 logger = logging.getLogger(__name__)
 FFMPEG_PATH = "ffmpeg"
 
+# 字幕焼き込みのエンコード設定（HWエンコーダーがない、または gpu_encoder.enable が false の場合）
+CPU_VIDEO_ARGS = ["-c:v", "libx264"]
+
+# Whisper の入力形式（16kHz モノラル float32）
+WHISPER_SAMPLE_RATE = 16000
+
+# 一括字幕生成での音声抽出の並列数（FFmpegのI/O待ちが主なのでスレッドで十分）
+AUDIO_EXTRACT_WORKERS = 4
+
 
 class SubtitleGenerator:
     """自動字幕生成クラス"""
@@ -19,14 +62,26 @@ class SubtitleGenerator:
     def __init__(self, config: dict):
         self.config = config
         self.subtitle_config = config.get("subtitle_generator", {})
+        self.use_hw = config.get("gpu_encoder", {}).get("enable", True)
         self.model = None
+        self._batched = None
+        self._vad_model = None
 
     def load_model(self):
         """Whisperモデルをロード"""
         if self.model is None:
             model_name = self.subtitle_config.get("model", "base")
-            logger.info(f"Loading Whisper model: {model_name}")
-            self.model = whisper.load_model(model_name)
+            if not FASTER_WHISPER_AVAILABLE:
+                logger.info(f"Loading Whisper model: {model_name}")
+                self.model = whisper.load_model(model_name)
+                return
+
+            device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+            compute_type = self.subtitle_config.get("compute_type", "auto")
+            if compute_type == "auto":
+                compute_type = "int8_float16" if device == "cuda" else "int8"
+            logger.info(f"Loading faster-whisper model: {model_name} ({device}, {compute_type})")
+            self.model = WhisperModel(model_name, device=device, compute_type=compute_type)
 
     def generate_subtitles(self, video_path: str, output_srt: str,
                           language: str = "ja") -> str:
@@ -45,64 +100,189 @@ class SubtitleGenerator:
 
         self.load_model()
 
-        # 音声抽出
-        audio_path = Path("temp_audio.wav")
+        # 音声抽出（一時WAVを書かずにパイプから直接メモリへ）
+        audio = self._load_audio(video_path)
+
+        # Whisperで文字起こし → SRT形式で保存
+        self._write_srt(self._transcribe(audio, language), output_srt)
+
+        logger.info(f"Subtitles generated: {output_srt}")
+        return str(output_srt)
+
+    def generate_subtitles_batch(self, video_paths: List[str], output_srts: List[str],
+                                 language: str = "ja") -> List[str]:
+        """
+        複数の動画の字幕をまとめて生成
+
+        音声抽出はスレッドで並列に行い、faster-whisper の BatchedInferencePipeline があれば
+        VAD区間をバッチにまとめてGPUで推論する（なければ1本ずつ generate_subtitles と同じ処理）
+
+        Args:
+            video_paths: 動画パスのリスト
+            output_srts: 出力SRTファイルパスのリスト（video_paths と同じ順）
+            language: 言語コード
+
+        Returns:
+            SRTファイルパスのリスト
+        """
+        if len(video_paths) != len(output_srts):
+            raise ValueError("video_paths and output_srts must have the same length")
+        if not video_paths:
+            return []
+
+        logger.info(f"Generating subtitles for {len(video_paths)} videos")
+
+        self.load_model()
+
+        workers = min(AUDIO_EXTRACT_WORKERS, len(video_paths))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            audios = list(executor.map(self._load_audio, video_paths))
+
+        for audio, output_srt in zip(audios, output_srts):
+            self._write_srt(self._transcribe(audio, language, batched=True), output_srt)
+            logger.info(f"Subtitles generated: {output_srt}")
+
+        return [str(p) for p in output_srts]
+
+    def _load_audio(self, video_path) -> np.ndarray:
+        """
+        Whisper入力用の 16kHz モノラル音声を float32 配列で取得
+
+        s16le をパイプで受け取り、一時WAVの書き込み・再読み込み・削除を省く
+        """
         extract_cmd = [
-            FFMPEG_PATH, "-y", "-i", str(video_path),
-            "-vn", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1",
-            str(audio_path)
+            FFMPEG_PATH, "-nostdin", "-loglevel", "error", "-i", str(video_path),
+            "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ar", str(WHISPER_SAMPLE_RATE), "-ac", "1",
+            "-"
         ]
-        subprocess.run(extract_cmd, check=True, capture_output=True)
+        # -loglevel error なので stderr はエラー時の数行のみ
+        result = subprocess.run(extract_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+        audio = np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32)
+        audio *= 1.0 / 32768.0
+        return audio
 
-        try:
-            # Whisperで文字起こし
-            result = self.model.transcribe(
-                str(audio_path),
+    def _transcribe(self, audio: np.ndarray, language: str, batched: bool = False):
+        """文字起こしして {"start", "end", "text"} のセグメントを返す（faster-whisper では逐次デコード）"""
+        if not FASTER_WHISPER_AVAILABLE:
+            speech = self._speech_only(audio)
+            if speech is None:
+                return self.model.transcribe(
+                    audio,
+                    language=language,
+                    task="transcribe",
+                    verbose=False
+                )["segments"]
+
+            # 発話区間だけを文字起こしし、時刻を元の音声の時間軸に戻す
+            speech_audio, starts, packed = speech
+            if speech_audio.size == 0:
+                return []
+            segments = self.model.transcribe(
+                speech_audio,
                 language=language,
                 task="transcribe",
                 verbose=False
+            )["segments"]
+            return [
+                {
+                    "start": self._restore_time(seg["start"], starts, packed),
+                    "end": self._restore_time(seg["end"], starts, packed, is_end=True),
+                    "text": seg["text"],
+                }
+                for seg in segments
+            ]
+
+        if batched and BATCHED_PIPELINE_AVAILABLE:
+            if self._batched is None:
+                self._batched = BatchedInferencePipeline(model=self.model)
+            segments, _info = self._batched.transcribe(
+                audio,
+                language=language,
+                task="transcribe",
+                batch_size=self.subtitle_config.get("batch_size", 16)
             )
+        else:
+            segments, _info = self.model.transcribe(
+                audio,
+                language=language,
+                task="transcribe",
+                beam_size=1,
+                vad_filter=self.subtitle_config.get("vad_filter", True)
+            )
+        return ({"start": seg.start, "end": seg.end, "text": seg.text} for seg in segments)
 
-            # SRT形式で保存
-            self._write_srt(result["segments"], output_srt)
+    def _speech_only(self, audio: np.ndarray):
+        """
+        Silero VAD で発話区間だけを連結した音声を作る（openai-whisper 用）
 
-            logger.info(f"Subtitles generated: {output_srt}")
-            return str(output_srt)
+        無音の長いゲームプレイ区間で Whisper のエンコーダーを回さないようにする
+
+        Returns:
+            (連結した音声, 各区間の元の開始サンプル, 各区間の連結後の開始サンプル)。
+            VAD が使えない・無効な場合は None
+        """
+        if not (SILERO_VAD_AVAILABLE and self.subtitle_config.get("vad_filter", True)):
+            return None
+        if self._vad_model is None:
+            self._vad_model = load_silero_vad()
 
-        finally:
-            if audio_path.exists():
-                audio_path.unlink()
+        chunks = get_speech_timestamps(
+            torch.from_numpy(audio), self._vad_model, sampling_rate=WHISPER_SAMPLE_RATE
+        )
+        starts = np.array([c["start"] for c in chunks], dtype=np.int64)
+        ends = np.array([c["end"] for c in chunks], dtype=np.int64)
+        lengths = ends - starts
+        packed = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+
+        speech_audio = np.concatenate([audio[s:e] for s, e in zip(starts, ends)]) if chunks else audio[:0]
+        logger.info(f"VAD kept {speech_audio.size / max(audio.size, 1):.0%} of the audio ({len(chunks)} speech chunks)")
+        return speech_audio, starts, packed
+
+    @staticmethod
+    def _restore_time(seconds: float, starts: np.ndarray, packed: np.ndarray, is_end: bool = False) -> float:
+        """連結後の音声の時刻を元の音声の時刻に変換（区間の境界の終了時刻は前の区間の終わりとみなす）"""
+        pos = seconds * WHISPER_SAMPLE_RATE
+        idx = max(int(np.searchsorted(packed, pos, side="left" if is_end else "right")) - 1, 0)
+        return float(starts[idx] + pos - packed[idx]) / WHISPER_SAMPLE_RATE
 
     def _write_srt(self, segments, output_path: str):
-        """SRT形式でファイルに書き込み"""
-        with open(output_path, "w", encoding="utf-8") as f:
-            for i, segment in enumerate(segments, 1):
-                start = self._format_timestamp(segment["start"])
-                end = self._format_timestamp(segment["end"])
-                text = segment["text"].strip()
-
-                f.write(f"{i}\n")
-                f.write(f"{start} --> {end}\n")
-                f.write(f"{text}\n\n")
-
-    def _format_timestamp(self, seconds: float) -> str:
+        """SRT形式でファイルに書き込み（全体を組み立ててから1回で書き込む）"""
+        fmt = self._format_timestamp
+        Path(output_path).write_text(
+            "".join(
+                f"{i}\n{fmt(segment['start'])} --> {fmt(segment['end'])}\n{segment['text'].strip()}\n\n"
+                for i, segment in enumerate(segments, 1)
+            ),
+            encoding="utf-8"
+        )
+
+    @staticmethod
+    def _format_timestamp(seconds: float) -> str:
         """秒をSRT形式のタイムスタンプに変換"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
+        minutes, secs = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
         millis = int((seconds % 1) * 1000)
         return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
 
     def burn_subtitles(self, video_path: str, srt_path: str, output_path: str) -> str:
-        """字幕を動画に焼き込み"""
+        """
+        字幕を動画に焼き込み
+
+        HWエンコーダーがあればデコード・エンコードはGPUで行う（subtitles はCPUフィルターのため
+        フレームはシステムメモリで受け取る）
+        """
         logger.info("Burning subtitles into video")
 
         cmd = [
-            FFMPEG_PATH, "-y", "-i", str(video_path),
+            FFMPEG_PATH, "-y",
+            *(hwaccel_input_args() if self.use_hw else []), "-i", str(video_path),
             "-vf", f"subtitles={srt_path}:force_style='FontSize=24,PrimaryColour=&HFFFFFF&,OutlineColour=&H000000&,BorderStyle=3'",
+            *(video_encode_args(cpu_args=CPU_VIDEO_ARGS) if self.use_hw else CPU_VIDEO_ARGS),
             "-c:a", "copy",
             str(output_path)
         ]
 
-        subprocess.run(cmd, check=True, capture_output=True)
+        run_ffmpeg(cmd)
         return str(output_path)
@@ -4,17 +4,50 @@ AI超解像モジュール - 動画の高解像度化
 """
 
 import logging
+import os
+import shutil
 import subprocess
+import tempfile
 from pathlib import Path
 from typing import Optional
 import cv2
 import numpy as np
 
+# PyTorch版 Real-ESRGAN（オプション: バッチ推論）
+try:
+    import torch
+    import torch.nn.functional as F
+    from basicsr.archs.rrdbnet_arch import RRDBNet
+    TORCH_SR_AVAILABLE = True
+except ImportError:
+    TORCH_SR_AVAILABLE = False
+
+# TensorRT変換（オプション）
+try:
+    from torch2trt import torch2trt, TRTModule
+    TORCH2TRT_AVAILABLE = True
+except ImportError:
+    TORCH2TRT_AVAILABLE = False
+
+from src.ffmpeg_runner import run_ffmpeg
+from src.gpu_encoder import CPU_H264_ARGS, hwaccel_input_args, video_encode_args
+from src.media_probe import probe_video
+
 logger = logging.getLogger(__name__)
 
 # FFmpeg path
 FFMPEG_PATH = "ffmpeg"
 
+# 超解像の中間フレームを置くRAMディスク（空き容量のこの割合まで使用）
+SHM_DIR = "/dev/shm"
+SHM_MAX_FRACTION = 0.8
+
+# PyTorch版 Real-ESRGAN の重み (RealESRGAN_x4plus.pth)
+DEFAULT_MODEL_PATH = "models/RealESRGAN_x4plus.pth"
+
+# TensorRTエンジンのキャッシュ先（倍率・入力形状ごと）
+TRT_CACHE_DIR = "models/trt"
+
 
 class SuperResolution:
     """AI超解像クラス"""
@@ -23,6 +56,8 @@ class SuperResolution:
         self.config = config
         self.sr_config = config.get("super_resolution", {})
         self.enabled = self.sr_config.get("enable", True)
+        self.use_hw = config.get("gpu_encoder", {}).get("enable", True)
+        self._torch_model = None
 
     def upscale_video(self, input_path: str, output_path: str,
                      scale: int = 2, model: str = "realesrgan-x4plus") -> str:
@@ -48,7 +83,9 @@ class SuperResolution:
         try:
             # Real-ESRGANがインストールされていればそれを使用
             # なければFFmpegのスケーリングフィルターを使用
-            if self._check_realesrgan_available():
+            if self._check_torch_realesrgan_available():
+                return self._upscale_with_realesrgan_torch(input_path, output_path, scale)
+            elif self._check_realesrgan_available():
                 return self._upscale_with_realesrgan(input_path, output_path, scale, model)
             else:
                 logger.warning("Real-ESRGAN not available, using FFmpeg lanczos upscaling")
@@ -58,6 +95,163 @@ class SuperResolution:
             logger.error(f"Super resolution failed: {e}")
             return input_path
 
+    def _check_torch_realesrgan_available(self) -> bool:
+        """PyTorch版Real-ESRGAN（CUDA + 重みファイル）の利用可能性チェック"""
+        return (
+            TORCH_SR_AVAILABLE
+            and torch.cuda.is_available()
+            and Path(self.sr_config.get("model_path", DEFAULT_MODEL_PATH)).exists()
+        )
+
+    def _load_torch_model(self):
+        """RRDBNet を構築して重みを読み込む（初回のみ）"""
+        if self._torch_model is None:
+            model_path = self.sr_config.get("model_path", DEFAULT_MODEL_PATH)
+            model_scale = self.sr_config.get("model_scale", 4)
+
+            model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64,
+                            num_block=23, num_grow_ch=32, scale=model_scale)
+            state = torch.load(model_path, map_location="cpu")
+            model.load_state_dict(state.get("params_ema", state.get("params", state)), strict=True)
+
+            torch.backends.cudnn.benchmark = True
+            model = model.eval().to("cuda")
+            if self.sr_config.get("half", True):
+                # FP16: Tensor Coreを使用し、メモリ使用量も半減
+                model = model.half()
+            self._torch_model = model
+            logger.info(f"Loaded Real-ESRGAN weights: {model_path} (x{model_scale})")
+        return self._torch_model
+
+    def _inference_module(self, batch_size: int, height: int, width: int):
+        """
+        推論に使うモジュール（TensorRT有効時はFP16エンジン、なければPyTorchモデル）
+
+        TensorRTエンジンは入力形状ごとにディスクへキャッシュし、2回目以降は変換を省略
+        """
+        model = self._load_torch_model()
+        if not (self.sr_config.get("tensorrt", False) and TORCH2TRT_AVAILABLE):
+            return model, False
+
+        model_scale = self.sr_config.get("model_scale", 4)
+        engine_path = Path(TRT_CACHE_DIR) / f"realesrgan_x{model_scale}_{batch_size}x{height}x{width}_fp16.pth"
+
+        trt_model = TRTModule()
+        if engine_path.exists():
+            trt_model.load_state_dict(torch.load(engine_path))
+            logger.info(f"Loaded TensorRT engine: {engine_path}")
+        else:
+            logger.info("Building TensorRT FP16 engine (first run for this resolution)...")
+            dummy = torch.zeros((batch_size, 3, height, width), device="cuda", dtype=torch.half)
+            trt_model = torch2trt(model.half(), [dummy], fp16_mode=True, max_batch_size=batch_size)
+            engine_path.parent.mkdir(parents=True, exist_ok=True)
+            torch.save(trt_model.state_dict(), engine_path)
+            logger.info(f"TensorRT engine cached: {engine_path}")
+        return trt_model, True
+
+    def _upscale_with_realesrgan_torch(self, input_path: str, output_path: str,
+                                       scale: int) -> str:
+        """
+        PyTorch版Real-ESRGANでバッチ推論
+
+        FFmpegのrawvideoパイプで入出力し、中間画像ファイルを作らない。
+        次バッチのホスト→GPU転送は別ストリームで行い、推論と重ねる
+        """
+        logger.info("Using batched PyTorch Real-ESRGAN for super resolution")
+
+        model_scale = self.sr_config.get("model_scale", 4)
+        batch_size = self.sr_config.get("batch_size", 4)
+
+        info = probe_video(input_path)
+        width, height = info.width, info.height
+        fps = info.fps or 30.0
+
+        model, fixed_batch = self._inference_module(batch_size, height, width)
+        dtype = torch.half if (fixed_batch or self.sr_config.get("half", True)) else torch.float32
+        out_w, out_h = width * scale, height * scale
+        frame_bytes = width * height * 3
+
+        decoder = subprocess.Popen(
+            [FFMPEG_PATH, *(hwaccel_input_args() if self.use_hw else []), "-i", str(input_path),
+             "-f", "rawvideo", "-pix_fmt", "bgr24", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        encoder = subprocess.Popen(
+            [FFMPEG_PATH, "-y",
+             "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{out_w}x{out_h}", "-r", str(fps),
+             "-i", "-",
+             "-i", str(input_path),  # オーディオ用
+             "-map", "0:v", "-map", "1:a?",
+             *(video_encode_args() if self.use_hw else CPU_H264_ARGS),
+             "-c:a", "copy",
+             str(output_path)],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+        # ダブルバッファのピン留めホストメモリ（パイプから直接読み込む）
+        host = [torch.empty((batch_size, height, width, 3), dtype=torch.uint8).pin_memory()
+                for _ in range(2)]
+        copy_stream = torch.cuda.Stream()
+
+        def read_batch(buf) -> int:
+            view = buf.numpy()
+            for i in range(batch_size):
+                dest = memoryview(view[i]).cast("B")
+                got = 0
+                while got < frame_bytes:
+                    n = decoder.stdout.readinto(dest[got:])
+                    if not n:
+                        return i
+                    got += n
+            return batch_size
+
+        def upload(buf, n):
+            with torch.cuda.stream(copy_stream):
+                return buf[:n].to("cuda", non_blocking=True)
+
+        try:
+            slot = 0
+            n = read_batch(host[slot])
+            pending = upload(host[slot], n) if n else None
+
+            with torch.inference_mode():
+                while pending is not None:
+                    torch.cuda.current_stream().wait_stream(copy_stream)
+                    frames = pending
+
+                    # NHWC(BGR, uint8) → NCHW(RGB, 0-1)
+                    count = frames.shape[0]
+                    x = frames.permute(0, 3, 1, 2).flip(1).to(dtype).div_(255)
+                    if fixed_batch and count < batch_size:
+                        # TensorRTエンジンは固定バッチのため末尾をゼロ埋め
+                        x = F.pad(x, (0, 0, 0, 0, 0, 0, 0, batch_size - count))
+                    y = model(x)[:count]
+                    if scale != model_scale:
+                        y = F.interpolate(y.float(), size=(out_h, out_w), mode="bicubic",
+                                          align_corners=False, antialias=True)
+
+                    # 推論中に次バッチを読み込んで転送
+                    slot ^= 1
+                    n = read_batch(host[slot])
+                    pending = upload(host[slot], n) if n else None
+
+                    out = y.clamp_(0, 1).mul_(255).round_().to(torch.uint8)
+                    out = out.flip(1).permute(0, 2, 3, 1).contiguous().cpu().numpy()
+                    encoder.stdin.write(out.tobytes())
+
+            encoder.stdin.close()
+            if encoder.wait() != 0 or decoder.wait() != 0:
+                raise subprocess.CalledProcessError(encoder.returncode or decoder.returncode,
+                                                    FFMPEG_PATH)
+        finally:
+            for proc in (decoder, encoder):
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+
+        logger.info(f"PyTorch Real-ESRGAN upscaling completed: {out_w}x{out_h}")
+        return str(output_path)
+
     def _check_realesrgan_available(self) -> bool:
         """Real-ESRGANの利用可能性チェック"""
         try:
@@ -70,36 +264,61 @@ class SuperResolution:
         except (FileNotFoundError, subprocess.TimeoutExpired):
             return False
 
+    def _scratch_root(self, input_path: str, scale: int) -> Optional[str]:
+        """
+        一時フレームの置き場所を決定
+
+        RAMディスク (/dev/shm) に収まる見込みならそこを使い、ディスクI/Oを避ける。
+        収まらない場合は None（既定の一時ディレクトリ）を返す
+        """
+        if not os.path.isdir(SHM_DIR) or not os.access(SHM_DIR, os.W_OK):
+            return None
+
+        info = probe_video(input_path)
+        width, height = info.width, info.height
+        frames = int(info.duration * info.fps)
+
+        # 入力BMP (非圧縮) + 出力PNG (最悪ケースとして非圧縮で見積もり)
+        needed = width * height * 3 * frames * (1 + scale * scale)
+        free = shutil.disk_usage(SHM_DIR).free
+        if needed <= 0 or needed > free * SHM_MAX_FRACTION:
+            logger.info("Upscaling frames do not fit in RAM disk, using on-disk temp directory")
+            return None
+        return SHM_DIR
+
     def _upscale_with_realesrgan(self, input_path: str, output_path: str,
                                 scale: int, model: str) -> str:
         """Real-ESRGANを使用した超解像"""
         logger.info("Using Real-ESRGAN for super resolution")
 
-        # 一時ディレクトリ作成
-        temp_frames_dir = Path("temp_sr_frames")
-        temp_upscaled_dir = Path("temp_sr_upscaled")
-        temp_frames_dir.mkdir(exist_ok=True)
-        temp_upscaled_dir.mkdir(exist_ok=True)
+        # 一時ディレクトリ作成（可能ならRAMディスク上）
+        temp_root = Path(tempfile.mkdtemp(prefix="sr_", dir=self._scratch_root(input_path, scale)))
+        temp_frames_dir = temp_root / "frames"
+        temp_upscaled_dir = temp_root / "upscaled"
+        temp_frames_dir.mkdir()
+        temp_upscaled_dir.mkdir()
 
         try:
-            # 1. 動画をフレーム分解
+            # 1. 動画をフレーム分解（BMP: 無圧縮のためPNGより大幅に高速）
             logger.info("Extracting frames for upscaling...")
             extract_cmd = [
                 FFMPEG_PATH, "-i", str(input_path),
-                "-qscale:v", "1",
-                str(temp_frames_dir / "frame_%06d.png")
+                str(temp_frames_dir / "frame_%06d.bmp")
             ]
-            subprocess.run(extract_cmd, check=True, capture_output=True)
+            run_ffmpeg(extract_cmd)
 
             # 2. Real-ESRGANで各フレームをアップスケール
+            # ncnn版の出力形式は jpg/png/webp のみ。PNG圧縮が律速になるため保存スレッドを増やす
             logger.info("Upscaling frames with Real-ESRGAN...")
+            save_threads = max(2, min(8, (os.cpu_count() or 2) // 2))
             realesrgan_cmd = [
                 "realesrgan-ncnn-vulkan",
                 "-i", str(temp_frames_dir),
                 "-o", str(temp_upscaled_dir),
                 "-n", model,
                 "-s", str(scale),
-                "-f", "png"
+                "-f", "png",
+                "-j", f"1:2:{save_threads}"  # load:proc:save
             ]
             subprocess.run(realesrgan_cmd, check=True)
 
@@ -111,53 +330,41 @@ class SuperResolution:
                 "-i", str(temp_upscaled_dir / "frame_%06d.png"),
                 "-i", str(input_path),  # オーディオ用
                 "-map", "0:v", "-map", "1:a",
-                "-c:v", "libx264", "-preset", "slow", "-crf", "18",
+                *(video_encode_args() if self.use_hw else CPU_H264_ARGS),
                 "-c:a", "copy",
                 str(output_path)
             ]
-            subprocess.run(reassemble_cmd, check=True, capture_output=True)
+            run_ffmpeg(reassemble_cmd)
 
             logger.info("Real-ESRGAN upscaling completed successfully")
             return str(output_path)
 
         finally:
             # 一時ファイル削除
-            import shutil
-            if temp_frames_dir.exists():
-                shutil.rmtree(temp_frames_dir)
-            if temp_upscaled_dir.exists():
-                shutil.rmtree(temp_upscaled_dir)
+            shutil.rmtree(temp_root, ignore_errors=True)
 
     def _upscale_with_ffmpeg(self, input_path: str, output_path: str, scale: int) -> str:
         """FFmpegのLanczosフィルターを使用した高品質アップスケール"""
         logger.info(f"Using FFmpeg Lanczos {scale}x upscaling")
 
         # 元の解像度を取得
-        probe_cmd = [
-            "ffprobe", "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height",
-            "-of", "csv=p=0",
-            str(input_path)
-        ]
-        result = subprocess.run(probe_cmd, capture_output=True, text=True, check=True)
-        width, height = map(int, result.stdout.strip().split(','))
+        info = probe_video(input_path)
+        width, height = info.width, info.height
 
         new_width = width * scale
         new_height = height * scale
 
         # Lanczosフィルターでアップスケール
         cmd = [
-            FFMPEG_PATH, "-y", "-i", str(input_path),
+            FFMPEG_PATH, "-y",
+            *(hwaccel_input_args() if self.use_hw else []), "-i", str(input_path),
             "-vf", f"scale={new_width}:{new_height}:flags=lanczos",
-            "-c:v", "libx264",
-            "-preset", "slow",
-            "-crf", "18",
+            *(video_encode_args() if self.use_hw else CPU_H264_ARGS),
             "-c:a", "copy",
             str(output_path)
         ]
 
-        subprocess.run(cmd, check=True, capture_output=True)
+        run_ffmpeg(cmd)
         logger.info(f"FFmpeg upscaling completed: {new_width}x{new_height}")
         return str(output_path)
 
@@ -212,15 +419,14 @@ class SuperResolution:
         filter_complex = "hqdn3d=1.5:1.5:6:6,unsharp=5:5:1.0:5:5:0.0"
 
         cmd = [
-            FFMPEG_PATH, "-y", "-i", str(input_path),
+            FFMPEG_PATH, "-y",
+            *(hwaccel_input_args() if self.use_hw else []), "-i", str(input_path),
             "-vf", filter_complex,
-            "-c:v", "libx264",
-            "-preset", "slow",
-            "-crf", "18",
+            *(video_encode_args() if self.use_hw else CPU_H264_ARGS),
             "-c:a", "copy",
             str(output_path)
         ]
 
-        subprocess.run(cmd, check=True, capture_output=True)
+        run_ffmpeg(cmd)
         logger.info("Denoise and sharpening completed")
         return str(output_path)
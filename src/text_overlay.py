@@ -3,13 +3,15 @@ Text Overlay Module
 動画へのテキストオーバーレイ
 """
 
-import subprocess
 import logging
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 import os
 import shutil
 
+from src.ffmpeg_runner import run_ffmpeg
+from src.gpu_encoder import hwaccel_input_args, video_encode_args
+
 logger = logging.getLogger(__name__)
 
 # FFmpegパスを取得
@@ -32,6 +34,92 @@ def get_ffmpeg_path():
 
 FFMPEG_PATH = get_ffmpeg_path()
 
+# エンコード設定（オーバーレイは何個重ねてもエンコードは1回）
+# HWエンコーダーがない、または gpu_encoder.enable が false の場合に使う
+CPU_VIDEO_ARGS = ["-c:v", "libx264"]
+
+
+# ---- -vf フラグメント生成（オーバーレイ名 → drawtext/drawbox/subtitles 句） ----
+
+def _kill_counter_filter(kill_timestamps: List[float]) -> str:
+    # 各キルから3秒間カウンターを表示
+    return ",".join(
+        f"drawtext=text='{i} KILLS':"
+        f"fontfile=/Windows/Fonts/impact.ttf:fontsize=48:"
+        f"fontcolor=white:borderw=3:bordercolor=black:"
+        f"x=(w-text_w)/2:y=50:"
+        f"enable='between(t,{timestamp},{timestamp + 3.0})'"
+        for i, timestamp in enumerate(kill_timestamps, 1)
+    )
+
+
+def _text_popup_filter(text: str, timestamp: float, duration: float = 2.0,
+                       position: str = "center") -> str:
+    # 位置設定
+    y_positions = {
+        "top": "100",
+        "center": "(h-text_h)/2",
+        "bottom": "h-text_h-100"
+    }
+    y_pos = y_positions.get(position, y_positions["center"])
+
+    # アニメーション効果（フェードイン・アウト + スケール）
+    end = timestamp + duration
+    fade_duration = 0.3
+
+    return (
+        f"drawtext=text='{text}':"
+        f"fontfile=/Windows/Fonts/impact.ttf:fontsize=72:"
+        f"fontcolor=yellow:borderw=5:bordercolor=black:"
+        f"x=(w-text_w)/2:y={y_pos}:"
+        f"alpha='if(lt(t,{timestamp+fade_duration}),(t-{timestamp})/{fade_duration},"
+        f"if(gt(t,{end-fade_duration}),({end}-t)/{fade_duration},1))':"
+        f"enable='between(t,{timestamp},{end})'"
+    )
+
+
+def _timestamp_filter() -> str:
+    return (
+        "drawtext=text='%{pts\\:hms}':"
+        "fontfile=/Windows/Fonts/consola.ttf:fontsize=24:"
+        "fontcolor=white:borderw=2:bordercolor=black:"
+        "x=w-text_w-20:y=20"
+    )
+
+
+def _custom_text_filter(text: str, x: int = 50, y: int = 50,
+                        font_size: int = 36, color: str = "white") -> str:
+    return (
+        f"drawtext=text='{text}':"
+        f"fontfile=/Windows/Fonts/arial.ttf:fontsize={font_size}:"
+        f"fontcolor={color}:borderw=2:bordercolor=black:"
+        f"x={x}:y={y}"
+    )
+
+
+def _subtitle_filter(subtitle_file: str) -> str:
+    # Windowsパスのエスケープ
+    subtitle_path = subtitle_file.replace("\\", "/").replace(":", "\\:")
+    return f"subtitles={subtitle_path}"
+
+
+def _progress_bar_filter(total_duration: float) -> str:
+    return (
+        "drawbox=x=50:y=h-80:w=w-100:h=10:color=gray@0.5:t=fill,"
+        f"drawbox=x=50:y=h-80:w='(w-100)*t/{total_duration}':h=10:color=red:t=fill"
+    )
+
+
+# オーバーレイ名 → フラグメント生成関数（apply_overlays で使用）
+OVERLAY_FILTERS: Dict[str, Callable[..., str]] = {
+    "kill_counter": _kill_counter_filter,
+    "text_popup": _text_popup_filter,
+    "timestamp": _timestamp_filter,
+    "custom_text": _custom_text_filter,
+    "subtitle": _subtitle_filter,
+    "progress_bar": _progress_bar_filter,
+}
+
 
 class TextOverlay:
     """テキストオーバーレイクラス"""
@@ -39,57 +127,71 @@ class TextOverlay:
     def __init__(self, config: dict):
         self.config = config
         self.text_config = config.get("text_overlay", {})
+        self.use_hw = config.get("gpu_encoder", {}).get("enable", True)
 
-    def add_kill_counter(self, input_path: str, output_path: str,
-                        kill_timestamps: List[float]) -> str:
+    def apply_overlays(self, input_path: str, output_path: str,
+                       overlays: List[Tuple[str, dict]],
+                       on_progress: Optional[Callable[[float], None]] = None) -> str:
         """
-        キル数カウンターを追加
+        複数のオーバーレイを1つの -vf チェーンにまとめ、1回のデコード・エンコードで焼き込む
+
+        HWエンコーダーがあればデコード・エンコードはGPUで行う。drawtext / subtitles はCPUフィルターのため、
+        -hwaccel_output_format は指定せずデコード済みフレームをシステムメモリで受け取る
 
         Args:
             input_path: 入力動画
             output_path: 出力パス
-            kill_timestamps: キルが発生したタイムスタンプのリスト
+            overlays: (オーバーレイ名, パラメータ) のリスト。OVERLAY_FILTERS のキーを指定し、順番に重ねる
+            on_progress: 進捗コールバック（処理済みの秒数）
         """
-        logger.info(f"Adding kill counter: {len(kill_timestamps)} kills")
-
-        # キルカウントのタイムライン作成
-        drawtext_filters = []
+        if not overlays:
+            raise ValueError("No overlays specified")
 
-        for i, timestamp in enumerate(kill_timestamps, 1):
-            # 各キルから3秒間カウンターを表示
-            start = timestamp
-            end = timestamp + 3.0
+        names = [name for name, _ in overlays]
+        logger.info(f"Applying text overlays: {' -> '.join(names)}")
 
-            filter_str = (
-                f"drawtext=text='{i} KILLS':"
-                f"fontfile=/Windows/Fonts/impact.ttf:fontsize=48:"
-                f"fontcolor=white:borderw=3:bordercolor=black:"
-                f"x=(w-text_w)/2:y=50:"
-                f"enable='between(t,{start},{end})'"
-            )
-            drawtext_filters.append(filter_str)
-
-        # すべてのdrawtextフィルターを結合
-        full_filter = ",".join(drawtext_filters) if drawtext_filters else "null"
+        fragments = []
+        for name, params in overlays:
+            builder = OVERLAY_FILTERS.get(name)
+            if builder is None:
+                raise ValueError(f"Unknown overlay: {name}")
+            fragment = builder(**(params or {}))
+            if fragment:
+                fragments.append(fragment)
 
         cmd = [
             FFMPEG_PATH,
             "-y",
-            "-i", input_path,
-            "-vf", full_filter,
-            "-c:v", "libx264",
+            *(hwaccel_input_args() if self.use_hw else []), "-i", input_path,
+            "-vf", ",".join(fragments) if fragments else "null",
+            *(video_encode_args(cpu_args=CPU_VIDEO_ARGS) if self.use_hw else CPU_VIDEO_ARGS),
             "-c:a", "copy",
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False, on_progress=on_progress)
 
         if result.returncode != 0:
-            logger.error(f"Kill counter overlay failed: {result.stderr}")
-            raise RuntimeError("Kill counter overlay failed")
+            logger.error(f"Text overlay failed ({', '.join(names)}): {result.stderr}")
+            raise RuntimeError(f"Text overlay failed: {', '.join(names)}")
 
         return str(output_path)
 
+    def add_kill_counter(self, input_path: str, output_path: str,
+                        kill_timestamps: List[float]) -> str:
+        """
+        キル数カウンターを追加
+
+        Args:
+            input_path: 入力動画
+            output_path: 出力パス
+            kill_timestamps: キルが発生したタイムスタンプのリスト
+        """
+        logger.info(f"Adding kill counter: {len(kill_timestamps)} kills")
+        return self.apply_overlays(input_path, output_path, [
+            ("kill_counter", {"kill_timestamps": kill_timestamps}),
+        ])
+
     def add_text_popup(self, input_path: str, output_path: str,
                       text: str, timestamp: float, duration: float = 2.0,
                       position: str = "center") -> str:
@@ -105,46 +207,10 @@ class TextOverlay:
             position: top, center, bottom
         """
         logger.info(f"Adding text popup: '{text}' at {timestamp}s")
-
-        # 位置設定
-        y_positions = {
-            "top": "100",
-            "center": "(h-text_h)/2",
-            "bottom": "h-text_h-100"
-        }
-        y_pos = y_positions.get(position, y_positions["center"])
-
-        # アニメーション効果（フェードイン・アウト + スケール）
-        end = timestamp + duration
-        fade_duration = 0.3
-
-        filter_str = (
-            f"drawtext=text='{text}':"
-            f"fontfile=/Windows/Fonts/impact.ttf:fontsize=72:"
-            f"fontcolor=yellow:borderw=5:bordercolor=black:"
-            f"x=(w-text_w)/2:y={y_pos}:"
-            f"alpha='if(lt(t,{timestamp+fade_duration}),(t-{timestamp})/{fade_duration},"
-            f"if(gt(t,{end-fade_duration}),({end}-t)/{fade_duration},1))':"
-            f"enable='between(t,{timestamp},{end})'"
-        )
-
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-vf", filter_str,
-            "-c:v", "libx264",
-            "-c:a", "copy",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Text popup failed: {result.stderr}")
-            raise RuntimeError("Text popup failed")
-
-        return str(output_path)
+        return self.apply_overlays(input_path, output_path, [
+            ("text_popup", {"text": text, "timestamp": timestamp,
+                            "duration": duration, "position": position}),
+        ])
 
     def add_timestamp_overlay(self, input_path: str, output_path: str) -> str:
         """
@@ -155,31 +221,7 @@ class TextOverlay:
             output_path: 出力パス
         """
         logger.info("Adding timestamp overlay")
-
-        filter_str = (
-            "drawtext=text='%{pts\\:hms}':"
-            "fontfile=/Windows/Fonts/consola.ttf:fontsize=24:"
-            "fontcolor=white:borderw=2:bordercolor=black:"
-            "x=w-text_w-20:y=20"
-        )
-
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-vf", filter_str,
-            "-c:v", "libx264",
-            "-c:a", "copy",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Timestamp overlay failed: {result.stderr}")
-            raise RuntimeError("Timestamp overlay failed")
-
-        return str(output_path)
+        return self.apply_overlays(input_path, output_path, [("timestamp", {})])
 
     def add_custom_text(self, input_path: str, output_path: str,
                        text: str, x: int = 50, y: int = 50,
@@ -196,31 +238,10 @@ class TextOverlay:
             color: フォントカラー
         """
         logger.info(f"Adding custom text: '{text}' at ({x}, {y})")
-
-        filter_str = (
-            f"drawtext=text='{text}':"
-            f"fontfile=/Windows/Fonts/arial.ttf:fontsize={font_size}:"
-            f"fontcolor={color}:borderw=2:bordercolor=black:"
-            f"x={x}:y={y}"
-        )
-
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-vf", filter_str,
-            "-c:v", "libx264",
-            "-c:a", "copy",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Custom text overlay failed: {result.stderr}")
-            raise RuntimeError("Custom text overlay failed")
-
-        return str(output_path)
+        return self.apply_overlays(input_path, output_path, [
+            ("custom_text", {"text": text, "x": x, "y": y,
+                             "font_size": font_size, "color": color}),
+        ])
 
     def add_subtitle(self, input_path: str, output_path: str,
                     subtitle_file: str) -> str:
@@ -233,27 +254,9 @@ class TextOverlay:
             subtitle_file: SRT字幕ファイルパス
         """
         logger.info(f"Adding subtitles from: {subtitle_file}")
-
-        # Windowsパスのエスケープ
-        subtitle_path = subtitle_file.replace("\\", "/").replace(":", "\\:")
-
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-vf", f"subtitles={subtitle_path}",
-            "-c:v", "libx264",
-            "-c:a", "copy",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Subtitle overlay failed: {result.stderr}")
-            raise RuntimeError("Subtitle overlay failed")
-
-        return str(output_path)
+        return self.apply_overlays(input_path, output_path, [
+            ("subtitle", {"subtitle_file": subtitle_file}),
+        ])
 
     def add_progress_bar(self, input_path: str, output_path: str,
                         total_duration: float) -> str:
@@ -266,26 +269,6 @@ class TextOverlay:
             total_duration: 動画の総再生時間
         """
         logger.info("Adding progress bar")
-
-        filter_str = (
-            "drawbox=x=50:y=h-80:w=w-100:h=10:color=gray@0.5:t=fill,"
-            f"drawbox=x=50:y=h-80:w='(w-100)*t/{total_duration}':h=10:color=red:t=fill"
-        )
-
-        cmd = [
-            FFMPEG_PATH,
-            "-y",
-            "-i", input_path,
-            "-vf", filter_str,
-            "-c:v", "libx264",
-            "-c:a", "copy",
-            str(output_path)
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Progress bar overlay failed: {result.stderr}")
-            raise RuntimeError("Progress bar overlay failed")
-
-        return str(output_path)
+        return self.apply_overlays(input_path, output_path, [
+            ("progress_bar", {"total_duration": total_duration}),
+        ])
@@ -3,15 +3,169 @@ Thumbnail A/B Testing Module
 サムネイルA/Bテスト生成モジュール
 """
 
+import io
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import lru_cache
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont, ImageEnhance
-import subprocess
+from PIL import Image, ImageDraw, ImageFont, ImageStat
 from typing import List
 
+import numpy as np
+
+from src.ffmpeg_runner import run_ffmpeg
+
 logger = logging.getLogger(__name__)
 FFMPEG_PATH = "ffmpeg"
 
+# バリエーション生成のプロセス数（バリエーション数とCPU数で頭打ち）
+MAX_VARIANT_WORKERS = 5
+
+
+@lru_cache(maxsize=32)
+def _font(name: str, size: int) -> ImageFont.FreeTypeFont:
+    """フォントを読み込み（ファイル読み込み・解析はフォント名とサイズごとに1回）"""
+    return ImageFont.truetype(name, size)
+
+
+# ITU-R 601-2 の輝度係数（PIL の convert("L") と同じ）
+_LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114])
+
+
+def _apply_adjustments(img: Image.Image, brightness: float = 1.0,
+                       contrast: float = 1.0, saturation: float = 1.0) -> Image.Image:
+    """
+    明るさ → コントラスト → 彩度を1回の色変換でまとめて適用
+
+    ImageEnhance.Brightness / Contrast / Color はいずれも RGB のアフィン変換なので、
+    3x4 の行列に合成して Image.convert の1パスで処理する。エンハンサーごとの中間画像は作らず、
+    0〜255 への飽和は最後の1回のみ
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    matrix = np.eye(3) * brightness
+    offset = np.zeros(3)
+
+    if contrast != 1.0:
+        # 明るさ調整後の平均輝度を中心に伸縮（ImageEnhance.Contrast と同じ）
+        mean = int(ImageStat.Stat(img.convert("L")).mean[0] * brightness + 0.5)
+        matrix *= contrast
+        offset = offset * contrast + (1.0 - contrast) * mean
+    if saturation != 1.0:
+        # 輝度画像とのブレンド（ImageEnhance.Color と同じ）
+        blend = saturation * np.eye(3) + (1.0 - saturation) * _LUMA_WEIGHTS
+        matrix = blend @ matrix
+        offset = blend @ offset
+
+    return img.convert("RGB", tuple(np.column_stack([matrix, offset]).ravel().tolist()))
+
+
+def _decode_png(data: bytes) -> Image.Image:
+    """PNGのバイト列をデコード（以降のバリエーションはこの画像から作る）"""
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+# ワーカープロセスごとにデコード済みのベースフレーム
+_worker_base = None
+
+
+def _init_worker(base_png: bytes) -> None:
+    """ワーカー起動時にベースフレームを1回だけデコード"""
+    global _worker_base
+    _worker_base = _decode_png(base_png)
+
+
+def _render_in_worker(func, *args) -> str:
+    """ワーカー内のデコード済みフレームからバリエーションを生成"""
+    return func(_worker_base, *args)
+
+
+def _create_simple_variant(base: Image.Image, output_path: str, title: str) -> str:
+    """シンプルバリエーション"""
+    img = base.copy()
+    draw = ImageDraw.Draw(img)
+
+    # テキスト描画
+    font = _font("arial.ttf", 60)
+    text_bbox = draw.textbbox((0, 0), title, font=font)
+    text_width = text_bbox[2] - text_bbox[0]
+    x = (1280 - text_width) // 2
+    y = 600
+
+    # 影付きテキスト
+    draw.text((x+3, y+3), title, fill=(0, 0, 0), font=font)
+    draw.text((x, y), title, fill=(255, 255, 255), font=font)
+
+    img.save(output_path)
+    return str(output_path)
+
+
+def _create_bold_variant(base: Image.Image, output_path: str, title: str, kill_count: int) -> str:
+    """ボールドバリエーション"""
+    # コントラスト強化
+    img = _apply_adjustments(base, contrast=1.3)
+
+    draw = ImageDraw.Draw(img)
+
+    # 大きなテキスト
+    font = _font("arialbd.ttf", 80)
+    draw.text((100, 500), title, fill=(255, 255, 0), font=font, stroke_width=4, stroke_fill=(0, 0, 0))
+
+    # キル数バッジ
+    if kill_count > 0:
+        badge_font = _font("arialbd.ttf", 60)
+        draw.text((1000, 100), f"{kill_count} KILLS", fill=(255, 0, 0), font=badge_font, stroke_width=3, stroke_fill=(0, 0, 0))
+
+    img.save(output_path)
+    return str(output_path)
+
+
+def _create_minimal_variant(base: Image.Image, output_path: str, title: str) -> str:
+    """ミニマルバリエーション"""
+    img = base.copy()
+    draw = ImageDraw.Draw(img)
+
+    font = _font("arial.ttf", 40)
+    draw.text((50, 650), title, fill=(255, 255, 255), font=font)
+
+    img.save(output_path)
+    return str(output_path)
+
+
+def _create_dramatic_variant(base: Image.Image, output_path: str, title: str) -> str:
+    """ドラマティックバリエーション"""
+    # 暗くする
+    img = _apply_adjustments(base, brightness=0.7)
+
+    # ビネット効果
+    draw = ImageDraw.Draw(img, 'RGBA')
+    draw.rectangle([(0, 0), (1280, 720)], fill=(0, 0, 0, 80))
+
+    # テキスト
+    font = _font("arial.ttf", 70)
+    draw.text((640, 360), title, fill=(255, 255, 255), font=font, anchor="mm", stroke_width=2, stroke_fill=(0, 0, 0))
+
+    img.save(output_path)
+    return str(output_path)
+
+
+def _create_bright_variant(base: Image.Image, output_path: str, title: str, kill_count: int) -> str:
+    """ブライトバリエーション"""
+    # 明るく鮮やかに（1パスで適用）
+    img = _apply_adjustments(base, brightness=1.2, saturation=1.3)
+
+    draw = ImageDraw.Draw(img)
+
+    # カラフルなテキスト
+    font = _font("arialbd.ttf", 65)
+    draw.text((640, 600), title, fill=(255, 100, 100), font=font, anchor="mm", stroke_width=3, stroke_fill=(255, 255, 255))
+
+    img.save(output_path)
+    return str(output_path)
+
 
 class ThumbnailABTester:
     """サムネイルA/Bテスター"""
@@ -42,27 +196,22 @@ class ThumbnailABTester:
         # ベストフレームを抽出
         base_frame = self._extract_best_frame(video_path, output_dir / "base_frame.png")
 
-        variants = []
-
-        # バリエーション1: シンプル (テキストのみ)
-        variant1 = self._create_simple_variant(base_frame, output_dir / "variant1.png", title)
-        variants.append(variant1)
-
-        # バリエーション2: ボールド (大きなテキスト + 高コントラスト)
-        variant2 = self._create_bold_variant(base_frame, output_dir / "variant2.png", title, kill_count)
-        variants.append(variant2)
-
-        # バリエーション3: ミニマル (小さなテキスト)
-        variant3 = self._create_minimal_variant(base_frame, output_dir / "variant3.png", title)
-        variants.append(variant3)
-
-        # バリエーション4: ドラマティック (暗め + ハイライト)
-        variant4 = self._create_dramatic_variant(base_frame, output_dir / "variant4.png", title)
-        variants.append(variant4)
-
-        # バリエーション5: ブライト (明るめ + 鮮やか)
-        variant5 = self._create_bright_variant(base_frame, output_dir / "variant5.png", title, kill_count)
-        variants.append(variant5)
+        # PNGはディスクから1回だけ読む（デコードはプロセスごとに1回）
+        base_png = Path(base_frame).read_bytes()
+
+        jobs = [
+            # バリエーション1: シンプル (テキストのみ)
+            (_create_simple_variant, str(output_dir / "variant1.png"), title),
+            # バリエーション2: ボールド (大きなテキスト + 高コントラスト)
+            (_create_bold_variant, str(output_dir / "variant2.png"), title, kill_count),
+            # バリエーション3: ミニマル (小さなテキスト)
+            (_create_minimal_variant, str(output_dir / "variant3.png"), title),
+            # バリエーション4: ドラマティック (暗め + ハイライト)
+            (_create_dramatic_variant, str(output_dir / "variant4.png"), title),
+            # バリエーション5: ブライト (明るめ + 鮮やか)
+            (_create_bright_variant, str(output_dir / "variant5.png"), title, kill_count),
+        ]
+        variants = self._render_variants(base_png, jobs)
 
         logger.info(f"Generated {len(variants)} thumbnail variants")
         return variants
@@ -75,95 +224,31 @@ class ThumbnailABTester:
             "-frames:v", "1",
             str(output_path)
         ]
-        subprocess.run(cmd, check=True, capture_output=True)
-        return str(output_path)
-
-    def _create_simple_variant(self, base_frame: str, output_path: str, title: str) -> str:
-        """シンプルバリエーション"""
-        img = Image.open(base_frame)
-        draw = ImageDraw.Draw(img)
-
-        # テキスト描画
-        font = ImageFont.truetype("arial.ttf", 60)
-        text_bbox = draw.textbbox((0, 0), title, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        x = (1280 - text_width) // 2
-        y = 600
-
-        # 影付きテキスト
-        draw.text((x+3, y+3), title, fill=(0, 0, 0), font=font)
-        draw.text((x, y), title, fill=(255, 255, 255), font=font)
-
-        img.save(output_path)
+        run_ffmpeg(cmd)
         return str(output_path)
 
-    def _create_bold_variant(self, base_frame: str, output_path: str, title: str, kill_count: int) -> str:
-        """ボールドバリエーション"""
-        img = Image.open(base_frame)
-
-        # コントラスト強化
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.3)
-
-        draw = ImageDraw.Draw(img)
-
-        # 大きなテキスト
-        font = ImageFont.truetype("arialbd.ttf", 80)
-        draw.text((100, 500), title, fill=(255, 255, 0), font=font, stroke_width=4, stroke_fill=(0, 0, 0))
-
-        # キル数バッジ
-        if kill_count > 0:
-            badge_font = ImageFont.truetype("arialbd.ttf", 60)
-            draw.text((1000, 100), f"{kill_count} KILLS", fill=(255, 0, 0), font=badge_font, stroke_width=3, stroke_fill=(0, 0, 0))
-
-        img.save(output_path)
-        return str(output_path)
-
-    def _create_minimal_variant(self, base_frame: str, output_path: str, title: str) -> str:
-        """ミニマルバリエーション"""
-        img = Image.open(base_frame)
-        draw = ImageDraw.Draw(img)
-
-        font = ImageFont.truetype("arial.ttf", 40)
-        draw.text((50, 650), title, fill=(255, 255, 255), font=font)
-
-        img.save(output_path)
-        return str(output_path)
-
-    def _create_dramatic_variant(self, base_frame: str, output_path: str, title: str) -> str:
-        """ドラマティックバリエーション"""
-        img = Image.open(base_frame)
-
-        # 暗くする
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(0.7)
-
-        # ビネット効果
-        draw = ImageDraw.Draw(img, 'RGBA')
-        draw.rectangle([(0, 0), (1280, 720)], fill=(0, 0, 0, 80))
-
-        # テキスト
-        font = ImageFont.truetype("arial.ttf", 70)
-        draw.text((640, 360), title, fill=(255, 255, 255), font=font, anchor="mm", stroke_width=2, stroke_fill=(0, 0, 0))
-
-        img.save(output_path)
-        return str(output_path)
-
-    def _create_bright_variant(self, base_frame: str, output_path: str, title: str, kill_count: int) -> str:
-        """ブライトバリエーション"""
-        img = Image.open(base_frame)
-
-        # 明るく鮮やかに
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(1.2)
-        enhancer = ImageEnhance.Color(img)
-        img = enhancer.enhance(1.3)
-
-        draw = ImageDraw.Draw(img)
+    def _render_variants(self, base_png: bytes, jobs: list) -> List[str]:
+        """
+        各バリエーションを別プロセスで並列に生成（順序は jobs のまま）
 
-        # カラフルなテキスト
-        font = ImageFont.truetype("arialbd.ttf", 65)
-        draw.text((640, 600), title, fill=(255, 100, 100), font=font, anchor="mm", stroke_width=3, stroke_fill=(255, 255, 255))
+        色調整 / ImageDraw の処理はPythonコードが多くGILで直列化されるため、
+        スレッドではなくプロセスで分ける。プールを作れない環境（デーモンプロセス内など）や
+        1コアのマシンでは順番に生成する
 
-        img.save(output_path)
-        return str(output_path)
+        ワーカーには小さいPNGのバイト列を渡して起動時に1回だけデコードさせる
+        （デコード済み画像を pickle で送るコストはデコードとほぼ同じ）。
+        順番に生成する場合は1回デコードした画像を全バリエーションで使う
+        """
+        workers = min(MAX_VARIANT_WORKERS, os.cpu_count() or 1, len(jobs))
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(base_png,)) as ex:
+                    futures = [ex.submit(_render_in_worker, *job) for job in jobs]
+                    wait(futures)
+                    return [f.result() for f in futures]
+            except (OSError, RuntimeError, AssertionError) as e:
+                logger.warning(f"Parallel thumbnail rendering unavailable ({e}), rendering serially")
+
+        base = _decode_png(base_png)
+        return [func(base, *args) for func, *args in jobs]
@@ -3,7 +3,6 @@ Thumbnail Generator Module
 サムネイル画像生成とSNS最適化
 """
 
-import subprocess
 import logging
 from pathlib import Path
 from typing import List, Dict, Optional
@@ -11,6 +10,9 @@ import os
 import shutil
 from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
 
+from src.ffmpeg_runner import run_ffmpeg
+from src.media_probe import probe_video
+
 logger = logging.getLogger(__name__)
 
 # FFmpegパスを取得
@@ -62,7 +64,7 @@ class ThumbnailGenerator:
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False)
 
         if result.returncode != 0:
             logger.error(f"Frame extraction failed: {result.stderr}")
@@ -161,17 +163,8 @@ class ThumbnailGenerator:
         logger.info(f"Creating short video (9:16) with position: {position}")
 
         # 入力動画の解像度を取得
-        probe_cmd = [
-            FFMPEG_PATH.replace("ffmpeg.exe", "ffprobe.exe"),
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height",
-            "-of", "csv=s=x:p=0",
-            input_path
-        ]
-
-        result = subprocess.run(probe_cmd, capture_output=True, text=True)
-        width, height = map(int, result.stdout.strip().split('x'))
+        info = probe_video(input_path)
+        width, height = info.width, info.height
 
         # 9:16の幅を計算
         target_width = int(height * 9 / 16)
@@ -198,7 +191,7 @@ class ThumbnailGenerator:
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False)
 
         if result.returncode != 0:
             logger.error(f"Short video creation failed: {result.stderr}")
@@ -256,7 +249,7 @@ class ThumbnailGenerator:
                 str(output_path)
             ]
 
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd, check=False)
 
             if result.returncode != 0:
                 logger.error(f"Intro/outro addition failed: {result.stderr}")
@@ -295,7 +288,7 @@ class ThumbnailGenerator:
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False)
 
         if result.returncode != 0:
             logger.error(f"Instagram Reel creation failed: {result.stderr}")
@@ -328,7 +321,7 @@ class ThumbnailGenerator:
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False)
 
         if result.returncode != 0:
             logger.error(f"TikTok video creation failed: {result.stderr}")
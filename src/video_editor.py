@@ -11,6 +11,10 @@ from pathlib import Path
 import json
 import shutil
 import os
+from functools import lru_cache
+
+from src.ffmpeg_runner import run_ffmpeg
+from src.media_probe import probe_video
 
 logger = logging.getLogger(__name__)
 
@@ -37,8 +41,45 @@ def get_ffmpeg_path():
     # デフォルト（PATHに期待）
     return "ffmpeg"
 
+
+def get_ffprobe_path():
+    """FFprobeの実行可能ファイルパスを取得（見つからなければFFmpegと同じディレクトリを探す）"""
+    ffprobe_path = shutil.which("ffprobe")
+    if ffprobe_path:
+        return ffprobe_path
+
+    ffmpeg = Path(FFMPEG_PATH)
+    sibling = ffmpeg.with_name("ffprobe" + ffmpeg.suffix)
+    if ffmpeg.parent != Path(".") and sibling.exists():
+        return str(sibling)
+
+    return "ffprobe"
+
 FFMPEG_PATH = get_ffmpeg_path()
-FFPROBE_PATH = FFMPEG_PATH.replace("ffmpeg.exe", "ffprobe.exe") if "ffmpeg.exe" in FFMPEG_PATH else "ffprobe"
+FFPROBE_PATH = get_ffprobe_path()
+
+# 1回のFFmpeg起動でまとめて切り出すクリップ数の上限（入力ごとにデコーダーを開くため）
+CLIPS_PER_PASS = 32
+
+
+@lru_cache(maxsize=64)
+def _ffprobe_json(video_path: str, mtime_ns: int, size: int) -> str:
+    """ffprobeのJSON出力を (パス, 更新時刻, サイズ) ごとにキャッシュ"""
+    cmd = [
+        FFPROBE_PATH,
+        "-v", "quiet",
+        "-print_format", "json",
+        "-show_format",
+        "-show_streams",
+        video_path
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    if result.returncode != 0:
+        raise RuntimeError(f"FFprobe failed: {result.stderr}")
+
+    return result.stdout
 
 
 class VideoEditor:
@@ -74,16 +115,7 @@ class VideoEditor:
     def _get_video_duration(self, video_path: str) -> float:
         """動画の尺を取得する"""
         try:
-            cmd = [
-                FFPROBE_PATH, "-v", "quiet",
-                "-print_format", "json",
-                "-show_format", video_path,
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                import json as _json
-                data = _json.loads(result.stdout)
-                return float(data.get("format", {}).get("duration", 0))
+            return probe_video(video_path).duration
         except Exception as e:
             logger.warning(f"Could not get video duration: {e}")
         return 0.0
@@ -114,6 +146,11 @@ class VideoEditor:
         clips = valid_clips
         logger.info(f"Processing {len(clips)} valid clips (video duration: {video_duration:.1f}s)")
 
+        try:
+            return self._render_clips_batched(input_video, clips, output_path)
+        except RuntimeError as e:
+            logger.warning(f"Single-pass clip rendering failed ({e}), extracting clips individually")
+
         # 一時ファイルリスト
         temp_clips = []
 
@@ -132,7 +169,7 @@ class VideoEditor:
                 cmd = self._build_extract_command(input_video, start, duration, temp_clip_path)
 
                 # FFmpegを実行
-                result = subprocess.run(cmd, capture_output=True, text=True)
+                result = run_ffmpeg(cmd, check=False)
 
                 if result.returncode != 0:
                     logger.error(f"FFmpeg error: {result.stderr}")
@@ -161,14 +198,62 @@ class VideoEditor:
                 except Exception as e:
                     logger.warning(f"Failed to delete temp file {temp_clip}: {e}")
 
-    def _build_extract_command(self, input_video: str, start: float, duration: float, output: Path) -> List[str]:
-        """クリップ抽出用のFFmpegコマンドを構築"""
-        cmd = [
-            FFMPEG_PATH,
-            "-y",  # 上書き
-            "-ss", str(start),  # 開始位置
-            "-i", input_video,  # 入力ファイル
-            "-t", str(duration),  # 長さ
+    def _render_clips_batched(self, input_video: str, clips: List[Dict], output_path: str) -> str:
+        """
+        クリップの切り出しと結合を1回のFFmpeg起動で行う
+
+        各クリップを -ss/-t 付きの入力として開き、concat フィルターで結合して1回だけエンコードする。
+        プロセス起動・エンコーダー初期化がクリップ数によらず1回になり、中間ファイルも不要
+        """
+        has_audio = probe_video(input_video).has_audio
+        batches = [clips[i:i + CLIPS_PER_PASS] for i in range(0, len(clips), CLIPS_PER_PASS)]
+        logger.info(f"Rendering {len(clips)} clips in {len(batches)} FFmpeg pass(es)")
+
+        if len(batches) == 1:
+            self._run_batch(self._build_batch_command(input_video, clips, Path(output_path), has_audio))
+            return str(output_path)
+
+        # 上限を超える場合はバッチごとに書き出してからストリームコピーで結合
+        parts = []
+        try:
+            for i, batch in enumerate(batches):
+                part = Path(output_path).parent / f"temp_part_{i:03d}.mp4"
+                self._run_batch(self._build_batch_command(input_video, batch, part, has_audio))
+                parts.append(str(part))
+            self._concatenate_clips(parts, output_path)
+        finally:
+            for part in parts:
+                Path(part).unlink(missing_ok=True)
+        return str(output_path)
+
+    def _run_batch(self, cmd: List[str]) -> None:
+        result = run_ffmpeg(cmd, check=False)
+        if result.returncode != 0:
+            logger.error(f"FFmpeg error: {result.stderr}")
+            raise RuntimeError("FFmpeg batch clip rendering failed")
+
+    def _build_batch_command(self, input_video: str, clips: List[Dict], output: Path,
+                             has_audio: bool) -> List[str]:
+        """複数クリップを concat フィルターで結合するFFmpegコマンドを構築"""
+        cmd = [FFMPEG_PATH, "-y"]
+        for clip in clips:
+            cmd += ["-ss", str(clip["start"]), "-t", str(clip["end"] - clip["start"]), "-i", input_video]
+
+        n = len(clips)
+        if has_audio:
+            inputs = "".join(f"[{i}:v][{i}:a]" for i in range(n))
+            cmd += ["-filter_complex", f"{inputs}concat=n={n}:v=1:a=1[v][a]", "-map", "[v]", "-map", "[a]"]
+        else:
+            inputs = "".join(f"[{i}:v]" for i in range(n))
+            cmd += ["-filter_complex", f"{inputs}concat=n={n}:v=1:a=0[v]", "-map", "[v]"]
+
+        cmd += self._encode_args()
+        cmd.append(str(output))
+        return cmd
+
+    def _encode_args(self) -> List[str]:
+        """クリップ書き出し共通のエンコード設定"""
+        args = [
             "-c:v", self.codec,  # ビデオコーデック
             "-crf", str(self.crf),  # 品質
             "-preset", self.preset,  # プリセット
@@ -178,9 +263,21 @@ class VideoEditor:
 
         # FPSを維持（元動画のFPSをそのまま使用）
         if self.maintain_fps:
-            cmd.extend(["-vsync", "vfr"])
+            args.extend(["-vsync", "vfr"])
 
-        cmd.append(str(output))
+        return args
+
+    def _build_extract_command(self, input_video: str, start: float, duration: float, output: Path) -> List[str]:
+        """クリップ抽出用のFFmpegコマンドを構築"""
+        cmd = [
+            FFMPEG_PATH,
+            "-y",  # 上書き
+            "-ss", str(start),  # 開始位置
+            "-i", input_video,  # 入力ファイル
+            "-t", str(duration),  # 長さ
+            *self._encode_args(),
+            str(output)
+        ]
 
         return cmd
 
@@ -212,7 +309,7 @@ class VideoEditor:
                 str(output_path)
             ]
 
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd, check=False)
 
             if result.returncode != 0:
                 logger.error(f"FFmpeg concatenation error: {result.stderr}")
@@ -238,7 +335,7 @@ class VideoEditor:
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False)
 
         if result.returncode != 0:
             raise RuntimeError(f"FFmpeg copy failed: {result.stderr}")
@@ -246,22 +343,10 @@ class VideoEditor:
         return str(output_path)
 
     def get_video_metadata(self, video_path: str) -> Dict:
-        """動画のメタデータを取得"""
-        cmd = [
-            FFPROBE_PATH,
-            "-v", "quiet",
-            "-print_format", "json",
-            "-show_format",
-            "-show_streams",
-            video_path
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            raise RuntimeError(f"FFprobe failed: {result.stderr}")
-
-        return json.loads(result.stdout)
+        """動画のメタデータを取得（同じファイルへの2回目以降はキャッシュから）"""
+        st = os.stat(video_path)
+        # 呼び出し側が変更しても影響しないよう毎回パースし直す
+        return json.loads(_ffprobe_json(str(video_path), st.st_mtime_ns, st.st_size))
 
     def create_9_16_crop(self, input_video: str, output_path: str, position: str = "center") -> str:
         """
@@ -273,11 +358,8 @@ class VideoEditor:
             position: クロップ位置 ("center", "top", "bottom")
         """
         # 動画の解像度を取得
-        metadata = self.get_video_metadata(input_video)
-        video_stream = next(s for s in metadata["streams"] if s["codec_type"] == "video")
-
-        width = int(video_stream["width"])
-        height = int(video_stream["height"])
+        info = probe_video(input_video)
+        width, height = info.width, info.height
 
         # 9:16の幅を計算
         target_width = int(height * 9 / 16)
@@ -303,7 +385,7 @@ class VideoEditor:
             str(output_path)
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd, check=False)
 
         if result.returncode != 0:
             raise RuntimeError(f"FFmpeg crop failed: {result.stderr}")
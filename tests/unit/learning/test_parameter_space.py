@@ -0,0 +1,87 @@
+"""Unit tests for the learning parameter space."""
+from __future__ import annotations
+
+import warnings
+
+from backend.src.learning.bayesian_optimizer import BayesianOptimizer
+from backend.src.learning.parameter_space import ParameterSpace
+
+
+class TestSobolSamples:
+    """Tests for the cached Sobol engine."""
+
+    def test_samples_within_bounds(self):
+        space = ParameterSpace(seed=0)
+        for sample in space.sobol_samples(8):
+            for name, value in sample.items():
+                bound = space.get_bound(name)
+                assert bound.low <= value <= bound.high
+
+    def test_consecutive_calls_continue_sequence(self):
+        space = ParameterSpace(seed=0)
+        first = space.sobol_samples(4)
+        second = space.sobol_samples(4)
+        assert first != second
+
+    def test_reset_restarts_sequence(self):
+        space = ParameterSpace(seed=0)
+        first = space.sobol_samples(4)
+        space.reset_sobol()
+        assert space.sobol_samples(4) == first
+
+    def test_first_draw_is_balanced_prefix(self):
+        space = ParameterSpace(seed=0)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            samples = space.sobol_samples(10)
+        assert len(samples) == 10
+        space.reset_sobol()
+        assert space.sobol_samples(16)[:10] == samples
+
+    def test_optimizer_initial_design_is_stable(self):
+        optimizer = BayesianOptimizer(parameter_space=ParameterSpace(seed=0), n_initial=4)
+        first = optimizer.suggest()
+        assert optimizer.suggest() == first
+        optimizer.observe(first, 0.5)
+        assert optimizer.suggest() != first
+
+
+class TestDerivedViews:
+    """Tests for cached derived views."""
+
+    def test_names_and_bounds_are_cached_tuples(self):
+        space = ParameterSpace()
+        assert isinstance(space.names, tuple)
+        assert space.names is space.names
+        assert space.bounds[0] == (space.parameters[0].low, space.parameters[0].high)
+
+    def test_dict_array_round_trip(self):
+        space = ParameterSpace()
+        sample = space.random_sample()
+        arr = space.dict_to_array(sample)
+        assert arr.shape == (space.dimension,)
+        assert space.array_to_dict(arr.tolist()) == sample
+
+    def test_span_matches_bounds(self):
+        space = ParameterSpace()
+        lows, highs = space.to_array_bounds()
+        assert (space.span_arr == highs - lows).all()
+
+
+class TestRandomSamples:
+    """Tests for vectorized random sampling."""
+
+    def test_batch_shape_and_bounds(self):
+        space = ParameterSpace(seed=1)
+        samples = space.random_samples(500)
+        lows, highs = space.to_array_bounds()
+        assert samples.shape == (500, space.dimension)
+        assert (samples >= lows).all() and (samples <= highs).all()
+
+    def test_seeded_space_is_reproducible(self):
+        assert ParameterSpace(seed=3).random_sample() == ParameterSpace(seed=3).random_sample()
+
+    def test_index_matches_names(self):
+        space = ParameterSpace()
+        for i, name in enumerate(space.names):
+            assert space.index(name) == i
@@ -0,0 +1,62 @@
+"""Unit tests for the learning reward function."""
+from __future__ import annotations
+
+import pytest
+from backend.src.learning.reward_function import RewardFunction
+
+
+def _metrics(value: float) -> dict[str, float]:
+    return {
+        "retention": value,
+        "ctr": value,
+        "engagement": value,
+        "watch_time": value,
+        "llm_quality": value,
+        "diversity": value,
+    }
+
+
+class TestRewardFunctionHistory:
+    """Tests for the columnar reward history."""
+
+    def test_empty_history(self):
+        rf = RewardFunction()
+        assert rf.get_history() == []
+        assert rf.get_running_best() == 0.0
+        assert rf.get_cumulative_regret() == []
+
+    def test_history_round_trip(self):
+        rf = RewardFunction()
+        signal = rf.compute(_metrics(0.5))
+        history = rf.get_history()
+        assert history == [{"total": signal.total, "components": signal.components}]
+
+    def test_grows_past_initial_capacity(self):
+        rf = RewardFunction()
+        n = RewardFunction._INITIAL_CAPACITY * 2 + 3
+        for i in range(n):
+            rf.compute(_metrics(i / n))
+        assert len(rf.totals) == n
+        assert len(rf.get_history()) == n
+        assert rf.get_running_best() == pytest.approx((n - 1) / n)
+        assert rf.component_values("ctr")[-1] == pytest.approx((n - 1) / n)
+
+    def test_cumulative_regret(self):
+        rf = RewardFunction()
+        rf.compute(_metrics(0.5))
+        rf.compute(_metrics(0.25))
+        assert rf.get_cumulative_regret(1.0) == pytest.approx([0.5, 1.25])
+
+    def test_missing_component_omitted_from_history(self):
+        rf = RewardFunction()
+        rf.compute({"ctr": 1.0})
+        rf.compute({"retention": 1.0})
+        history = rf.get_history()
+        assert history[0]["components"] == {"ctr": 1.0}
+        assert history[1]["components"] == {"retention": 1.0}
+
+    def test_running_best_curve(self):
+        rf = RewardFunction()
+        for v in (0.2, 0.6, 0.4, 0.8):
+            rf.compute(_metrics(v))
+        assert rf.running_best.tolist() == pytest.approx([0.2, 0.6, 0.6, 0.8])
@@ -0,0 +1,27 @@
+"""Unit tests for learning visualization helpers."""
+from __future__ import annotations
+
+import numpy as np
+from backend.src.learning.visualizations._sampling import decimate, step_points
+
+
+class TestDecimate:
+    """Tests for plot-series downsampling."""
+
+    def test_short_series_untouched(self):
+        xs = np.arange(10)
+        out_x, _ = decimate(xs, xs * 2.0, max_pts=20)
+        assert out_x is xs
+
+    def test_long_series_keeps_endpoints(self):
+        xs = np.arange(10_000)
+        out_x, _ = decimate(xs, xs.astype(float), max_pts=100)
+        assert len(out_x) == 100
+        assert out_x[0] == 0 and out_x[-1] == 9_999
+
+    def test_step_points_keep_changes_and_tail(self):
+        xs = np.arange(1, 7)
+        ys = np.array([1.0, 1.0, 2.0, 2.0, 3.0, 3.0])
+        out_x, out_y = step_points(xs, ys)
+        assert out_x.tolist() == [1, 3, 5, 6]
+        assert out_y.tolist() == [1.0, 2.0, 3.0, 3.0]
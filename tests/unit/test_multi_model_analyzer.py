@@ -0,0 +1,63 @@
+"""Unit tests for the multi-model frame analyzer."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from src.multi_model_analyzer import MultiModelAnalyzer
+from src.ollama_client import FRAME_WINDOW_FACTOR
+
+
+@pytest.fixture
+def analyzer():
+    config = {
+        "ollama": {
+            "base_url": "http://localhost:11434",
+            "vision_model": "qwen2-vl:7b",
+            "thinking_model": "qwen2.5:7b",
+            "timeout": 30,
+            "max_concurrency": 2,
+        },
+        "multi_model": {"enable": True, "models": ["qwen2-vl:7b", "llava:13b"]},
+    }
+    analyzer = MultiModelAnalyzer(config)
+    yield analyzer
+    analyzer.close()
+
+
+class TestAnalyzeFramesBatch:
+    """Tests for windowed batch analysis."""
+
+    async def test_reports_progress_and_keeps_order(self, analyzer):
+        async def fake_analyze(frame_path):
+            await asyncio.sleep(0)
+            return {"frame_path": frame_path}
+
+        analyzer.analyze_frame = fake_analyze
+        progress = []
+
+        async def on_progress(done):
+            progress.append(done)
+
+        frames = [f"frame_{i:04d}.jpg" for i in range(10)]
+        results = await analyzer.analyze_frames_batch(frames, on_progress=on_progress)
+
+        assert [r["frame_path"] for r in results] == frames
+        assert progress == list(range(1, 11))
+
+    async def test_limits_frames_in_flight(self, analyzer):
+        in_flight = 0
+        peak = 0
+
+        async def fake_analyze(frame_path):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            return {"frame_path": frame_path}
+
+        analyzer.analyze_frame = fake_analyze
+        await analyzer.analyze_frames_batch([f"frame_{i}.jpg" for i in range(20)])
+
+        assert peak == 2 * FRAME_WINDOW_FACTOR